@@ -0,0 +1,161 @@
+"""Local cache of finished audio files.
+
+Files are addressed by (YouTube video id, format profile, tags), so any later
+request for the same video in the same format with the same tags skips
+yt-dlp and ffmpeg, even when its Telegram file_id cannot be reused. The tags
+part keeps files tagged for one Spotify track (or untagged, from a plain
+YouTube link) from being delivered for another track on the same video. The directory is bounded by a
+byte budget with least-recently-used eviction; files enter it through an
+atomic rename and the index is rebuilt from the directory on startup.
+"""
+import collections
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class AudioCache:
+    def __init__(self, directory, max_bytes):
+        """max_bytes: size budget for the directory; 0 disables the cache"""
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # File name -> size, least recently used first
+        self._files = collections.OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+            self._scan()
+
+    def _scan(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+            if entry.name.endswith('.tmp'):
+                # Left over from an interrupted write
+                os.unlink(entry.path)
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_atime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self._bytes += size
+        self._evict()
+        logger.info(f"Audio cache: {len(self._files)} files, {self._bytes / 1024 / 1024:.1f} MiB")
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _name(self, video_id, profile, ext, tags=''):
+        key = f"{video_id}:{profile}:{tags}" if tags else f"{video_id}:{profile}"
+        digest = hashlib.sha256(key.encode()).hexdigest()[:32]
+        return f"{digest}.{ext}"
+
+    def owns(self, path):
+        """True if path is a file managed by this cache (callers must not delete it)"""
+        return bool(path) and os.path.dirname(os.path.abspath(path)) == self.directory
+
+    def get(self, video_id, profile, ext, tags=''):
+        """Path of the cached file, or None. tags: identity of the metadata written into it ('' for none)"""
+        if not self.enabled or not video_id:
+            return None
+        name = self._name(video_id, profile, ext, tags)
+        with self._lock:
+            if name not in self._files:
+                self.misses += 1
+                return None
+            self._files.move_to_end(name)
+            self.hits += 1
+        path = os.path.join(self.directory, name)
+        try:
+            os.utime(path)
+        except OSError:
+            # Removed behind our back
+            with self._lock:
+                self._bytes -= self._files.pop(name, 0)
+            return None
+        return path
+
+    def put(self, video_id, profile, ext, source_path, move=True, tags=''):
+        """Store source_path (moved, or copied when move is False); returns the cached path.
+
+        Returns None when the cache is disabled or the file could not be stored,
+        in which case source_path is left as it was.
+        """
+        if not self.enabled or not video_id:
+            return None
+        name = self._name(video_id, profile, ext, tags)
+        path = os.path.join(self.directory, name)
+        try:
+            size = os.path.getsize(source_path)
+            if size > self.max_bytes:
+                return None
+            if move:
+                try:
+                    # Same filesystem: a rename is already atomic
+                    os.replace(source_path, path)
+                except OSError:
+                    self._copy_atomic(source_path, path)
+                    os.unlink(source_path)
+            else:
+                self._copy_atomic(source_path, path)
+        except OSError as e:
+            logger.warning(f"Audio cache store failed for {video_id}: {e}")
+            return None
+        with self._lock:
+            self._bytes += size - self._files.pop(name, 0)
+            self._files[name] = size
+        self._evict(keep=name)
+        return path
+
+    def _copy_atomic(self, source_path, path):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as dst, open(source_path, 'rb') as src:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _evict(self, keep=None):
+        evicted = []
+        with self._lock:
+            while self._bytes > self.max_bytes and self._files:
+                name, size = next(iter(self._files.items()))
+                if name == keep:
+                    break
+                del self._files[name]
+                self._bytes -= size
+                evicted.append(name)
+            self.evictions += len(evicted)
+        for name in evicted:
+            # Unlinking a file another request is still uploading is safe on POSIX
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'files': len(self._files),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+            }
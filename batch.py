@@ -0,0 +1,82 @@
+"""Pipelined batch engine for multi-track jobs.
+
+Each item moves through a list of async stages (e.g. resolve -> download ->
+upload). Every stage has its own concurrency limit, so later items download
+while earlier ones upload, and the total number of items in flight is
+capped so only a few temp files exist at any time.
+"""
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """One pipeline step: ``await func(job)`` returns True to continue, False if the item failed"""
+
+    def __init__(self, name, func, concurrency=1):
+        self.name = name
+        self.func = func
+        self.concurrency = concurrency
+
+
+class BatchEngine:
+    def __init__(self, stages, max_in_flight=None, cleanup=None, on_done=None):
+        """
+        stages: list of Stage, run in order for every item.
+        max_in_flight: items between their first and last stage at once
+            (bounds temp files on disk). Defaults to the widest stage + 1.
+        cleanup: optional ``func(job)`` (sync or async) called once per item.
+        on_done: optional ``async func(job)`` called as each item finishes.
+        """
+        self.stages = stages
+        self.max_in_flight = max_in_flight or max(stage.concurrency for stage in stages) + 1
+        self.cleanup = cleanup
+        self.on_done = on_done
+
+    async def run(self, items):
+        """Process every item; returns the list of jobs in input order.
+
+        A job is a dict with 'index', 'item', 'ok', 'error', plus whatever
+        keys the stages stored. A stage may set job['done'] = True to finish
+        an item early (e.g. served from a cache).
+        """
+        semaphores = [asyncio.Semaphore(stage.concurrency) for stage in self.stages]
+        jobs = [{'index': i, 'item': item, 'ok': False, 'error': None} for i, item in enumerate(items)]
+        pending = iter(jobs)
+
+        async def process(job):
+            try:
+                for stage, semaphore in zip(self.stages, semaphores):
+                    async with semaphore:
+                        job['stage'] = stage.name
+                        if not await stage.func(job):
+                            return
+                    if job.get('done'):
+                        break
+                job['ok'] = True
+            except Exception as e:
+                job['error'] = e
+                logger.error(f"Batch item {job['index']} failed in {job.get('stage')}: {e}")
+            finally:
+                if self.cleanup:
+                    try:
+                        result = self.cleanup(job)
+                        if asyncio.iscoroutine(result):
+                            await result
+                    except Exception as cleanup_err:
+                        logger.warning(f"Cleanup error: {cleanup_err}")
+
+        async def worker():
+            # Each worker pulls the next item only after finishing its previous one
+            for job in pending:
+                await process(job)
+                if self.on_done:
+                    try:
+                        await self.on_done(job)
+                    except Exception as e:
+                        logger.warning(f"Batch progress callback failed: {e}")
+
+        workers = min(self.max_in_flight, len(jobs))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        return jobs
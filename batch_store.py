@@ -0,0 +1,164 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+PENDING = 'pending'
+RESOLVED = 'resolved'
+DOWNLOADED = 'downloaded'
+SENT = 'sent'
+FAILED = 'failed'
+
+RUNNING = 'running'
+FINISHED = 'finished'
+
+
+class BatchStore:
+    """Persistent batch jobs (one row per job, one per track) so they survive restarts.
+
+    Items move pending -> resolved -> downloaded -> sent (or failed). A job
+    still 'running' at startup was interrupted and can be resumed, skipping
+    the items already sent.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS batch_jobs ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' chat_id INTEGER NOT NULL,'
+            ' user_id INTEGER,'
+            ' audio_format TEXT NOT NULL,'
+            ' status TEXT NOT NULL,'
+            ' created REAL NOT NULL,'
+            ' updated REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS batch_items ('
+            ' job_id INTEGER NOT NULL,'
+            ' idx INTEGER NOT NULL,'
+            ' entry TEXT NOT NULL,'
+            ' track_info TEXT,'
+            ' state TEXT NOT NULL,'
+            ' youtube_url TEXT,'
+            ' updated REAL NOT NULL,'
+            ' PRIMARY KEY (job_id, idx))'
+        )
+
+    def create_job(self, chat_id, user_id, audio_format, items):
+        """Store a new job; items are (search result, track info or None) pairs"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                job_id = self._conn.execute(
+                    'INSERT INTO batch_jobs (chat_id, user_id, audio_format, status, created, updated)'
+                    ' VALUES (?, ?, ?, ?, ?, ?)',
+                    (chat_id, user_id, audio_format, RUNNING, now, now)
+                ).lastrowid
+                self._conn.executemany(
+                    'INSERT INTO batch_items (job_id, idx, entry, track_info, state, updated) VALUES (?, ?, ?, ?, ?, ?)',
+                    [
+                        (job_id, idx, json.dumps(entry), json.dumps(track_info) if track_info else None, PENDING, now)
+                        for idx, (entry, track_info) in enumerate(items)
+                    ]
+                )
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return job_id
+
+    def job(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT id, chat_id, user_id, audio_format, status FROM batch_jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('id', 'chat_id', 'user_id', 'audio_format', 'status'), row))
+
+    def items(self, job_id):
+        """All items of a job, in order, as dicts"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT idx, entry, track_info, state, youtube_url FROM batch_items WHERE job_id = ? ORDER BY idx',
+                (job_id,)
+            ).fetchall()
+        return [
+            {
+                'index': idx,
+                'entry': json.loads(entry),
+                'track_info': json.loads(track_info) if track_info else None,
+                'state': state,
+                'youtube_url': youtube_url,
+            }
+            for idx, entry, track_info, state, youtube_url in rows
+        ]
+
+    def set_state(self, job_id, idx, state, youtube_url=None):
+        now = time.time()
+        with self._lock:
+            if youtube_url is None:
+                self._conn.execute(
+                    'UPDATE batch_items SET state = ?, updated = ? WHERE job_id = ? AND idx = ?',
+                    (state, now, job_id, idx)
+                )
+            else:
+                self._conn.execute(
+                    'UPDATE batch_items SET state = ?, youtube_url = ?, updated = ? WHERE job_id = ? AND idx = ?',
+                    (state, youtube_url, now, job_id, idx)
+                )
+            self._conn.execute('UPDATE batch_jobs SET updated = ? WHERE id = ?', (now, job_id))
+
+    def finish_job(self, job_id):
+        with self._lock:
+            self._conn.execute(
+                'UPDATE batch_jobs SET status = ?, updated = ? WHERE id = ?', (FINISHED, time.time(), job_id)
+            )
+
+    def unfinished_jobs(self):
+        """Ids of jobs that were running when the process stopped"""
+        with self._lock:
+            rows = self._conn.execute('SELECT id FROM batch_jobs WHERE status = ? ORDER BY id', (RUNNING,)).fetchall()
+        return [row[0] for row in rows]
+
+    def purge_finished(self, older_than):
+        """Drop finished jobs last touched more than older_than seconds ago; returns how many"""
+        cutoff = time.time() - older_than
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.execute(
+                    'DELETE FROM batch_items WHERE job_id IN'
+                    ' (SELECT id FROM batch_jobs WHERE status = ? AND updated < ?)',
+                    (FINISHED, cutoff)
+                )
+                removed = self._conn.execute(
+                    'DELETE FROM batch_jobs WHERE status = ? AND updated < ?', (FINISHED, cutoff)
+                ).rowcount
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return removed
+
+    def stats(self):
+        with self._lock:
+            jobs = dict(self._conn.execute('SELECT status, COUNT(*) FROM batch_jobs GROUP BY status').fetchall())
+            items = dict(self._conn.execute(
+                'SELECT i.state, COUNT(*) FROM batch_items i JOIN batch_jobs j ON j.id = i.job_id'
+                ' WHERE j.status = ? GROUP BY i.state', (RUNNING,)
+            ).fetchall())
+        return {'jobs': jobs, 'running_items': items}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1 @@
+"""Offline micro-benchmarks for the bot's hot functions; run with python -m benchmarks."""
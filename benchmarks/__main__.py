@@ -0,0 +1,100 @@
+"""Run the offline micro-benchmarks.
+
+    python -m benchmarks                          # run and print the table
+    python -m benchmarks -k search                # only benchmarks whose name contains 'search'
+    python -m benchmarks --save-baseline          # store results in $DATA_DIR/benchmark-baseline.json
+    python -m benchmarks --compare                # fail (exit 1) on regressions past --threshold
+
+    python -m benchmarks --record-search "Daft Punk - Something About Us" --as confident
+        replaces a synthetic search payload with a real one (needs network access)
+    python -m benchmarks --record-playlist 37i9dQZF1DXcBWIGoYBM5M
+        replaces the synthetic playlist with a real one (needs Spotify credentials)
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+from benchmarks import fixtures, harness, suite
+
+# Machine-specific, so kept with the bot's (git-ignored) data rather than in the source tree
+DEFAULT_BASELINE = os.path.join(
+    os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')),
+    'benchmark-baseline.json'
+)
+
+
+def record_search(query, slug):
+    with tempfile.TemporaryDirectory() as workdir:
+        bot = suite.load_bot(workdir)
+        payload = bot.ytdl_pool.extract_info('search', f"ytsearch{max(bot.SEARCH_DEPTHS)}:{query}")
+    # The replay looks payloads up by the benchmark's own query
+    payload['entries'] = [entry for entry in payload.get('entries') or [] if entry]
+    return fixtures.save_fixture(f"ytsearch-{slug}", json.loads(json.dumps(payload, default=str)))
+
+
+def record_playlist(playlist_id):
+    with tempfile.TemporaryDirectory() as workdir:
+        bot = suite.load_bot(workdir)
+        spotify = bot.get_spotify()
+        playlist = spotify.playlist(playlist_id)
+        pages = [playlist['tracks']]
+        while pages[-1].get('next'):
+            pages.append(spotify.next(pages[-1]))
+    # FixtureSpotify.next looks the following page up by the 'next' URL that pointed at it
+    playlist['tracks']['_pages'] = {page['next']: following for page, following in zip(pages, pages[1:])}
+    return fixtures.save_fixture('spotify-playlist', playlist)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', dest='filter', help='run only benchmarks whose name contains this')
+    parser.add_argument('--min-time', type=float, default=1.0, help='seconds to spend per benchmark')
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, metavar='PATH')
+    parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE, metavar='PATH')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='relative change counted as a regression (default 0.15 = 15%%)')
+    parser.add_argument('--json', metavar='PATH', help='also write the raw results here')
+    parser.add_argument('--record-search', metavar='QUERY')
+    parser.add_argument('--as', dest='slug', choices=('confident', 'widened'), default='confident')
+    parser.add_argument('--record-playlist', metavar='PLAYLIST_ID')
+    args = parser.parse_args(argv)
+
+    if args.record_search:
+        print(f"Recorded {record_search(args.record_search, args.slug)}")
+        return 0
+    if args.record_playlist:
+        print(f"Recorded {record_playlist(args.record_playlist)}")
+        return 0
+
+    baseline = harness.load_baseline(args.compare) if args.compare else None
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='musicbot-bench-') as workdir:
+        for bench in suite.build(workdir):
+            if args.filter and args.filter not in bench.name:
+                continue
+            results[bench.name] = harness.measure(bench, min_time=args.min_time)
+            print(f"  {bench.name}: {results[bench.name]['ops_per_sec']:.1f} ops/s", file=sys.stderr)
+
+    print(harness.format_table(results, baseline))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        harness.save_baseline(args.save_baseline, results)
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if baseline is not None:
+        regressions = harness.compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) past {args.threshold:.0%}:")
+            for name, metric, before, after, change in regressions:
+                print(f"  {name} {metric}: {before} -> {after} ({change:+.1%})")
+            return 1
+        print(f"\nNo regressions past {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
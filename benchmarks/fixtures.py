@@ -0,0 +1,333 @@
+"""Offline inputs for the benchmarks.
+
+yt-dlp search payloads and Spotify playlist/album pages are read from
+benchmarks/fixtures/<name>.json when a recording exists there (see
+``python -m benchmarks --record-search`` and ``--record-playlist``), and
+otherwise built deterministically in the same shape, so the suite never needs
+the network. The built payloads carry the fields and oddities real responses
+have: live streams and Shorts among search results, non-ASCII titles, and
+removed or local-file items in playlists.
+"""
+import json
+import os
+import random
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Two-letter market codes; real track objects list ~180 of them and they dominate the payload size
+MARKETS = [f"{a}{b}" for a in 'ABCDEFGHIJKLMN' for b in 'ABCDEFGHIJKLM'][:180]
+
+WORDS = (
+    'love', 'night', 'heart', 'fire', 'dream', 'summer', 'city', 'light', 'rain', 'gold', 'wild', 'river',
+    'shadow', 'blue', 'dance', 'forever', 'stars', 'home', 'echo', 'storm', 'ocean', 'midnight', 'paper',
+    'corazón', 'noche', 'ночь', '夜空', 'café', 'straße',
+)
+VARIANTS = (
+    '(Official Audio)', '(Official Video)', '(Lyrics)', '(Live at Wembley)', '(Acoustic Cover)',
+    '(Remix)', '[Sped Up]', '(Karaoke Version)', '- 1 Hour Loop', '(Visualizer)', '',
+)
+
+
+def fixture_path(name):
+    return os.path.join(FIXTURE_DIR, f"{name}.json")
+
+
+def load_fixture(name, build):
+    """The recorded fixture called name, or build() when none was recorded"""
+    path = fixture_path(name)
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    return build()
+
+
+def save_fixture(name, payload):
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    with open(fixture_path(name), 'w', encoding='utf-8') as f:
+        json.dump(payload, f)
+    return fixture_path(name)
+
+
+def _video_id(rng):
+    alphabet = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_'
+    return ''.join(rng.choice(alphabet) for _ in range(11))
+
+
+def _spotify_id(rng):
+    alphabet = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+    return ''.join(rng.choice(alphabet) for _ in range(22))
+
+
+def _phrase(rng, words=2):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).title()
+
+
+def search_entry(rng, title, channel, duration, verified=False, kind='video'):
+    """One flat ytsearch entry as yt-dlp returns it with extract_flat.
+
+    kind 'live' is a running stream (no duration), 'short' a /shorts/ URL.
+    """
+    video_id = _video_id(rng)
+    if kind == 'short':
+        url = f"https://www.youtube.com/shorts/{video_id}"
+    else:
+        url = f"https://www.youtube.com/watch?v={video_id}"
+    return {
+        '_type': 'url',
+        'ie_key': 'Youtube',
+        'id': video_id,
+        'url': url,
+        'title': title,
+        'description': ' '.join(rng.choice(WORDS) for _ in range(40)),
+        'duration': duration,
+        'channel_id': 'UC' + _video_id(rng) * 2,
+        'channel': channel,
+        'channel_url': f"https://www.youtube.com/channel/UC{video_id}",
+        'uploader': channel,
+        'uploader_id': '@' + channel.replace(' ', '').lower(),
+        'uploader_url': f"https://www.youtube.com/@{channel.replace(' ', '').lower()}",
+        'thumbnails': [
+            {'url': f"https://i.ytimg.com/vi/{video_id}/hq720.jpg?sqp={n}", 'height': h, 'width': h * 16 // 9}
+            for n, h in enumerate((94, 188, 360, 720))
+        ],
+        'timestamp': None,
+        'release_timestamp': None,
+        'view_count': rng.randint(1_000, 500_000_000),
+        'concurrent_view_count': rng.randint(10, 50_000) if kind == 'live' else None,
+        'live_status': 'is_live' if kind == 'live' else None,
+        'channel_is_verified': verified,
+        'availability': None,
+    }
+
+
+def youtube_search(artist, title, depth, duration=210, seed=0, include_match=True):
+    """A ytsearch<depth> payload for 'artist - title'.
+
+    With include_match the official upload is among the results (a confident
+    match at the first depth); without it the search has to widen.
+    """
+    rng = random.Random(f"{seed}:{artist}:{title}")
+    entries = []
+    for n in range(depth):
+        variant = rng.choice(VARIANTS)
+        if rng.random() < 0.6:
+            entry_title = f"{artist} - {title} {variant}".strip()
+        else:
+            entry_title = f"{_phrase(rng, 3)} {variant}".strip()
+        channel = artist if rng.random() < 0.3 else _phrase(rng)
+        kind = rng.choices(('video', 'live', 'short'), weights=(10, 1, 1))[0]
+        if kind == 'live':
+            entries.append(search_entry(rng, f"🔴 {entry_title} 24/7", channel, None, kind=kind))
+        elif kind == 'short':
+            entries.append(search_entry(rng, f"{entry_title} #shorts", channel, rng.randint(15, 59), kind=kind))
+        else:
+            entries.append(search_entry(rng, entry_title, channel, duration + rng.randint(-40, 600)))
+    if include_match:
+        match = search_entry(rng, f"{title}", f"{artist} - Topic", duration + 1, verified=True)
+        entries.insert(min(3, len(entries)), match)
+        entries = entries[:depth]
+    return {
+        '_type': 'playlist',
+        'id': f"{artist} - {title}",
+        'title': f"{artist} - {title}",
+        'extractor': 'youtube:search',
+        'extractor_key': 'YoutubeSearch',
+        'webpage_url': f"ytsearch{depth}:{artist} - {title}",
+        'original_url': f"ytsearch{depth}:{artist} - {title}",
+        'webpage_url_basename': f"{artist} - {title}",
+        'webpage_url_domain': None,
+        'epoch': 1_700_000_000,
+        'entries': entries,
+    }
+
+
+def spotify_track(rng, index, album=None):
+    """A full Spotify track object (as in playlist pages and sp.track)"""
+    track_id = _spotify_id(rng)
+    artist = {'id': _spotify_id(rng), 'name': _phrase(rng), 'type': 'artist', 'uri': 'spotify:artist:x'}
+    album = album or spotify_album_object(rng, tracks=None)
+    return {
+        'album': {key: value for key, value in album.items() if key != 'tracks'},
+        'artists': [artist],
+        'available_markets': MARKETS,
+        'disc_number': 1,
+        'duration_ms': rng.randint(120_000, 360_000),
+        'explicit': rng.random() < 0.2,
+        'external_ids': {'isrc': f"US{rng.randint(10**9, 10**10 - 1)}"},
+        'external_urls': {'spotify': f"https://open.spotify.com/track/{track_id}"},
+        'href': f"https://api.spotify.com/v1/tracks/{track_id}",
+        'id': track_id,
+        'is_local': False,
+        'name': _phrase(rng, 3),
+        'popularity': rng.randint(0, 100),
+        'preview_url': None,
+        'track_number': index + 1,
+        'type': 'track',
+        'uri': f"spotify:track:{track_id}",
+        'episode': False,
+        'track': True,
+    }
+
+
+def spotify_local_track(rng):
+    """A local file added to a playlist: no id, no album art, nothing to look up"""
+    name = _phrase(rng, 3)
+    return {
+        'album': {'album_type': None, 'artists': [], 'available_markets': [], 'id': None, 'images': [],
+                  'name': '', 'release_date': None, 'type': 'album'},
+        'artists': [{'id': None, 'name': _phrase(rng), 'type': 'artist', 'uri': None}],
+        'available_markets': [],
+        'disc_number': 0,
+        'duration_ms': rng.randint(120_000, 360_000),
+        'explicit': False,
+        'external_ids': {},
+        'external_urls': {},
+        'href': None,
+        'id': None,
+        'is_local': True,
+        'name': name,
+        'popularity': 0,
+        'preview_url': None,
+        'track_number': 0,
+        'type': 'track',
+        'uri': f"spotify:local:::{name.replace(' ', '+')}:{rng.randint(120, 360)}",
+        'episode': False,
+        'track': True,
+    }
+
+
+def spotify_album_object(rng, tracks=None, page_size=50):
+    album_id = _spotify_id(rng)
+    album = {
+        'album_type': 'album',
+        'artists': [{'id': _spotify_id(rng), 'name': _phrase(rng), 'type': 'artist'}],
+        'available_markets': MARKETS,
+        'id': album_id,
+        'images': [
+            {'url': f"https://i.scdn.co/image/{album_id}{size}", 'height': size, 'width': size}
+            for size in (640, 300, 64)
+        ],
+        'name': _phrase(rng, 2),
+        'release_date': f"20{rng.randint(10, 24)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+        'total_tracks': tracks or 0,
+        'type': 'album',
+    }
+    if tracks:
+        items = []
+        for index in range(tracks):
+            track = spotify_track(rng, index, album)
+            del track['album']
+            items.append(track)
+        album['tracks'] = _pages(items, page_size, f"https://api.spotify.com/v1/albums/{album_id}/tracks")
+    return album
+
+
+def _pages(items, page_size, href):
+    """Chain items into Spotify paging objects linked by 'next'"""
+    pages = []
+    for offset in range(0, max(len(items), 1), page_size):
+        pages.append({
+            'href': f"{href}?offset={offset}&limit={page_size}",
+            'items': items[offset:offset + page_size],
+            'limit': page_size,
+            'offset': offset,
+            'total': len(items),
+            'next': None,
+        })
+    for page, following in zip(pages, pages[1:]):
+        page['next'] = following['href']
+    # Pages after the first are fetched with sp.next; keep them addressable by href
+    first = pages[0]
+    first['_pages'] = {page['href']: {k: v for k, v in page.items()} for page in pages[1:]}
+    return first
+
+
+def spotify_playlist(tracks, seed=0):
+    """A playlist object whose 'tracks' paging object holds (and links to) every item.
+
+    As in real playlists, a few items are tracks since removed from Spotify
+    (track None) or local files (is_local, no id).
+    """
+    rng = random.Random(f"playlist:{seed}:{tracks}")
+    items = []
+    for n in range(tracks):
+        if n % 97 == 96:
+            track = None
+        elif n % 113 == 112:
+            track = spotify_local_track(rng)
+        else:
+            track = spotify_track(rng, n)
+        items.append({
+            'added_at': '2024-01-01T00:00:00Z',
+            'added_by': {'id': 'curator', 'type': 'user', 'uri': 'spotify:user:curator'},
+            'is_local': bool(track and track['is_local']),
+            'primary_color': None,
+            'track': track,
+            'video_thumbnail': {'url': None},
+        })
+    playlist_id = _spotify_id(rng)
+    return {
+        'id': playlist_id,
+        'name': _phrase(rng, 2),
+        'tracks': _pages(items, 100, f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"),
+    }
+
+
+def spotify_album(tracks, seed=0):
+    rng = random.Random(f"album:{seed}:{tracks}")
+    return spotify_album_object(rng, tracks)
+
+
+class FixtureSpotify:
+    """Answers the spotipy calls spotify_meta makes from fixture objects"""
+
+    def __init__(self, playlist=None, album=None):
+        self._playlist = playlist
+        self._album = album
+        self._pages = {}
+        for obj, key in ((playlist, 'tracks'), (album, 'tracks')):
+            if obj:
+                self._pages.update(obj[key].get('_pages', {}))
+
+    def playlist(self, playlist_id):
+        return self._playlist
+
+    def album(self, album_id):
+        return self._album
+
+    def next(self, page):
+        return self._pages.get(page['next'])
+
+
+class ReplayYoutubeDLPool:
+    """Stands in for bot.ytdl_pool, answering 'ytsearchN:query' from search payloads"""
+
+    def __init__(self, payloads):
+        """payloads: {query: payload}; a payload is cut down to the requested depth"""
+        self._payloads = payloads
+
+    def extract_info(self, purpose, url, download=False):
+        prefix, query = url.split(':', 1)
+        depth = int(prefix[len('ytsearch'):] or 1)
+        payload = self._payloads[query]
+        return dict(payload, entries=payload['entries'][:depth])
+
+
+def mp3_bytes(size_bytes):
+    """Roughly size_bytes of silent 128 kbit/s 44.1 kHz MPEG-1 Layer III frames"""
+    header = bytes((0xFF, 0xFB, 0x90, 0x64))
+    frame = header + bytes(417 - len(header))
+    return frame * max(1, size_bytes // len(frame))
+
+
+def synthetic_mp3(path, size_bytes):
+    """Write an MP3 of roughly size_bytes"""
+    with open(path, 'wb') as f:
+        f.write(mp3_bytes(size_bytes))
+    return path
+
+
+def synthetic_cover(size_bytes=100 * 1024, seed=0):
+    """JPEG-marked random bytes standing in for album art (taggers do not decode it)"""
+    rng = random.Random(seed)
+    return b'\xff\xd8\xff\xe0' + bytes(rng.getrandbits(8) for _ in range(size_bytes - 6)) + b'\xff\xd9'
@@ -0,0 +1,119 @@
+"""Timing, memory and baseline comparison for the benchmark suite."""
+import gc
+import json
+import os
+import platform
+import time
+import tracemalloc
+
+
+class Benchmark:
+    def __init__(self, name, func, setup=None, teardown=None):
+        """func() is the measured call; setup()/teardown() run once around all of its calls"""
+        self.name = name
+        self.func = func
+        self.setup = setup
+        self.teardown = teardown
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def measure(bench, min_time=1.0, min_iterations=5, warmup=3):
+    """Run bench.func repeatedly for at least min_time seconds; returns a result dict.
+
+    Latencies come from a plain timed loop; peak memory from one extra call
+    under tracemalloc, so tracing overhead never skews the timings.
+    """
+    if bench.setup:
+        bench.setup()
+    try:
+        for _ in range(warmup):
+            bench.func()
+        gc.collect()
+        latencies = []
+        started = time.perf_counter()
+        while len(latencies) < min_iterations or time.perf_counter() - started < min_time:
+            call_start = time.perf_counter_ns()
+            bench.func()
+            latencies.append(time.perf_counter_ns() - call_start)
+        elapsed = time.perf_counter() - started
+        tracemalloc.start()
+        try:
+            bench.func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    finally:
+        if bench.teardown:
+            bench.teardown()
+    latencies.sort()
+    return {
+        'iterations': len(latencies),
+        'ops_per_sec': round(len(latencies) / elapsed, 2),
+        'mean_ms': round(sum(latencies) / len(latencies) / 1e6, 4),
+        'p50_ms': round(percentile(latencies, 0.50) / 1e6, 4),
+        'p95_ms': round(percentile(latencies, 0.95) / 1e6, 4),
+        'p99_ms': round(percentile(latencies, 0.99) / 1e6, 4),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def environment():
+    return {'python': platform.python_version(), 'machine': platform.machine(), 'system': platform.system()}
+
+
+def save_baseline(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['results']
+
+
+def compare(results, baseline, threshold):
+    """Regressions beyond threshold (0.1 = 10%) against a baseline: [(name, metric, old, new, change)].
+
+    Throughput regresses when ops/sec falls, latency (p95) and peak memory
+    when they grow. Benchmarks missing from either side are skipped.
+    """
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        checks = (
+            ('ops_per_sec', old['ops_per_sec'], result['ops_per_sec'], -1),
+            ('p95_ms', old['p95_ms'], result['p95_ms'], 1),
+            ('peak_kib', old['peak_kib'], result['peak_kib'], 1),
+        )
+        for metric, before, after, direction in checks:
+            if not before:
+                continue
+            change = (after - before) / before
+            if change * direction > threshold:
+                regressions.append((name, metric, before, after, change))
+    return regressions
+
+
+def format_table(results, baseline=None):
+    header = f"{'benchmark':<44} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak KiB':>9}"
+    if baseline is not None:
+        header += f" {'vs base':>8}"
+    lines = [header, '-' * len(header)]
+    for name, r in results.items():
+        line = (
+            f"{name:<44} {r['ops_per_sec']:>10.1f} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} "
+            f"{r['p99_ms']:>9.3f} {r['peak_kib']:>9.1f}"
+        )
+        if baseline is not None:
+            old = baseline.get(name)
+            line += f" {(r['ops_per_sec'] / old['ops_per_sec'] - 1) * 100:>+7.1f}%" if old else f" {'new':>8}"
+        lines.append(line)
+    return '\n'.join(lines)
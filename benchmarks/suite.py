@@ -0,0 +1,88 @@
+"""The benchmarked functions, driven from fixtures only.
+
+bot is imported with a throwaway DATA_DIR (and a placeholder token when
+none is set), and its yt-dlp pool is swapped for a replay of search
+payloads, so nothing here touches the network or the real caches.
+"""
+import logging
+import os
+
+from benchmarks import fixtures
+from benchmarks.harness import Benchmark
+
+MP3_SIZES = {'1mb': 1 << 20, '5mb': 5 << 20, '10mb': 10 << 20}
+
+
+def load_bot(data_dir):
+    os.environ['DATA_DIR'] = data_dir
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', '0:benchmark')
+    import bot
+    # Per-call INFO lines would measure the log handler, not the function
+    logging.getLogger().setLevel(logging.WARNING)
+    return bot
+
+
+def build(workdir):
+    """All benchmarks, using workdir for bot's data and the synthetic audio files"""
+    bot = load_bot(os.path.join(workdir, 'data'))
+    import matcher
+    import spotify_meta
+
+    confident = ('Daft Punk', 'Something About Us')
+    widened = ('Obscure Artist', 'Unlisted Demo Take')
+    payloads = {
+        f"{artist} - {title}": fixtures.load_fixture(
+            f"ytsearch-{slug}",
+            lambda artist=artist, title=title, match=match: fixtures.youtube_search(
+                artist, title, max(bot.SEARCH_DEPTHS), include_match=match
+            )
+        )
+        for (artist, title), slug, match in ((confident, 'confident', True), (widened, 'widened', False))
+    }
+    bot.ytdl_pool = fixtures.ReplayYoutubeDLPool(payloads)
+    deep_entries = payloads[f"{widened[0]} - {widened[1]}"]['entries']
+
+    playlist = fixtures.load_fixture('spotify-playlist', lambda: fixtures.spotify_playlist(500))
+    album = fixtures.load_fixture('spotify-album-60', lambda: fixtures.spotify_album(60))
+    spotify = fixtures.FixtureSpotify(playlist=playlist, album=album)
+    playlist_tracks = spotify_meta.fetch_playlist(spotify, 'x')[1]
+    results_50 = bot.spotify_results(playlist_tracks[:50])
+
+    benches = [
+        Benchmark(
+            'search_youtube_fast[confident]',
+            lambda: bot.search_youtube_fast(f"{confident[0]} - {confident[1]}", duration_ms=210_000)
+        ),
+        Benchmark(
+            'search_youtube_fast[widened]',
+            lambda: bot.search_youtube_fast(f"{widened[0]} - {widened[1]}", duration_ms=210_000)
+        ),
+        Benchmark(
+            f'matcher.best_match[{len(deep_entries)}]',
+            lambda: matcher.best_match(deep_entries, widened[0], widened[1], 210)
+        ),
+        Benchmark('render_search_page[page0]', lambda: bot.render_search_page(results_50, 0)),
+        Benchmark('render_search_page[page4]', lambda: bot.render_search_page(results_50, 4)),
+        Benchmark(
+            'sanitize_filename',
+            lambda: bot.sanitize_filename('AC/DC: "Back In Black" <Remastered> | Live? *2003*')
+        ),
+        Benchmark(
+            f'results[playlist-{len(playlist_tracks)}]',
+            lambda: bot.spotify_results(spotify_meta.fetch_playlist(spotify, 'x')[1])
+        ),
+        Benchmark(
+            'results[album-60]',
+            lambda: bot.spotify_results(spotify_meta.fetch_album(spotify, 'x')[1])
+        ),
+    ]
+
+    cover = fixtures.synthetic_cover()
+    track_info = {'name': 'Something About Us', 'artist': 'Daft Punk', 'album': 'Discovery', 'track_number': 10}
+    for label, size in MP3_SIZES.items():
+        path = fixtures.synthetic_mp3(os.path.join(workdir, f"{label}.mp3"), size)
+        benches.append(Benchmark(
+            f'add_metadata_fast[mp3-{label}]',
+            lambda path=path: bot.add_metadata_fast(path, track_info, cover)
+        ))
+    return benches
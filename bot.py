@@ -1,19 +1,5 @@
-# Pagination state for each user
-user_search_state = {}
-from flask import Flask
-from threading import Thread
-
-app = Flask('')
-
-@app.route('/')
-def home():
-    return "✅ Bot is alive!"
-
-def run_flask():
-    app.run(host="0.0.0.0", port=8080)
-
-# Start the Flask server in a separate thread
-Thread(target=run_flask).start()
+from startup import StartupTimer
+startup_timer = StartupTimer()
 import sys
 import subprocess
 import os
@@ -33,35 +19,70 @@ def check_and_install_requirements():
         print(f"❌ Failed to install requirements: {e}")
         sys.exit(1)
 
-check_and_install_requirements()
 load_dotenv()
+# Dependencies belong in the image (see Dockerfile); installing on every start is opt-in for ad-hoc hosts
+if os.environ.get('INSTALL_REQUIREMENTS', '').lower() in ('1', 'true', 'yes'):
+    check_and_install_requirements()
+    startup_timer.mark('requirements')
 print("🚀 Starting the music downloader bot...")
 
-import os
 import re
 import logging
 import tempfile
+import socket
 import asyncio
-import aiohttp
-import concurrent.futures
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
-import yt_dlp
-from mutagen.id3 import ID3, APIC, TIT2, TPE1, TALB, TRCK
-from mutagen.mp3 import MP3
-import requests
-from telegram import Update
+import threading
+import contextlib
+import contextvars
+import functools
+from telegram import Update, InputMediaAudio, InputMediaDocument
+from telegram.error import BadRequest
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 from urllib.parse import urlparse, parse_qs
 import time
+from file_id_cache import FileIdCache
+from resolution_cache import ResolutionCache
+from batch import BatchEngine, Stage
+from loop_monitor import LoopMonitor
+import matcher
+from singleflight import SingleFlight, SharedError
+from ytdl_pool import YoutubeDLPool
+import tagging
+from executors import InstrumentedExecutor
+from cover_cache import CoverCache
+from audio_cache import AudioCache
+from scheduler import FairScheduler, INTERACTIVE, BULK, PRIORITY_NAMES
+from recipient import Recipient
+from batch_store import BatchStore, RESOLVED, DOWNLOADED, SENT, FAILED
+from job_queue import open_queue
+from http_server import HttpServer
+import metrics
+import tracing
+from progress import ProgressReporter, progress_bar
+from send_queue import SendQueue, MediaGroupBatcher
+from sessions import Result, SearchSession, open_session_store
+import hashlib
+import signal
+import spotify_meta
+startup_timer.mark('imports')
 
 # Enable logging
 logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    format='%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s',
     level=logging.INFO
 )
+for _handler in logging.getLogger().handlers:
+    _handler.addFilter(tracing.TraceIdFilter())
 logger = logging.getLogger(__name__)
 
+# One JSON line per request on the 'trace' logger: every failed or slow request, plus a sample
+# of the rest. LOG_SEARCH_PAYLOADS=1 additionally logs raw yt-dlp search results (very verbose).
+tracer = tracing.Tracer(
+    sample_rate=float(os.environ.get('TRACE_SAMPLE_RATE', 0.01)),
+    slow_seconds=float(os.environ.get('TRACE_SLOW_SECONDS', 20))
+)
+LOG_SEARCH_PAYLOADS = os.environ.get('LOG_SEARCH_PAYLOADS', '').lower() in ('1', 'true', 'yes')
+
 # Telegram Bot Token
 TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
 
@@ -71,6 +92,8 @@ SPOTIFY_CLIENT_SECRET = os.environ.get('SPOTIFY_CLIENT_SECRET')
 # Set up Spotify client
 def setup_spotify_client():
     """Set up and return Spotify client"""
+    import spotipy
+    from spotipy.oauth2 import SpotifyClientCredentials
     # Create a dedicated cache folder for Spotipy token
     # Remove cache_path, use default Spotipy client credentials (no persistent cache)
     auth_manager = SpotifyClientCredentials(
@@ -82,265 +105,1063 @@ def setup_spotify_client():
     logging.getLogger('spotipy.cache_handler').setLevel(logging.ERROR)
     return spotipy.Spotify(auth_manager=auth_manager)
 
-# Initialize Spotify client
-sp = setup_spotify_client()
+# Spotify client, built on first use (spotipy is slow to import and not needed to start)
+sp = None
+_sp_lock = threading.Lock()
+
+def get_spotify():
+    global sp
+    if sp is None:
+        with _sp_lock:
+            if sp is None:
+                sp = setup_spotify_client()
+    return sp
+
+def with_spotify(func, *args):
+    """func(spotify_client, *args); run it in the executor so the first call's setup stays off the loop"""
+    client = get_spotify()
+    with timed_stage('spotify_lookup'):
+        return func(client, *args)
+
+# Thread pools for parallel execution: network-bound work (Spotify, YouTube search, downloads)
+# and CPU-bound work (ffmpeg, tagging) are sized and queued independently
+IO_WORKERS = int(os.environ.get('IO_WORKERS', 16))
+CPU_WORKERS = int(os.environ.get('CPU_WORKERS', os.cpu_count() or 2))
+io_executor = InstrumentedExecutor('io', IO_WORKERS)
+cpu_executor = InstrumentedExecutor('cpu', CPU_WORKERS)
+
+# Global caps on searches, downloads and transcodes, shared round-robin between users;
+# single-track requests go ahead of batch items
+scheduler = FairScheduler({
+    'search': int(os.environ.get('MAX_CONCURRENT_SEARCHES', 8)),
+    'download': int(os.environ.get('MAX_CONCURRENT_DOWNLOADS', 6)),
+    'transcode': int(os.environ.get('MAX_CONCURRENT_TRANSCODES', CPU_WORKERS)),
+})
+
+# Persistent state (caches, indexes) lives here
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+FFMPEG_TIMEOUT = int(os.environ.get('FFMPEG_TIMEOUT', 300))
+
+# Delivery formats. 'mp3' transcodes; 'm4a' and 'opus' remux the native stream without re-encoding
+# ('copy_codecs' are source codecs ffmpeg can stream-copy, 'encode' is used for anything else).
+# 'profile' is part of every cache key so different formats never share a file_id.
+AUDIO_FORMATS = {
+    'mp3': {
+        'profile': 'mp3-160',
+        'format': 'bestaudio[ext=m4a]/bestaudio/best',  # Prefer m4a (fast, good quality), fallback to best
+        'ext': 'mp3',
+        'copy_codecs': ('mp3',),
+        'encode': ['-c:a', 'libmp3lame', '-b:a', '160k'],  # Slightly lower for speed, still good quality
+        'send_as': 'audio',
+    },
+    'm4a': {
+        'profile': 'm4a',
+        'format': 'bestaudio[ext=m4a]/bestaudio[acodec^=mp4a]/bestaudio/best',
+        'ext': 'm4a',
+        'copy_codecs': ('mp4a', 'aac'),
+        'encode': ['-c:a', 'aac', '-b:a', '192k'],
+        'send_as': 'audio',
+    },
+    'opus': {
+        'profile': 'opus',
+        'format': 'bestaudio[acodec=opus]/bestaudio/best',
+        'ext': 'opus',
+        'copy_codecs': ('opus',),
+        'encode': ['-c:a', 'libopus', '-b:a', '128k'],
+        # Telegram's audio player only takes MP3/M4A
+        'send_as': 'document',
+    },
+}
+DEFAULT_AUDIO_FORMAT = os.environ.get('AUDIO_FORMAT', 'mp3')
+if DEFAULT_AUDIO_FORMAT not in AUDIO_FORMATS:
+    logger.warning(f"Unknown AUDIO_FORMAT '{DEFAULT_AUDIO_FORMAT}', using mp3")
+    DEFAULT_AUDIO_FORMAT = 'mp3'
+
+# Per-user delivery format chosen with /format
+user_audio_format = {}
+
+def audio_format_for(update):
+    """Delivery format for the user behind an update"""
+    user = update.effective_user if update else None
+    return user_audio_format.get(user.id, DEFAULT_AUDIO_FORMAT) if user else DEFAULT_AUDIO_FORMAT
+
+# Telegram file_ids of tracks we already uploaded, surviving restarts
+file_id_cache = FileIdCache(os.path.join(DATA_DIR, 'file_ids.sqlite3'))
+
+# Spotify track id -> YouTube URL, so repeat requests skip the YouTube search
+RESOLUTION_CACHE_TTL = int(os.environ.get('RESOLUTION_CACHE_TTL', 30 * 24 * 3600))
+RESOLUTION_NEGATIVE_TTL = int(os.environ.get('RESOLUTION_NEGATIVE_TTL', 24 * 3600))
+resolution_cache = ResolutionCache(
+    os.path.join(DATA_DIR, 'resolutions.sqlite3'),
+    ttl=RESOLUTION_CACHE_TTL,
+    negative_ttl=RESOLUTION_NEGATIVE_TTL
+)
+
+# Album art by URL (memory LRU + bounded disk store), with Telegram-sized thumbnails
+cover_cache = CoverCache(
+    os.path.join(DATA_DIR, 'covers'),
+    max_bytes=int(os.environ.get('COVER_CACHE_BYTES', 200 * 1024 * 1024)),
+    timeout=(3, float(os.environ.get('COVER_FETCH_TIMEOUT', 10))),
+    deadline=float(os.environ.get('COVER_FETCH_TIMEOUT', 10)),
+    ffmpeg=FFMPEG_BINARY
+)
+
+# Finished audio files by (YouTube id, format profile); AUDIO_CACHE_BYTES=0 disables it
+audio_cache = AudioCache(
+    os.path.join(DATA_DIR, 'audio'),
+    max_bytes=int(os.environ.get('AUDIO_CACHE_BYTES', 5 * 1024 * 1024 * 1024))
+)
+
+# Batch jobs and per-track progress, so an interrupted batch resumes after a restart
+batch_store = BatchStore(os.path.join(DATA_DIR, 'batches.sqlite3'))
+
+# Each user's current result listing (search, album, playlist, artist) for paging and picking by number;
+# idle sessions expire, and the in-memory store evicts the least recently used beyond SEARCH_SESSION_BYTES
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'memory')
+sessions = open_session_store(
+    SESSION_BACKEND,
+    os.environ.get('SESSION_URL'),
+    ttl=int(os.environ.get('SEARCH_SESSION_TTL', 3600)),
+    max_bytes=int(os.environ.get('SEARCH_SESSION_BYTES', 64 * 1024 * 1024))
+)
+
+# Process role: 'standalone' does everything; 'frontend' only talks to Telegram and queues
+# deliveries; 'worker' takes deliveries off the queue, downloads and uploads them.
+# Add download capacity by starting more workers (each with its own WORKER_ID).
+BOT_MODE = os.environ.get('BOT_MODE', 'standalone')
+if BOT_MODE not in ('standalone', 'frontend', 'worker'):
+    logger.warning(f"Unknown BOT_MODE '{BOT_MODE}', running standalone")
+    BOT_MODE = 'standalone'
+# memory, sqlite or redis (the redis backend needs: pip install -r requirements-redis.txt)
+QUEUE_BACKEND = os.environ.get('QUEUE_BACKEND', 'memory')
+if BOT_MODE != 'standalone' and QUEUE_BACKEND == 'memory':
+    # A memory queue lives in one process: a frontend's tasks would never reach a worker
+    logger.error(f"BOT_MODE={BOT_MODE} needs a shared queue: set QUEUE_BACKEND to sqlite or redis")
+    sys.exit(1)
+# Unique per process by default; set it explicitly (and keep it across restarts) so a restarted
+# worker requeues the tasks it had taken when it crashed
+WORKER_ID = os.environ.get('WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+WORKER_CONCURRENCY = int(os.environ.get('WORKER_CONCURRENCY', 4))
+task_queue = None
+if BOT_MODE != 'standalone':
+    task_queue = open_queue(
+        QUEUE_BACKEND,
+        os.environ.get('QUEUE_URL') or (os.path.join(DATA_DIR, 'queue.sqlite3') if QUEUE_BACKEND == 'sqlite' else None),
+        worker_id=WORKER_ID
+    )
+
+# Logs (with the offending stack) whenever something blocks the event loop
+loop_monitor = LoopMonitor(
+    interval=float(os.environ.get('LOOP_MONITOR_INTERVAL', 0.1)),
+    threshold=float(os.environ.get('LOOP_STALL_THRESHOLD', 0.5))
+)
+
+# Every message, status edit and upload to a chat is spaced out to fit Telegram's per-chat and
+# global flood limits, and retried after RetryAfter; different chats send concurrently.
+# Handlers reply with reply_text() and edit status messages through progress, never directly.
+send_queue = SendQueue(
+    global_rate=float(os.environ.get('SEND_GLOBAL_RATE', 30)),
+    private_rate=float(os.environ.get('SEND_CHAT_RATE', 1)),
+    group_rate=float(os.environ.get('SEND_GROUP_CHAT_RATE', 20 / 60)),
+    concurrency=int(os.environ.get('SEND_CONCURRENCY', 8)),
+    max_retries=int(os.environ.get('SEND_MAX_RETRIES', 5))
+)
+Recipient.send_queue = send_queue
+
+# Status-message edits, coalesced to at most one per message per interval and sent in the background
+progress = ProgressReporter(interval=float(os.environ.get('PROGRESS_EDIT_INTERVAL', 2.0)), send_queue=send_queue)
+# Batch tracks that are ready together go out as one album of up to MEDIA_GROUP_SIZE (1 disables);
+# a partial album waits at most MEDIA_GROUP_LINGER seconds for more tracks
+MEDIA_GROUP_SIZE = int(os.environ.get('MEDIA_GROUP_SIZE', 10))
+MEDIA_GROUP_LINGER = float(os.environ.get('MEDIA_GROUP_LINGER', 5))
+
+# Prometheus metrics, scraped from /metrics: per-stage latency histograms and delivery/byte
+# counters are updated in place; gauges and cache counters are read from the components at scrape time
+metrics_registry = metrics.Registry()
+stage_seconds = metrics_registry.histogram(
+    'musicbot_stage_seconds', 'Time spent in each pipeline stage', labels=('stage',)
+)
+deliveries_total = metrics_registry.counter(
+    'musicbot_deliveries_total', 'Track deliveries by source and outcome (uploaded, cached, failed)',
+    labels=('source', 'outcome')
+)
+downloaded_bytes_total = metrics_registry.counter(
+    'musicbot_downloaded_bytes_total', 'Audio bytes downloaded from YouTube'
+)
+uploaded_bytes_total = metrics_registry.counter(
+    'musicbot_uploaded_bytes_total', 'Audio bytes uploaded to Telegram'
+)
+
+@contextlib.contextmanager
+def timed_stage(name):
+    """Time a pipeline stage into stage_seconds and as a span of the current trace"""
+    with stage_seconds.time(stage=name), tracing.span(name):
+        yield
+
+def source_type(key_or_url):
+    """'spotify', 'youtube' or 'other' for a source_key or a link"""
+    if not key_or_url:
+        return 'other'
+    if ':spotify:' in key_or_url or extract_spotify_id(key_or_url):
+        return 'spotify'
+    if ':youtube:' in key_or_url or extract_youtube_id(key_or_url):
+        return 'youtube'
+    return 'other'
+
+def count_delivery(key_or_url, outcome):
+    deliveries_total.inc(source=source_type(key_or_url), outcome=outcome)
+    if outcome == 'failed':
+        tracing.fail(f"delivery failed: {key_or_url}")
+
+def traced(name):
+    """Run a Telegram handler as one trace, tagged with the user"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(update, context):
+            with tracer.trace(name, user_id=user_id_of(update)):
+                return await handler(update, context)
+        return wrapper
+    return decorator
+
+@metrics_registry.collector
+def collect_metrics():
+    executors = [(pool.name, pool.stats()) for pool in (io_executor, cpu_executor)]
+    resources = scheduler.stats()
+    # In-memory counters only: the SQLite-backed caches' stats() would query the database on the loop
+    caches = {
+        'audio': audio_cache.stats(),
+        'cover': cover_cache.stats(),
+    }
+    # (hits, misses) per cache; negative resolutions and covers found on disk count as hits
+    lookups = {
+        'file_id': (file_id_cache.hits, file_id_cache.misses),
+        'resolution': (resolution_cache.hits + resolution_cache.negative_hits, resolution_cache.misses),
+        'audio': (caches['audio']['hits'], caches['audio']['misses']),
+        'cover': (caches['cover']['hits'] + caches['cover']['disk_hits'], caches['cover']['fetches']),
+    }
+    loop = loop_monitor.stats()
+    progress_stats = progress.stats()
+    send_queue_stats = send_queue.stats()
+    families = [
+        ('musicbot_executor_queued', 'gauge', 'Tasks waiting for a pool thread',
+         [({'pool': name}, stats['queued']) for name, stats in executors]),
+        ('musicbot_executor_active', 'gauge', 'Pool threads running a task',
+         [({'pool': name}, stats['active']) for name, stats in executors]),
+        ('musicbot_executor_max_workers', 'gauge', 'Pool size',
+         [({'pool': name}, stats['max_workers']) for name, stats in executors]),
+        ('musicbot_executor_wait_seconds_total', 'counter', 'Total time tasks spent queued for a pool thread',
+         [({'pool': name}, stats['wait_seconds_total']) for name, stats in executors]),
+        ('musicbot_scheduler_active', 'gauge', 'Scheduler slots in use',
+         [({'resource': resource}, stats['active']) for resource, stats in resources.items()]),
+        ('musicbot_scheduler_limit', 'gauge', 'Scheduler slots available',
+         [({'resource': resource}, stats['limit']) for resource, stats in resources.items()]),
+        ('musicbot_scheduler_waiting', 'gauge', 'Requests waiting for a scheduler slot',
+         [({'resource': resource, 'priority': name}, stats[name]['waiting'])
+          for resource, stats in resources.items() for name in PRIORITY_NAMES]),
+        ('musicbot_cache_hits_total', 'counter', 'Cache lookups answered from the cache',
+         [({'cache': cache}, hits) for cache, (hits, _) in lookups.items()]),
+        ('musicbot_cache_misses_total', 'counter', 'Cache lookups that had to do the work',
+         [({'cache': cache}, misses) for cache, (_, misses) in lookups.items()]),
+        ('musicbot_cache_hit_ratio', 'gauge', 'Share of cache lookups answered from the cache',
+         [({'cache': cache}, round(hits / (hits + misses), 4) if hits + misses else 0.0)
+          for cache, (hits, misses) in lookups.items()]),
+        ('musicbot_audio_cache_bytes', 'gauge', 'Bytes held by the audio cache', [({}, caches['audio']['bytes'])]),
+        ('musicbot_singleflight_coalesced_total', 'counter', 'Requests that joined identical in-flight work',
+         [({'flight': flight.name}, flight.coalesced)
+          for flight in (resolve_flights, download_flights, upload_flights, cover_flights)]),
+        ('musicbot_event_loop_stalls_total', 'counter', 'Event loop stalls over the threshold', [({}, loop['stalls'])]),
+        ('musicbot_event_loop_blocked_seconds_total', 'counter', 'Time the event loop was blocked',
+         [({}, loop['blocked_seconds_total'])]),
+        ('musicbot_sent_messages_total', 'counter', 'Messages sent through the send queue',
+         [({}, send_queue_stats['sent'])]),
+        ('musicbot_send_retries_total', 'counter', 'Sends retried after RetryAfter', [({}, send_queue_stats['retries'])]),
+        ('musicbot_send_failures_total', 'counter', 'Sends that failed for good', [({}, send_queue_stats['failed'])]),
+        ('musicbot_send_wait_seconds_total', 'counter', 'Time sends waited for their chat or global budget',
+         [({}, send_queue_stats['waited_seconds'])]),
+        ('musicbot_status_edits_total', 'counter', 'Status message updates by result',
+         [({'result': 'sent'}, progress_stats['edits']), ({'result': 'coalesced'}, progress_stats['coalesced']),
+          ({'result': 'failed'}, progress_stats['errors'])]),
+        ('musicbot_status_flood_waits_total', 'counter', 'Status edits Telegram answered with RetryAfter',
+         [({}, progress_stats['flood_waits'])]),
+        ('musicbot_webhook_updates_total', 'counter', 'Webhook updates by result',
+         [({'result': 'accepted'}, http_server.updates_accepted),
+          ({'result': 'rejected'}, http_server.updates_rejected)]),
+    ]
+    session_stats = sessions.stats()
+    if 'bytes' in session_stats:
+        families.extend([
+            ('musicbot_search_sessions', 'gauge', 'Search sessions held in memory', [({}, session_stats['sessions'])]),
+            ('musicbot_search_session_bytes', 'gauge', 'Approximate bytes held by search sessions',
+             [({}, session_stats['bytes'])]),
+            ('musicbot_search_sessions_evicted_total', 'counter', 'Search sessions dropped for the memory cap',
+             [({}, session_stats['evicted'])]),
+        ])
+    if task_queue_stats:
+        families.append(
+            ('musicbot_task_queue_depth', 'gauge', 'Delivery tasks waiting for a worker',
+             [({'backend': QUEUE_BACKEND}, task_queue_stats['queued'])])
+        )
+    return families
+
+# Task queue stats as of the last /metrics scrape (the sqlite/redis queues answer with a blocking query)
+task_queue_stats = {}
+
+async def render_metrics():
+    """/metrics; the task queue is queried on the I/O pool before rendering"""
+    if task_queue is not None:
+        task_queue_stats.update(await run_in_executor(task_queue.stats))
+    return metrics_registry.render()
+
+def read_store_stats():
+    """Stats of the SQLite/Redis-backed stores; blocking, so run it on the I/O pool"""
+    return {
+        'file_id_cache': file_id_cache.stats(),
+        'resolution_cache': resolution_cache.stats(),
+        'batch_jobs': batch_store.stats(),
+        'task_queue': task_queue.stats() if task_queue else None,
+    }
+
+async def collect_stats():
+    """Everything /stats reports"""
+    return {
+        **await run_in_executor(read_store_stats),
+        'cover_cache': cover_cache.stats(),
+        'audio_cache': audio_cache.stats(),
+        'startup': startup_timer.stats(),
+        'tracing': tracer.stats(),
+        'progress': progress.stats(),
+        'search_sessions': sessions.stats(),
+        'send_queue': send_queue.stats(),
+        'event_loop': loop_monitor.stats(),
+        'executors': {pool.name: pool.stats() for pool in (io_executor, cpu_executor)},
+        'scheduler': scheduler.stats(),
+        'ytdl_pool': ytdl_pool.stats(),
+        'singleflight': {
+            flight.name: flight.stats()
+            for flight in (resolve_flights, download_flights, upload_flights, cover_flights)
+        },
+    }
 
-# Thread pool for parallel execution
-executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+# One async HTTP server in the bot's own event loop: health/readiness, /stats and, when
+# WEBHOOK_URL is set, Telegram updates (instead of long polling)
+PORT = int(os.environ.get('PORT', 8080))
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL')
+WEBHOOK_PATH = os.environ.get('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET')
+# Beyond these backlogs webhook updates are refused with 503 and Telegram re-delivers them later
+MAX_PENDING_UPDATES = int(os.environ.get('MAX_PENDING_UPDATES', 200))
+MAX_QUEUED_WORK = int(os.environ.get('MAX_QUEUED_WORK', 2000))
+http_server = HttpServer(port=PORT, stats=collect_stats, metrics=render_metrics)
+startup_timer.mark('state')
 
 # Function to sanitize filenames
 def sanitize_filename(name):
     """Remove invalid characters from filenames"""
     return re.sub(r'[<>:"/\\|?*]', '', name)
 
+def extract_spotify_id(url, kind='track'):
+    """Return the Spotify id from an open.spotify.com link"""
+    if not url or f'/{kind}/' not in url:
+        return None
+    return url.split(f'/{kind}/')[-1].split('?')[0].split('/')[0] or None
+
+def extract_youtube_id(url):
+    """Return the video id from a youtube.com / youtu.be / music.youtube.com link"""
+    if not url:
+        return None
+    parsed = urlparse(url)
+    host = parsed.netloc.lower()
+    if host.endswith('youtu.be'):
+        return parsed.path.lstrip('/').split('/')[0] or None
+    if 'youtube.com' in host:
+        if parsed.path == '/watch':
+            return parse_qs(parsed.query).get('v', [None])[0]
+        for prefix in ('/shorts/', '/embed/', '/live/', '/v/'):
+            if parsed.path.startswith(prefix):
+                return parsed.path[len(prefix):].split('/')[0] or None
+    return None
+
+def source_key(url, audio_format=None):
+    """Cache key identifying the audio behind a Spotify or YouTube link in one delivery format"""
+    bot_id = (TELEGRAM_BOT_TOKEN or '').split(':')[0]
+    profile = AUDIO_FORMATS[audio_format or DEFAULT_AUDIO_FORMAT]['profile']
+    spotify_id = extract_spotify_id(url)
+    if spotify_id:
+        return f"{bot_id}:spotify:{spotify_id}:{profile}"
+    video_id = extract_youtube_id(url)
+    if video_id:
+        return f"{bot_id}:youtube:{video_id}:{profile}"
+    return None
+
 # Spotify functions
 def get_track_info(track_url):
     """Get track information from Spotify"""
     try:
         track_id = track_url.split('/')[-1].split('?')[0]
-        # Remove timeout from Spotify client
-        track = sp.track(track_id)
-        return {
-            'name': track['name'],
-            'artist': track['artists'][0]['name'],
-            'album': track['album']['name'],
-            'album_art': track['album']['images'][0]['url'] if track['album']['images'] else None,
-            'release_date': track['album']['release_date'],
-            'track_number': track['track_number'],
-            'duration_ms': track['duration_ms'],
-            'url': track_url
-        }
+        # Tracks seen in a playlist/album listing need no extra API call
+        info = spotify_meta.cached_track_info(track_id)
+        if info is None:
+            # Remove timeout from Spotify client
+            with timed_stage('spotify_lookup'):
+                info = spotify_meta.remember_track(get_spotify().track(track_id))
+        return dict(info, url=track_url)
     except Exception as e:
         logger.error(f"Error getting track info: {e}")
         return None
 
-# YouTube Music functions - OPTIMIZED
-def get_youtube_video_info_fast(url):
-    """Fast video information extraction"""
-    ydl_opts = {
+def spotify_results(tracks, uploader=None):
+    """Turn track_info dicts into selectable search results"""
+    return [
+        Result(info['id'], info['name'], uploader or info['artist'], int(info['duration_ms'] or 0) // 1000, info['url'])
+        for info in tracks
+    ]
+
+# Long-lived YoutubeDL instances, one set per purpose
+ytdl_pool = YoutubeDLPool(size=int(os.environ.get('YTDL_POOL_SIZE', IO_WORKERS)))
+ytdl_pool.register('info', {
+    'quiet': True,
+    'no_warnings': True,
+    'skip_download': True,
+    'ignoreerrors': True,
+    'extract_flat': 'in_playlist',
+    'force_json': True,
+})
+ytdl_pool.register('search', {
+    'quiet': True,
+    'extract_flat': True,
+    'force_json': True,
+    'ignoreerrors': True,
+    'noplaylist': True,
+})
+# Downloads fetch the native stream only; ffmpeg runs separately on the CPU pool
+for format_name, audio_format in AUDIO_FORMATS.items():
+    ytdl_pool.register(f'download:{format_name}', {
+        'format': audio_format['format'],
         'quiet': True,
         'no_warnings': True,
-        'skip_download': True,
         'ignoreerrors': True,
-        'extract_flat': 'in_playlist',
-        'force_json': True,
-    }
-    
+        'retries': 1,  # Fewer retries for speed
+        'fragment_retries': 1,
+        'skip_unavailable_fragments': True,
+        'noprogress': True,
+        'nooverwrites': True,
+        'nopart': True,
+        'http_chunk_size': 5242880,  # 5MB chunks for faster download
+        'concurrent_fragment_downloads': 2,  # Fewer parallel downloads for stability
+        'extract_flat': False,
+    })
+
+# YouTube Music functions - OPTIMIZED
+def get_youtube_video_info_fast(url):
+    """Fast video information extraction"""
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            return info
+        return ytdl_pool.extract_info('info', url)
     except Exception as e:
         logger.error(f"Error getting YouTube video info: {e}")
         return {"error": str(e)}
 
 # Fast search function
-def search_youtube_fast(query):
-    """Fast YouTube search"""
-    ydl_opts = {
-        'quiet': True,
-        'extract_flat': True,
-        'force_json': True,
-        'ignoreerrors': True,
-    'default_search': 'ytsearch50',  # Search top 50 results
-        'noplaylist': True,
-    }
+# Start with a shallow search and only widen it while the best match is unconvincing
+SEARCH_DEPTHS = [int(n) for n in os.environ.get('SEARCH_DEPTHS', '8,25').split(',')]
+MATCH_CONFIDENCE = float(os.environ.get('MATCH_CONFIDENCE', 0.75))
+# Below this the best candidate is not the track (wrong song, live/cover/loop versions): no match
+MATCH_MIN_SCORE = float(os.environ.get('MATCH_MIN_SCORE', 0.4))
+
+def search_youtube_fast(query, raise_errors=False, artist=None, title=None, duration_ms=None):
+    """Fast YouTube search, returning the URL of the best-scoring result.
+
+    Returns None when nothing scores at least MATCH_MIN_SCORE. With
+    raise_errors a failed search raises instead, so callers can tell
+    "searched, no match" from "could not search".
+    """
+    if artist is None or title is None:
+        parts = query.split(' - ', 1)
+        artist, title = (parts[0], parts[1]) if len(parts) == 2 else ('', query)
+    duration_s = duration_ms / 1000 if duration_ms else None
 
     try:
-        logger.warning(f"Starting YouTube search for query: '{query}'")
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(f"ytsearch50:{query}", download=False)
-            logger.warning(f"yt-dlp returned info: {info}")
-            if info and 'entries' in info and info['entries']:
-                query_lower = query.lower()
-                # Log all candidate results for debugging
-                logger.warning(f"YouTube search candidates for '{query}':")
-                for idx, entry in enumerate(info['entries']):
-                    if entry and 'title' in entry:
-                        logger.warning(f"[{idx+1}] Title: {entry['title']} | URL: {entry.get('url', 'N/A')}")
-                # Try to find the best match by comparing title and artist
-                for entry in info['entries']:
-                    if entry and 'title' in entry:
-                        title = entry['title'].lower()
-                        # Check for exact match
-                        if query_lower in title:
-                            return entry['url']
-                        # Check for partial match (artist and song)
-                        if all(part.strip() in title for part in query_lower.split(' - ')):
-                            return entry['url']
-                # Fallback: return the first result
-                return info['entries'][0]['url']
-            else:
-                logger.warning(f"No entries found in yt-dlp info for query: '{query}'. Raw info: {info}")
+        best, best_score = None, float('-inf')
+        for depth in SEARCH_DEPTHS:
+            with tracing.span('ytsearch', depth=depth):
+                info = ytdl_pool.extract_info('search', f"ytsearch{depth}:{query}")
+            if LOG_SEARCH_PAYLOADS:
+                logger.info(f"yt-dlp returned info for '{query}': {info}")
+            if info is None and raise_errors:
+                # ignoreerrors makes yt-dlp report network/extractor failures and return None
+                raise RuntimeError(f"YouTube search failed for '{query}'")
+            if not info or not info.get('entries'):
+                logger.warning(f"No entries found in yt-dlp info for query: '{query}'")
+                continue
+            entry, entry_score = matcher.best_match(info['entries'], artist, title, duration_s)
+            if entry is not None and entry_score > best_score:
+                best, best_score = entry, entry_score
+            if best_score >= MATCH_CONFIDENCE:
+                break
+        if best is not None and best_score >= MATCH_MIN_SCORE:
+            logger.info(f"Best match for '{query}': {best.get('title')} (score {best_score:.2f})")
+            tracing.annotate(match_score=round(best_score, 2))
+            return best['url']
+        if best is not None:
+            logger.warning(f"No match for '{query}': best was {best.get('title')} (score {best_score:.2f})")
     except Exception as e:
         logger.error(f"Fast search failed: {e}")
+        if raise_errors:
+            raise
 
     return None
 
+def is_youtube_url(url):
+    return bool(url) and url.startswith('http') and ('youtube.com' in url or 'youtu.be' in url)
+
+def resolve_youtube_url(spotify_id, artist, name, duration_ms=None):
+    """Find the YouTube video for a Spotify track, consulting the resolution cache first"""
+    if spotify_id:
+        found, youtube_url = resolution_cache.get(spotify_id)
+        if found:
+            logger.info(f"Resolution cache hit for {spotify_id}: {youtube_url}")
+            return youtube_url
+    try:
+        with timed_stage('youtube_search'):
+            youtube_url = search_youtube_fast(
+                f"{artist} - {name}", raise_errors=True, artist=artist, title=name, duration_ms=duration_ms
+            )
+    except Exception:
+        # Do not cache transient search failures as "no match"
+        return None
+    # None here means the searches ran and found nothing good enough: cached with the negative TTL
+    if not is_youtube_url(youtube_url):
+        youtube_url = None
+    if spotify_id:
+        resolution_cache.set(spotify_id, youtube_url)
+    return youtube_url
+
 # FAST Download functions
-def download_audio_fast(youtube_url, output_path, track_info=None):
+
+def fetch_audio_source(youtube_url, output_path, audio_format=None):
+    """Network step: download the native audio stream next to output_path.
+
+    Returns (source_path, acodec), or (None, None) on failure.
+    """
     import time
-    ydl_opts = {
-        'format': 'bestaudio[ext=m4a]/bestaudio/best',  # Prefer m4a (fast, good quality), fallback to best
-        'outtmpl': output_path.replace('.mp3', ''),
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '160',  # Slightly lower for speed, still good quality
-        }],
-        'quiet': True,
-        'no_warnings': True,
-        'ignoreerrors': True,
-        'retries': 1,  # Fewer retries for speed
-        'fragment_retries': 1,
-        'skip_unavailable_fragments': True,
-        'noprogress': True,
-        'nooverwrites': True,
-        'nopart': True,
-        'http_chunk_size': 5242880,  # 5MB chunks for faster download
-        'concurrent_fragment_downloads': 2,  # Fewer parallel downloads for stability
-        'extract_flat': False,
-    }
+    audio_format = audio_format or DEFAULT_AUDIO_FORMAT
+    base_path = os.path.splitext(output_path)[0]
+    # An empty placeholder at output_path would make yt-dlp skip the download
+    if os.path.exists(output_path) and os.path.getsize(output_path) == 0:
+        os.unlink(output_path)
+    logger.info(f"[Timing] yt-dlp download started for {youtube_url}")
+    start_time = time.time()
+    with timed_stage('download'):
+        info = ytdl_pool.download(f'download:{audio_format}', youtube_url, base_path + '.%(ext)s')
+    logger.info(f"[Timing] yt-dlp download finished in {time.time() - start_time:.2f} seconds.")
+    downloads = (info or {}).get('requested_downloads') or []
+    source_path = downloads[0].get('filepath') if downloads else None
+    if not source_path or not os.path.exists(source_path):
+        return None, None
+    downloaded_bytes_total.inc(os.path.getsize(source_path))
+    return source_path, info.get('acodec')
+
+def transcode_audio(source_path, output_path, acodec=None, audio_format=None, track_info=None, cover_path=None):
+    """CPU step: turn the downloaded stream into the tagged delivery file with one ffmpeg pass.
+
+    Streams already in the target codec are remuxed with -c:a copy. Tags
+    (and the cover, where the container supports it) are written by the
+    same pass, so the output file is written exactly once.
+    """
+    import time
+    audio_format = AUDIO_FORMATS[audio_format or DEFAULT_AUDIO_FORMAT]
+    if source_path == output_path and not track_info:
+        return True
+    if acodec and acodec.split('.')[0] in audio_format['copy_codecs']:
+        codec_args = ['-c:a', 'copy']
+    else:
+        codec_args = audio_format['encode']
+    # ffmpeg cannot write in place; a download already in the target container is remuxed beside it
+    target_path = output_path
+    if source_path == output_path:
+        base, ext = os.path.splitext(output_path)
+        target_path = f"{base}.tagged{ext}"
+    command = [FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-y', '-i', source_path]
+    if cover_path and os.path.splitext(output_path)[1].lower() in tagging.FFMPEG_COVER_EXTS:
+        command += ['-i', cover_path]
+    else:
+        cover_path = None
+    command += codec_args
+    if track_info:
+        command += tagging.ffmpeg_tag_args(output_path, track_info, cover_path)
+    else:
+        command += ['-vn']
+    start_time = time.time()
     try:
-        logger.info(f"[Timing] yt-dlp download started for {youtube_url}")
-        start_time = time.time()
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([youtube_url])
-        logger.info(f"[Timing] yt-dlp download finished in {time.time() - start_time:.2f} seconds.")
-        base_path = output_path.replace('.mp3', '')
-        for ext in ['.mp3', '.m4a', '.webm']:
-            if os.path.exists(base_path + ext):
-                if ext != '.mp3':
-                    os.rename(base_path + ext, output_path)
-                if track_info:
-                    add_metadata_fast(output_path, track_info)
-                return True
+        with timed_stage('transcode'):
+            subprocess.run(command + [target_path], check=True, capture_output=True, timeout=FFMPEG_TIMEOUT)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        if isinstance(e, subprocess.TimeoutExpired):
+            logger.error(f"ffmpeg timed out after {FFMPEG_TIMEOUT}s for {source_path}")
+        else:
+            logger.error(f"ffmpeg failed for {source_path}: {e.stderr.decode(errors='replace')[-500:]}")
+        if os.path.exists(target_path) and target_path != output_path:
+            os.unlink(target_path)
         return False
+    finally:
+        if os.path.exists(source_path):
+            os.unlink(source_path)
+    if target_path != output_path:
+        os.replace(target_path, output_path)
+    logger.info(f"[Timing] ffmpeg ({' '.join(codec_args)}) finished in {time.time() - start_time:.2f} seconds.")
+    return True
+
+def needs_cover_tagging(output_path, cover):
+    """True when the cover could not be written by the ffmpeg pass (Opus)"""
+    return bool(cover) and os.path.splitext(output_path)[1].lower() not in tagging.FFMPEG_COVER_EXTS
+
+def download_audio_fast(youtube_url, output_path, track_info=None, audio_format=None):
+    """Download youtube_url to output_path in the given delivery format and tag it.
+
+    output_path's extension must match the format's. This runs every step in
+    the calling thread; the bot itself uses download_audio_async, which puts
+    the download and the ffmpeg/tagging steps on separate pools.
+    """
+    try:
+        album_art = (track_info or {}).get('album_art')
+        cover = cover_cache.fetch(album_art)
+        source_path, acodec = fetch_audio_source(youtube_url, output_path, audio_format)
+        if not source_path or not transcode_audio(
+            source_path, output_path, acodec, audio_format, track_info, cover_cache.path(album_art)
+        ):
+            return False
+        if needs_cover_tagging(output_path, cover):
+            add_metadata_fast(output_path, track_info, cover)
+        return True
     except Exception as e:
         logger.error(f"Fast download failed: {e}")
         return False
 
-def add_metadata_fast(file_path, track_info):
-    """Fast metadata addition"""
+async def download_audio_async(youtube_url, output_path, track_info=None, audio_format=None, user_id=None,
+                               priority=INTERACTIVE):
+    """download_audio_fast with network steps on the I/O pool and ffmpeg/tagging on the CPU pool.
+
+    The download and the transcode each wait for a scheduler slot on behalf of user_id.
+    """
     try:
-        audio = MP3(file_path, ID3=ID3)
-        try:
-            audio.add_tags()
-        except:
-            pass
-        audio['TIT2'] = TIT2(encoding=3, text=track_info.get('name', 'Unknown Title'))
-        audio['TPE1'] = TPE1(encoding=3, text=track_info.get('artist', 'Unknown Artist'))
-        # Add album art only if it's quick
-        if track_info.get('album_art'):
-            try:
-                # Remove timeout from requests.get
-                response = requests.get(track_info['album_art'])
-                if response.status_code == 200:
-                    audio.tags.add(
-                        APIC(
-                            encoding=3,
-                            mime='image/jpeg',
-                            type=3,
-                            desc='Cover',
-                            data=response.content
-                        )
-                    )
-            except:
-                pass
-        audio.save()
+        album_art = (track_info or {}).get('album_art')
+        # The cover is needed by the ffmpeg pass; fetch it while the audio downloads
+        (source_path, acodec), cover = await asyncio.gather(
+            scheduler.run('download', user_id, priority, run_in_executor, fetch_audio_source, youtube_url,
+                          output_path, audio_format),
+            get_cover(album_art)
+        )
+        if not source_path:
+            return False
+        async with scheduler.slot('transcode', user_id, priority):
+            if not await run_in_cpu_executor(
+                transcode_audio, source_path, output_path, acodec, audio_format, track_info,
+                cover_cache.path(album_art)
+            ):
+                return False
+            if needs_cover_tagging(output_path, cover):
+                await run_in_cpu_executor(add_metadata_fast, output_path, track_info, cover)
         return True
+    except Exception as e:
+        logger.error(f"Fast download failed: {e}")
+        return False
+
+def add_metadata_fast(file_path, track_info, cover=None):
+    """Fast metadata addition, in the file's native tag format"""
+    try:
+        with timed_stage('tagging'):
+            return tagging.tag_audio(file_path, track_info, cover)
     except Exception as e:
         logger.error(f"Error adding metadata: {e}")
         return False
 
 # Async functions for parallel processing
+# Both run func in a copy of the caller's context, so its spans and log lines join the caller's trace
 async def run_in_executor(func, *args):
-    """Run function in thread pool executor"""
+    """Run function in the network-bound thread pool"""
     loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, func, *args)
+    return await loop.run_in_executor(io_executor, contextvars.copy_context().run, func, *args)
+
+async def run_in_cpu_executor(func, *args):
+    """Run function in the CPU-bound pool (ffmpeg, tagging)"""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(cpu_executor, contextvars.copy_context().run, func, *args)
+
+# Telegram delivery helpers
+async def reply_with_media(recipient, media, name, artist, caption=None, audio_format=None, filename=None,
+                           thumbnail=None):
+    """Send audio (a file object or file_id) the way its delivery format requires"""
+    caption = caption or f"🎵 *{name}* by {artist}"
+    if AUDIO_FORMATS[audio_format or DEFAULT_AUDIO_FORMAT]['send_as'] == 'document':
+        return await recipient.send_document(
+            document=media,
+            caption=caption,
+            parse_mode='Markdown',
+            filename=filename,
+            thumbnail=thumbnail
+        )
+    return await recipient.send_audio(
+        audio=media,
+        title=name[:64],
+        performer=artist[:64],
+        caption=caption,
+        parse_mode='Markdown',
+        filename=filename,
+        thumbnail=thumbnail
+    )
+
+async def send_cached_audio(recipient, key, name=None, artist=None, caption=None, audio_format=None):
+    """Re-send a previously uploaded track by file_id. Returns True on a cache hit."""
+    if not key:
+        return False
+    cached = await run_in_executor(file_id_cache.get, key)
+    if not cached:
+        return False
+    name = name or cached['title'] or 'Unknown'
+    artist = artist or cached['performer'] or 'Unknown Artist'
+    try:
+        await reply_with_media(recipient, cached['file_id'], name, artist, caption, audio_format)
+        logger.info(f"file_id cache hit for {key}")
+        count_delivery(key, 'cached')
+        return True
+    except BadRequest as e:
+        # file_id expired or belongs to another bot; fall back to a fresh upload
+        logger.warning(f"Cached file_id rejected for {key}: {e}")
+        await run_in_executor(file_id_cache.delete, key)
+        return False
+
+async def send_audio_file(recipient, output_path, key, name, artist, caption=None, audio_format=None,
+                          thumbnail=None):
+    """Upload an audio file (with an optional thumbnail image path) and remember its file_id under key"""
+    ext = os.path.splitext(output_path)[1]
+    thumbnail_file = None
+    if thumbnail:
+        try:
+            thumbnail_file = open(thumbnail, 'rb')
+        except OSError:
+            # Evicted from the cover cache in the meantime; send without it
+            pass
+    try:
+        with open(output_path, 'rb') as audio_file, timed_stage('upload'):
+            message = await reply_with_media(
+                recipient, audio_file, name, artist, caption, audio_format,
+                filename=f"{sanitize_filename(artist)} - {sanitize_filename(name)}{ext}",
+                thumbnail=thumbnail_file
+            )
+    finally:
+        if thumbnail_file:
+            thumbnail_file.close()
+    uploaded_bytes_total.inc(os.path.getsize(output_path))
+    count_delivery(key, 'uploaded')
+    media = message and (message.audio or message.document)
+    if key and media:
+        await run_in_executor(file_id_cache.set, key, media.file_id, media.file_unique_id, name, artist)
+    return message
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+async def send_media_group(recipient, items, audio_format=None):
+    """Send ready tracks as one album (sendMediaGroup); returns True/False per item.
+
+    items: dicts with key, name, artist, caption, track_info and either
+    'file_id' (uploaded before) or 'path' (plus an optional 'thumbnail' path).
+    """
+    if len(items) == 1:
+        return [await send_group_item(recipient, items[0], audio_format)]
+    as_document = AUDIO_FORMATS[audio_format or DEFAULT_AUDIO_FORMAT]['send_as'] == 'document'
+    media = []
+    for item in items:
+        name, artist = item['name'], item['artist']
+        options = dict(caption=item['caption'], parse_mode='Markdown')
+        if item.get('file_id'):
+            source = item['file_id']
+        else:
+            ext = os.path.splitext(item['path'])[1]
+            options['filename'] = f"{sanitize_filename(artist)} - {sanitize_filename(name)}{ext}"
+            # Read off the event loop; InputMedia would otherwise read the whole file on it
+            source = await run_in_executor(read_bytes, item['path'])
+            if item.get('thumbnail'):
+                try:
+                    options['thumbnail'] = await run_in_executor(read_bytes, item['thumbnail'])
+                except OSError:
+                    # Evicted from the cover cache in the meantime; send without it
+                    pass
+        if as_document:
+            media.append(InputMediaDocument(source, **options))
+        else:
+            media.append(InputMediaAudio(source, title=name[:64], performer=artist[:64], **options))
+    try:
+        with timed_stage('upload'):
+            messages = await recipient.send_media_group(media)
+    except BadRequest as e:
+        # e.g. one cached file_id no longer valid; one by one re-uploads whatever needs it
+        logger.warning(f"Media group of {len(items)} rejected, sending one by one: {e}")
+        results = []
+        for item in items:
+            # One bad item must not lose the ones already sent (or stop the rest)
+            try:
+                results.append(await send_group_item(recipient, item, audio_format))
+            except Exception as e:
+                logger.error(f"Error sending {item['artist']} - {item['name']}: {e}")
+                results.append(False)
+        return results
+    for item, message in zip(items, messages):
+        if item.get('file_id'):
+            count_delivery(item['key'], 'cached')
+            continue
+        uploaded_bytes_total.inc(os.path.getsize(item['path']))
+        count_delivery(item['key'], 'uploaded')
+        sent = message.audio or message.document
+        if item['key'] and sent:
+            await run_in_executor(
+                file_id_cache.set, item['key'], sent.file_id, sent.file_unique_id, item['name'], item['artist']
+            )
+    return [True] * len(items)
+
+async def send_group_item(recipient, item, audio_format=None):
+    """One media group item on its own"""
+    if item.get('file_id'):
+        return await send_cached_audio(
+            recipient, item['key'], item['name'], item['artist'], item['caption'], audio_format
+        )
+    await upload_shared(
+        recipient, item['key'], item['path'], item['name'], item['artist'], item['caption'], audio_format,
+        item['track_info']
+    )
+    return True
+
+# Identical concurrent work across users runs once and is shared
+resolve_flights = SingleFlight('resolve')
+download_flights = SingleFlight('download')
+upload_flights = SingleFlight('upload')
+cover_flights = SingleFlight('cover')
+
+async def get_cover(url):
+    """Album art bytes for url; a batch sharing one cover fetches it once"""
+    if not url:
+        return None
+    cover = cover_cache.cached(url)
+    if cover is None:
+        cover, _ = await cover_flights.do(('cover', url), run_in_executor, cover_cache.fetch, url)
+    return cover
+
+async def get_thumbnail(track_info):
+    """Path of the track's cover as a Telegram thumbnail, or None"""
+    url = (track_info or {}).get('album_art')
+    if not url or await get_cover(url) is None:
+        return None
+    thumbnail, _ = await cover_flights.do(('thumbnail', url), run_in_cpu_executor, cover_cache.thumbnail, url)
+    return thumbnail
+
+def remove_file(path):
+    if not path or audio_cache.owns(path):
+        return
+    try:
+        os.unlink(path)
+    except OSError as cleanup_err:
+        logger.warning(f"Cleanup error: {cleanup_err}")
+
+# track_info fields the ffmpeg pass writes into the file (tagging.ffmpeg_tag_args) plus the cover
+TAG_FIELDS = ('name', 'artist', 'album', 'release_date', 'track_number', 'album_art')
+
+def tag_identity(track_info):
+    """Audio cache key part for the tags a file carries: '' when untagged"""
+    if not track_info:
+        return ''
+    values = '\x1f'.join(str(track_info.get(field) or '') for field in TAG_FIELDS)
+    return hashlib.sha256(values.encode()).hexdigest()[:16]
+
+async def download_to_temp(youtube_url, track_info=None, attempts=1, audio_format=None, user_id=None,
+                           priority=INTERACTIVE):
+    """Return a path to the finished file: from the audio cache, or a new download.
+
+    New downloads are moved into the audio cache when it is enabled; otherwise
+    the path is a temp file the caller must remove (remove_file leaves cached
+    files alone). Returns None on failure.
+    """
+    audio_format = audio_format or DEFAULT_AUDIO_FORMAT
+    profile, ext = AUDIO_FORMATS[audio_format]['profile'], AUDIO_FORMATS[audio_format]['ext']
+    video_id = extract_youtube_id(youtube_url)
+    tags = tag_identity(track_info)
+    cached_path = await run_in_executor(audio_cache.get, video_id, profile, ext, tags)
+    if cached_path:
+        logger.info(f"Audio cache hit for {video_id} ({profile})")
+        return cached_path
+    with tempfile.NamedTemporaryFile(suffix='.' + ext, delete=False) as tmp_file:
+        output_path = tmp_file.name
+    for attempt in range(attempts):
+        try:
+            success = await download_audio_async(
+                youtube_url, output_path, track_info, audio_format, user_id, priority
+            )
+            # Check if file exists and is nonzero size
+            if success and os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+                cached_path = await run_in_executor(
+                    audio_cache.put, video_id, profile, ext, output_path, True, tags
+                )
+                return cached_path or output_path
+        except Exception as ext_err:
+            logger.error(f"External error during download: {ext_err}")
+    remove_file(output_path)
+    return None
+
+async def get_track_info_shared(track_url):
+    track_info, _ = await resolve_flights.do(
+        ('track', extract_spotify_id(track_url) or track_url), run_in_executor, get_track_info, track_url
+    )
+    return track_info
+
+async def resolve_youtube_url_shared(spotify_id, artist, name, duration_ms=None, user_id=None,
+                                     priority=INTERACTIVE):
+    youtube_url, _ = await resolve_flights.do(
+        ('youtube', spotify_id or f"{artist} - {name}"),
+        scheduler.run, 'search', user_id, priority,
+        run_in_executor, resolve_youtube_url, spotify_id, artist, name, duration_ms
+    )
+    return youtube_url
+
+async def acquire_download(key, youtube_url, track_info=None, attempts=1, audio_format=None, user_id=None,
+                           priority=INTERACTIVE):
+    """Lease on a downloaded file shared by every request for the same key"""
+    return await download_flights.acquire(
+        key or (youtube_url, audio_format), download_to_temp, youtube_url, track_info, attempts, audio_format,
+        user_id, priority, release=remove_file
+    )
+
+async def reply_text(update, text, **kwargs):
+    """update.message.reply_text(), but paced by the send queue like every other send"""
+    return await Recipient.from_update(update).send_text(text, **kwargs)
+
+def user_id_of(update):
+    user = update.effective_user if update else None
+    return user.id if user else None
+
+async def upload_shared(recipient, key, path, name, artist, caption=None, audio_format=None, track_info=None):
+    """Upload once per key; requests that waited on that upload re-send its file_id"""
+    thumbnail = await get_thumbnail(track_info)
+    if not key:
+        return await send_audio_file(recipient, path, key, name, artist, caption, audio_format, thumbnail)
+    try:
+        message, shared = await upload_flights.do(
+            key, send_audio_file, recipient, path, key, name, artist, caption, audio_format, thumbnail,
+            wrap_errors=True
+        )
+    except SharedError as e:
+        # The upload we waited on went to another chat and failed (blocked bot, flood wait, network) or was cancelled
+        logger.warning(f"Shared upload of {key} failed in another chat: {e}")
+        message, shared = None, True
+    if shared and not await send_cached_audio(recipient, key, name, artist, caption, audio_format):
+        # The other upload gave no reusable file_id; send our own copy
+        message = await send_audio_file(recipient, path, key, name, artist, caption, audio_format, thumbnail)
+    return message
+
+async def deliver_to(recipient, url, youtube_url, name, artist, track_info=None, caption=None, audio_format=None,
+                     priority=INTERACTIVE):
+    """Send one track: by cached file_id, or download (shared) and upload. Returns True if sent."""
+    audio_format = audio_format or DEFAULT_AUDIO_FORMAT
+    key = source_key(url, audio_format)
+    if await send_cached_audio(recipient, key, name, artist, caption, audio_format):
+        return True
+    lease = await acquire_download(
+        key, youtube_url, track_info, audio_format=audio_format, user_id=recipient.user_id, priority=priority
+    )
+    try:
+        if not lease.value:
+            count_delivery(key, 'failed')
+            return False
+        await upload_shared(recipient, key, lease.value, name, artist, caption, audio_format, track_info)
+        return True
+    finally:
+        lease.release()
 
 # Main download functions - OPTIMIZED
 async def download_spotify_track_fast(track_url, update, processing_msg):
     try:
+        audio_format = audio_format_for(update)
+        key = source_key(track_url, audio_format)
+        if await send_cached_audio(Recipient.from_update(update), key, audio_format=audio_format):
+            return True
+        if task_queue is not None:
+            return await enqueue_delivery(update, track_url, status_message=processing_msg)
         step_start = time.time()
         logger.info("[Timing] Starting Spotify API call...")
         # Notify user during Spotify API call
-        await processing_msg.edit_text(
+        progress.set(
+            processing_msg,
             "🎧 Getting track info from Spotify... Please wait, this may take a while if the network is slow.",
             parse_mode='Markdown'
         )
-        track_info = await run_in_executor(get_track_info, track_url)
+        track_info = await get_track_info_shared(track_url)
         logger.info(f"[Timing] Spotify API call took {time.time() - step_start:.2f} seconds.")
         if not track_info:
-            await processing_msg.edit_text(
+            progress.set(
+                processing_msg,
                 "❌ *Error* \n\nCould not get track information.",
-                parse_mode='Markdown'
+                parse_mode='Markdown', final=True
             )
             return False
         query = f"{track_info['artist']} - {track_info['name']}"
         step_start = time.time()
         logger.info("[Timing] Starting YouTube search...")
-        await processing_msg.edit_text(
+        progress.set(
+            processing_msg,
             f"🔍 Searching YouTube for `{query}`... Please wait, this may take a while.",
             parse_mode='Markdown'
         )
-        youtube_url = await run_in_executor(search_youtube_fast, query)
-        query = f"{track_info['artist']} - {track_info['name']}"
-        step_start = time.time()
-        logger.info("[Timing] Starting YouTube search...")
-        await processing_msg.edit_text(
-            f"🔍 Searching YouTube for `{query}`... Please wait, this may take a while.",
-            parse_mode='Markdown'
+        youtube_url = await resolve_youtube_url_shared(
+            extract_spotify_id(track_url), track_info['artist'], track_info['name'], track_info.get('duration_ms'),
+            user_id=user_id_of(update)
         )
-        youtube_url = await run_in_executor(search_youtube_fast, query)
         logger.info(f"[Timing] YouTube search took {time.time() - step_start:.2f} seconds.")
         # Only proceed if a valid YouTube URL is found
-        if not youtube_url or not (youtube_url.startswith('http') and ('youtube.com' in youtube_url or 'youtu.be' in youtube_url)):
-            await processing_msg.edit_text(
+        if not is_youtube_url(youtube_url):
+            progress.set(
+                processing_msg,
                 f"❌ *Sorry, I couldn't find a YouTube version for* \n`{query}`.\nPlease try another track or check the spelling.",
-                parse_mode='Markdown'
+                parse_mode='Markdown', final=True
             )
             return False
-        output_path = tmp_file.name
-        f"⬇️ Downloading `{track_info['name']}` by {track_info['artist']}... Please wait, this may take a while.",
-        parse_mode='Markdown'
-        
-        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as tmp_file:
-            output_path = tmp_file.name
-        success = await run_in_executor(download_audio_fast, youtube_url, output_path, track_info)
-        if success:
-            await processing_msg.edit_text(
-                f"✅ *Complete!* \n\nSending `{track_info['name']}`...",
-                parse_mode='Markdown'
-            )
-            try:
-                with open(output_path, 'rb') as audio_file:
-                    await update.message.reply_audio(
-                        audio=audio_file,
-                        title=track_info['name'][:64],
-                        performer=track_info['artist'][:64],
-                        caption=f"🎵 *{track_info['name']}* by {track_info['artist']}",
-                        parse_mode='Markdown',
-                        filename=f"{sanitize_filename(track_info['artist'])} - {sanitize_filename(track_info['name'])}.mp3"
+        progress.set(
+            processing_msg,
+            f"⬇️ Downloading `{track_info['name']}` by {track_info['artist']}... Please wait, this may take a while.",
+            parse_mode='Markdown'
+        )
+        # Concurrent requests for the same track share one download
+        lease = await acquire_download(
+            key, youtube_url, track_info, audio_format=audio_format, user_id=user_id_of(update)
+        )
+        try:
+            output_path = lease.value
+            if output_path:
+                progress.set(
+                    processing_msg,
+                    f"✅ *Complete!* \n\nSending `{track_info['name']}`...",
+                    parse_mode='Markdown'
+                )
+                try:
+                    await upload_shared(
+                        Recipient.from_update(update), key, output_path, track_info['name'], track_info['artist'],
+                        audio_format=audio_format, track_info=track_info
                     )
-            except Exception as send_err:
-                # If file was sent despite error, do not send error message
-                logger.error(f"Error sending audio: {send_err}")
-                # Check if file was sent (Telegram API may throw timeout but still deliver)
-                # If not sent, send error message
-                # (No reliable way to check, so just log and skip user error message)
-                pass
-            try:
-                os.unlink(output_path)
-            except Exception as cleanup_err:
-                logger.warning(f"Cleanup error: {cleanup_err}")
-            return True
-        else:
-            await processing_msg.edit_text(
-                f"❌ *Download Failed* \n\nCould not download `{track_info['name']}`",
-                parse_mode='Markdown'
-            )
-            return False
+                except Exception as send_err:
+                    # If file was sent despite error, do not send error message
+                    logger.error(f"Error sending audio: {send_err}")
+                    # Check if file was sent (Telegram API may throw timeout but still deliver)
+                    # If not sent, send error message
+                    # (No reliable way to check, so just log and skip user error message)
+                    pass
+                return True
+        finally:
+            lease.release()
+        progress.set(
+            processing_msg,
+            f"❌ *Download Failed* \n\nCould not download `{track_info['name']}`",
+            parse_mode='Markdown', final=True
+        )
+        return False
     except Exception as e:
         logger.error(f"Error processing track: {e}")
         # Only send error if no file was sent
@@ -351,7 +1172,14 @@ async def download_spotify_track_fast(track_url, update, processing_msg):
 async def download_youtube_music_fast(url, update, processing_msg):
     """Fast YouTube Music download"""
     try:
-        await processing_msg.edit_text(
+        audio_format = audio_format_for(update)
+        key = source_key(url, audio_format)
+        if await send_cached_audio(Recipient.from_update(update), key, audio_format=audio_format):
+            return True
+        if task_queue is not None:
+            return await enqueue_delivery(update, url, status_message=processing_msg)
+        progress.set(
+            processing_msg,
             "🎵 *Processing* \n\nGetting video info...",
             parse_mode='Markdown'
         )
@@ -359,143 +1187,416 @@ async def download_youtube_music_fast(url, update, processing_msg):
         # Fast video info extraction
         video_info = await run_in_executor(get_youtube_video_info_fast, url)
         if not video_info or "error" in video_info:
-            await processing_msg.edit_text(
+            progress.set(
+                processing_msg,
                 "❌ Error getting video info",
-                parse_mode='Markdown'
+                parse_mode='Markdown', final=True
             )
             return False
         
         title = video_info.get('title', 'Unknown Title')[:64]
         uploader = video_info.get('uploader', 'Unknown Artist')[:64]
         
-        await processing_msg.edit_text(
+        progress.set(
+            processing_msg,
             f"⬇️ *Downloading* \n`{title}`",
             parse_mode='Markdown'
         )
         
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as tmp_file:
-            output_path = tmp_file.name
-        
-        # Fast download
-        success = await run_in_executor(download_audio_fast, url, output_path)
-        
-        if success:
-            await processing_msg.edit_text(
-                f"✅ *Complete!* \n\nSending `{title}`...",
-                parse_mode='Markdown'
-            )
-            
-            # Send the audio file
-            with open(output_path, 'rb') as audio_file:
-                    await update.message.reply_audio(
-                        audio=audio_file,
-                        title=title,
-                        performer=uploader,
-                        caption=f"🎵 *{title}* by {uploader}",
-                        parse_mode='Markdown',
-                        filename=f"{sanitize_filename(uploader)} - {sanitize_filename(title)}.mp3"
-                    )
-            
-            # Clean up
-            try:
-                os.unlink(output_path)
-            except:
-                pass
+        # Fast download, shared with concurrent requests for the same video
+        lease = await acquire_download(key, url, audio_format=audio_format, user_id=user_id_of(update))
+        try:
+            if lease.value:
+                progress.set(
+                    processing_msg,
+                    f"✅ *Complete!* \n\nSending `{title}`...",
+                    parse_mode='Markdown'
+                )
                 
-            return True
-        else:
-            await processing_msg.edit_text(
-                f"❌ *Download Failed* \n\nCould not download `{title}`",
-                parse_mode='Markdown'
-            )
-            return False
-            
+                # Send the audio file
+                await upload_shared(
+                    Recipient.from_update(update), key, lease.value, title, uploader, audio_format=audio_format
+                )
+                return True
+        finally:
+            # Clean up once every request sharing the file is done
+            lease.release()
+        progress.set(
+            processing_msg,
+            f"❌ *Download Failed* \n\nCould not download `{title}`",
+            parse_mode='Markdown', final=True
+        )
+        return False
+
     except Exception as e:
         logger.error(f"Error processing YouTube: {e}")
-        await processing_msg.edit_text(
+        progress.set(
+            processing_msg,
             "❌ *Error* \n\nPlease try again later.",
-            parse_mode='Markdown'
+            parse_mode='Markdown', final=True
         )
         return False
 
-async def download_spotify_playlist_fast(playlist_url, update, processing_msg):
-    try:
-        await processing_msg.edit_text(
-            "🎧 Getting playlist info from Spotify... Please wait, this may take a while if the network is slow.",
-            parse_mode='Markdown'
+# Shared batch pipeline: resolve -> download (+transcode/tag) -> upload
+BATCH_RESOLVE_CONCURRENCY = int(os.environ.get('BATCH_RESOLVE_CONCURRENCY', 4))
+BATCH_DOWNLOAD_CONCURRENCY = int(os.environ.get('BATCH_DOWNLOAD_CONCURRENCY', 3))
+BATCH_UPLOAD_CONCURRENCY = int(os.environ.get('BATCH_UPLOAD_CONCURRENCY', 1))
+
+async def download_batch(update, entries, processing_msg=None, track_infos=None, priority=BULK):
+    """Download and send a list of search results, each as soon as it is ready.
+
+    The job is stored in batch_store first, so it resumes after a restart.
+    priority is INTERACTIVE for a single pick the user is waiting on.
+    Returns (sent_count, failed_names) after reporting a summary to the user.
+    """
+    recipient = Recipient.from_update(update)
+    if track_infos is None:
+        # One sp.tracks call per 50 Spotify tracks, for tagging
+        spotify_ids = [i for i in (extract_spotify_id(entry.url) for entry in entries) if i]
+        try:
+            track_infos = await run_in_executor(with_spotify, spotify_meta.fetch_tracks, spotify_ids) if spotify_ids else {}
+        except Exception as e:
+            logger.error(f"Error fetching track metadata: {e}")
+            track_infos = {}
+    # Stored as JSON with the job, so as plain dicts
+    items = [(entry.as_dict(), track_infos.get(extract_spotify_id(entry.url))) for entry in entries]
+    if task_queue is not None:
+        # Fanned out to the workers one track per task; the queue itself is durable
+        for index, (entry, track_info) in enumerate(items):
+            name = entry.get('title', 'Unknown')
+            artist = entry.get('uploader', 'Unknown Artist')
+            await enqueue_delivery(
+                update, entry.get('url'), name=name, artist=artist, track_info=track_info,
+                caption=f"🎵 *{name}* by {artist} ({index + 1}/{len(items)})", priority=priority
+            )
+        if processing_msg:
+            progress.set(
+                processing_msg,
+                f"⏳ Queued {len(items)} track(s) - they will arrive one by one.",
+                parse_mode='Markdown', final=True
+            )
+        return 0, []
+    job_id = await run_in_executor(
+        batch_store.create_job, recipient.chat_id, recipient.user_id, audio_format_for(update), items
+    )
+    return await run_batch_job(recipient, job_id, processing_msg, priority)
+
+async def run_batch_job(recipient, job_id, processing_msg=None, priority=BULK):
+    """Run (or resume) a stored batch job, recording each item's progress as it goes.
+
+    Items already sent are skipped; resolved items keep their YouTube URL and
+    downloaded ones are found again in the audio cache.
+    """
+    job_record = await run_in_executor(batch_store.job, job_id)
+    stored_items = await run_in_executor(batch_store.items, job_id)
+    total = len(stored_items)
+    audio_format = job_record['audio_format']
+    if audio_format not in AUDIO_FORMATS:
+        audio_format = DEFAULT_AUDIO_FORMAT
+    # Bulk items yield to single-track requests and share capacity fairly with other batches
+    user_id = job_record['user_id']
+    already_sent = sum(1 for item in stored_items if item['state'] == SENT)
+    finished = already_sent
+    failed = 0
+
+    async def record(job, state, youtube_url=None):
+        await run_in_executor(batch_store.set_state, job_id, job['item']['index'], state, youtube_url)
+
+    def caption(job):
+        return f"🎵 *{job['name']}* by {job['artist']} ({job['item']['index'] + 1}/{total})"
+
+    async def resolve(job):
+        entry = job['item']['entry']
+        url = entry.get('url')
+        job['name'] = entry.get('title', 'Unknown')
+        job['artist'] = entry.get('uploader', 'Unknown Artist')
+        job['key'] = source_key(url, audio_format)
+        job['track_info'] = job['item']['track_info']
+        # Already uploaded once: re-send by file_id instead of downloading again
+        if batcher:
+            cached = await run_in_executor(file_id_cache.get, job['key'])
+            if cached:
+                # Goes out in an album with the tracks around it
+                job['file_id'] = cached['file_id']
+                return True
+        elif await send_cached_audio(recipient, job['key'], job['name'], job['artist'], caption(job), audio_format):
+            await record(job, SENT)
+            job['done'] = True
+            return True
+        spotify_id = extract_spotify_id(url)
+        if job['item']['youtube_url']:
+            # Resolved before an interruption
+            job['youtube_url'] = job['item']['youtube_url']
+        elif extract_youtube_id(url):
+            # YouTube search results are already the video to download
+            job['youtube_url'] = url
+        else:
+            info = job['track_info'] or {}
+            duration_ms = info.get('duration_ms') or int(entry.get('duration', 0) or 0) * 1000
+            job['youtube_url'] = await resolve_youtube_url_shared(
+                spotify_id, info.get('artist', job['artist']), info.get('name', job['name']), duration_ms,
+                user_id, priority
+            )
+        if not is_youtube_url(job['youtube_url']):
+            logger.warning(f"No YouTube version found for {job['artist']} - {job['name']}")
+            return False
+        await record(job, RESOLVED, job['youtube_url'])
+        return True
+
+    async def download(job):
+        if job.get('file_id'):
+            return True
+        # Shared with any other user downloading the same track right now
+        job['lease'] = await acquire_download(
+            job['key'], job['youtube_url'], job['track_info'], attempts=3, audio_format=audio_format,
+            user_id=user_id, priority=priority
         )
-        playlist_id = playlist_url.split('/playlist/')[-1].split('?')[0]
-        playlist = sp.playlist(playlist_id)
-        playlist_name = playlist.get('name', 'Spotify Playlist')
-        tracks = playlist['tracks']['items']
-        total = len(tracks)
-        track_files = []
-        await processing_msg.edit_text(
-            f"🔍 Searching on YouTube for *{playlist_name}*...",
-            parse_mode='Markdown'
+        if not job['lease'].value:
+            return False
+        await record(job, DOWNLOADED)
+        return True
+
+    async def upload(job):
+        if not batcher:
+            await upload_shared(
+                recipient, job['key'], job['lease'].value, job['name'], job['artist'], caption(job), audio_format,
+                job['track_info']
+            )
+            await record(job, SENT)
+            return True
+        job['grouped'] = True
+        if not job.get('file_id'):
+            job['thumbnail'] = await get_thumbnail(job['track_info'])
+        if await batcher.add(job):
+            await record(job, SENT)
+            return True
+        if not job.pop('file_id', None):
+            return False
+        # Its cached file_id was rejected (and forgotten): download and upload it after all
+        if not (await resolve(job) and await download(job)):
+            return False
+        await upload_shared(
+            recipient, job['key'], job['lease'].value, job['name'], job['artist'], caption(job), audio_format,
+            job['track_info']
         )
-        for idx, item in enumerate(tracks, 1):
-            track = item['track']
-            track_url = f"https://open.spotify.com/track/{track['id']}"
-            await processing_msg.edit_text(
-                f"🎵 Downloading {track['name']} by {track['artists'][0]['name']} ({idx}/{total})...",
-                parse_mode='Markdown'
+        await record(job, SENT)
+        return True
+
+    async def send_group(jobs):
+        # An album's tracks in batch order, however they finished downloading
+        ordered = sorted(jobs, key=lambda job: job['item']['index'])
+        items = [
+            {
+                'key': job['key'], 'name': job['name'], 'artist': job['artist'], 'caption': caption(job),
+                'track_info': job['track_info'], 'file_id': job.get('file_id'),
+                'path': job['lease'].value if job.get('lease') else None, 'thumbnail': job.get('thumbnail'),
+            }
+            for job in ordered
+        ]
+        results = dict(zip(map(id, ordered), await send_media_group(recipient, items, audio_format)))
+        return [results[id(job)] for job in jobs]
+
+    def cleanup(job):
+        if job.get('lease'):
+            job['lease'].release()
+
+    def show_progress(final=False):
+        # Coalesced: on a large batch most of these never reach Telegram
+        if processing_msg:
+            heading = "✅ Finished" if final else "⬇️ Downloading and sending..."
+            failures = f"\n❌ {failed} failed" if failed else ""
+            progress.set(
+                processing_msg,
+                f"{heading}\n`{progress_bar(finished, total)}`{failures}",
+                parse_mode='Markdown', final=final
             )
-            with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as tmp_file:
-                output_path = tmp_file.name
-            success = await download_spotify_track_fast_collect(track_url, output_path)
-            if success:
-                track_files.append((output_path, track['name'], track['artists'][0]['name']))
-        await processing_msg.edit_text(
-            f"✅ *Playlist Downloaded!* \n\nSending all {len(track_files)} tracks...",
+
+    async def on_done(job):
+        nonlocal finished, failed
+        finished += 1
+        if batcher and not job.get('grouped'):
+            batcher.skip()
+        if not job['ok']:
+            failed += 1
+            count_delivery(job['item']['entry'].get('url'), 'failed')
+            await record(job, FAILED)
+        show_progress()
+
+    pending_items = [item for item in stored_items if item['state'] != SENT]
+    # Tracks wait in the upload stage until their album is sent, so that stage holds a whole album
+    group_size = min(MEDIA_GROUP_SIZE, len(pending_items))
+    batcher = None
+    if group_size > 1:
+        batcher = MediaGroupBatcher(send_group, len(pending_items), group_size, MEDIA_GROUP_LINGER)
+    upload_concurrency = max(BATCH_UPLOAD_CONCURRENCY, group_size)
+    engine = BatchEngine(
+        [
+            Stage('resolve', resolve, BATCH_RESOLVE_CONCURRENCY),
+            Stage('download', download, BATCH_DOWNLOAD_CONCURRENCY),
+            Stage('upload', upload, upload_concurrency),
+        ],
+        max_in_flight=BATCH_DOWNLOAD_CONCURRENCY + upload_concurrency + 1,
+        cleanup=cleanup,
+        on_done=on_done
+    )
+    jobs = await engine.run(pending_items)
+    await run_in_executor(batch_store.finish_job, job_id)
+    show_progress(final=True)
+    sent_count = already_sent + sum(1 for job in jobs if job['ok'])
+    failed_files = [job.get('name') or job['item']['entry'].get('title', 'Unknown') for job in jobs if not job['ok']]
+    if sent_count == total:
+        await recipient.send_text(
+            f"✅ All {sent_count}/{total} files sent! You can send another name or link to start a new search.",
             parse_mode='Markdown'
         )
-        # Send all files only after all downloads are complete
-        for file_path, name, artist in track_files:
-            try:
-                with open(file_path, 'rb') as audio_file:
-                    await update.message.reply_audio(
-                        audio=audio_file,
-                        title=name[:64],
-                        performer=artist[:64],
-                        caption=f"🎵 *{name}* by {artist}",
-                        parse_mode='Markdown',
-                        filename=f"{sanitize_filename(artist)} - {sanitize_filename(name)}.mp3"
-                    )
-            except Exception as send_err:
-                logger.error(f"Error sending audio: {send_err}")
-            try:
-                os.unlink(file_path)
-            except Exception as cleanup_err:
-                logger.warning(f"Cleanup error: {cleanup_err}")
-        await processing_msg.edit_text(
-            f"✅ *All tracks sent!* \n\nSend another link! 🎧",
+    elif sent_count > 0:
+        fail_list = ', '.join(failed_files)
+        await recipient.send_text(
+            f"✅ {sent_count}/{total} files sent. ❌ {total-sent_count}/{total} could not be sent ({fail_list}). Please try again.",
             parse_mode='Markdown'
         )
-        return True
-    except Exception as e:
-        logger.error(f"Error processing playlist: {e}")
-        await processing_msg.edit_text(
-            f"❌ *Error* \n\nCould not process playlist.",
+    else:
+        await recipient.send_text(
+            "❌ No files were sent. Please try the process again.",
             parse_mode='Markdown'
         )
-        return False
+    return sent_count, failed_files
 
-async def download_spotify_track_fast_collect(track_url, output_path):
-    try:
-        track_info = await run_in_executor(get_track_info, track_url)
+async def resume_batch_jobs(bot):
+    """Pick up batch jobs interrupted by a restart"""
+    for job_id in await run_in_executor(batch_store.unfinished_jobs):
+        job_record = await run_in_executor(batch_store.job, job_id)
+        stored_items = await run_in_executor(batch_store.items, job_id)
+        sent = sum(1 for item in stored_items if item['state'] == SENT)
+        recipient = Recipient(bot, job_record['chat_id'], job_record['user_id'])
+        logger.info(f"Resuming batch job {job_id}: {sent}/{len(stored_items)} already sent")
+        try:
+            processing_msg = await recipient.send_text(
+                f"🔄 I was restarted - resuming your download ({sent}/{len(stored_items)} already sent)...",
+                parse_mode='Markdown'
+            )
+        except Exception as e:
+            # Chat gone or bot blocked: nothing to resume into
+            logger.warning(f"Dropping batch job {job_id}: {e}")
+            await run_in_executor(batch_store.finish_job, job_id)
+            continue
+        asyncio.create_task(resume_batch_job(recipient, job_id, processing_msg))
+
+async def resume_batch_job(recipient, job_id, processing_msg):
+    with tracer.trace('batch_resume', user_id=recipient.user_id, job_id=job_id):
+        await run_batch_job(recipient, job_id, processing_msg)
+
+# Front-end / worker split (BOT_MODE)
+async def enqueue_delivery(update, url, youtube_url=None, name=None, artist=None, track_info=None, caption=None,
+                           priority=INTERACTIVE, status_message=None):
+    """Queue one track for a worker instead of downloading it here"""
+    recipient = Recipient.from_update(update)
+    task = {
+        'chat_id': recipient.chat_id,
+        'user_id': recipient.user_id,
+        'reply_to': recipient.reply_to_message_id,
+        'url': url,
+        'youtube_url': youtube_url,
+        'name': name,
+        'artist': artist,
+        'track_info': track_info,
+        'caption': caption,
+        'audio_format': audio_format_for(update),
+        'priority': priority,
+        'status_message_id': status_message.message_id if status_message else None,
+    }
+    await run_in_executor(task_queue.put, task)
+    if status_message:
+        progress.set(
+            status_message, "⏳ *Queued* \n\nA worker will pick this up shortly.", parse_mode='Markdown', final=True
+        )
+
+def edit_task_status(bot, task, text, final=False):
+    if task.get('status_message_id'):
+        progress.set_by_id(bot, task['chat_id'], task['status_message_id'], text, final=final, parse_mode='Markdown')
+
+async def handle_task(bot, task):
+    """Worker side of enqueue_delivery: resolve, download and upload one queued track"""
+    recipient = Recipient(bot, task['chat_id'], task['user_id'], task.get('reply_to'))
+    url, youtube_url, track_info = task['url'], task.get('youtube_url'), task.get('track_info')
+    name, artist = task.get('name'), task.get('artist')
+    priority = task.get('priority', INTERACTIVE)
+    if not youtube_url and extract_youtube_id(url):
+        youtube_url = url
+        if not name:
+            video_info = await run_in_executor(get_youtube_video_info_fast, url)
+            if not video_info or 'error' in video_info:
+                edit_task_status(bot, task, "❌ Error getting video info", final=True)
+                count_delivery(url, 'failed')
+                return False
+            name = video_info.get('title', 'Unknown Title')[:64]
+            artist = video_info.get('uploader', 'Unknown Artist')[:64]
+    elif not youtube_url:
+        if track_info is None:
+            track_info = await get_track_info_shared(url)
         if not track_info:
+            edit_task_status(bot, task, "❌ *Error* \n\nCould not get track information.", final=True)
+            count_delivery(url, 'failed')
             return False
-        query = f"{track_info['artist']} - {track_info['name']}"
-        youtube_url = await run_in_executor(search_youtube_fast, query)
-        if not youtube_url:
+        name, artist = name or track_info['name'], artist or track_info['artist']
+        edit_task_status(bot, task, f"🔍 Searching YouTube for `{artist} - {name}`...")
+        youtube_url = await resolve_youtube_url_shared(
+            extract_spotify_id(url), track_info['artist'], track_info['name'], track_info.get('duration_ms'),
+            recipient.user_id, priority
+        )
+        if not is_youtube_url(youtube_url):
+            edit_task_status(
+                bot, task, f"❌ *Sorry, I couldn't find a YouTube version for* \n`{artist} - {name}`.", final=True
+            )
+            count_delivery(url, 'failed')
             return False
-        success = await run_in_executor(download_audio_fast, youtube_url, output_path, track_info)
-        return success
-    except Exception as e:
-        logger.error(f"Error processing track (collect): {e}")
-        return False
+    edit_task_status(bot, task, f"⬇️ Downloading `{name}` by {artist}...")
+    sent = await deliver_to(
+        recipient, url, youtube_url, name, artist, track_info, task.get('caption'), task.get('audio_format'), priority
+    )
+    if sent:
+        edit_task_status(bot, task, "✅ *Done!* \n\nSend another link! 🎧", final=True)
+    else:
+        edit_task_status(bot, task, f"❌ *Download Failed* \n\nCould not download `{name}`", final=True)
+    return sent
+
+async def worker_loop(bot):
+    """Take tasks off task_queue forever; a failed task is logged and acknowledged, not retried"""
+    while True:
+        item = await run_in_executor(task_queue.get, 5)
+        if item is None:
+            continue
+        receipt, task = item
+        try:
+            with tracer.trace('task', user_id=task.get('user_id'), url=task.get('url')):
+                await handle_task(bot, task)
+        except Exception as e:
+            logger.error(f"Task for {task.get('url')} failed: {e}")
+        finally:
+            await run_in_executor(task_queue.ack, receipt)
+
+async def run_worker():
+    """BOT_MODE=worker: no polling, just WORKER_CONCURRENCY loops over the queue"""
+    from telegram import Bot
+    async with Bot(TELEGRAM_BOT_TOKEN) as bot:
+        loop_monitor.start()
+        await http_server.start()
+        startup_timer.mark('application')
+        asyncio.get_running_loop().run_in_executor(io_executor, warm_up)
+        if hasattr(task_queue, 'requeue_unacked'):
+            requeued = await run_in_executor(task_queue.requeue_unacked)
+            if requeued:
+                logger.info(f"Requeued {requeued} unfinished task(s) from a previous run of {WORKER_ID}")
+            if not os.environ.get('WORKER_ID'):
+                logger.warning("WORKER_ID is not set: tasks this worker holds when it dies are not requeued")
+        logger.info(f"Worker {WORKER_ID} taking tasks from the {QUEUE_BACKEND} queue")
+        startup_timer.mark('startup hook')
+        mark_ready()
+        try:
+            await asyncio.gather(*(worker_loop(bot) for _ in range(WORKER_CONCURRENCY)))
+        finally:
+            await progress.flush()
+            await http_server.stop()
 
 # Telegram Bot Handlers - OPTIMIZED
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -516,7 +1617,7 @@ I quickly download music from Spotify and YouTube Music!
 
 ⚡ *Optimized for speed!*
     """
-    await update.message.reply_text(welcome_text, parse_mode='Markdown')
+    await reply_text(update, welcome_text, parse_mode='Markdown')
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Fast help message"""
@@ -526,6 +1627,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 *Commands:*
 /start - Welcome message
 /help - This help
+/format - Choose mp3, m4a or opus
+/queue - See your place in the download queue
 
 *Just send any:*
 • Spotify track link
@@ -534,89 +1637,130 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 ⚡ *Fast downloads!*
     """
-    await update.message.reply_text(help_text, parse_mode='Markdown')
+    await reply_text(update, help_text, parse_mode='Markdown')
+
+async def format_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Choose the delivery format: /format mp3|m4a|opus"""
+    choice = context.args[0].lower() if context.args else ''
+    if choice not in AUDIO_FORMATS:
+        await reply_text(update,
+            f"🎚️ Current format: *{audio_format_for(update)}*\n\n"
+            "• /format mp3 - plays everywhere\n"
+            "• /format m4a - original quality, no re-encoding (faster)\n"
+            "• /format opus - original quality, sent as a file",
+            parse_mode='Markdown'
+        )
+        return
+    user_audio_format[update.effective_user.id] = choice
+    await reply_text(update, f"✅ Format set to *{choice}*", parse_mode='Markdown')
+
+async def queue_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show where the user's requests are in the download queue"""
+    user_id = update.effective_user.id
+    waiting = scheduler.queued(user_id)
+    if not any(waiting.values()):
+        await reply_text(update, "✅ Nothing of yours is waiting - downloads start right away.")
+        return
+    position = scheduler.position(user_id, 'download') or scheduler.position(user_id, 'search')
+    await reply_text(update,
+        f"⏳ *Queue*\n\n"
+        f"Next in line at position {position}\n"
+        f"Waiting: {waiting['search']} search(es), {waiting['download']} download(s), "
+        f"{waiting['transcode']} conversion(s)",
+        parse_mode='Markdown'
+    )
+
+def search_youtube_entries(query):
+    """Raw ytsearch50 results for the interactive search listing"""
+    with timed_stage('youtube_search'):
+        return ytdl_pool.extract_info('search', f"ytsearch50:{query}")
 
 async def search_and_select_youtube(update, processing_msg, query):
     try:
-        await processing_msg.edit_text(
+        progress.set(
+            processing_msg,
             f"🔍 Searching YouTube for `{query}`... Please wait.",
             parse_mode='Markdown'
         )
-        ydl_opts = {
-            'quiet': True,
-            'extract_flat': True,
-            'force_json': True,
-            'ignoreerrors': True,
-            'default_search': 'ytsearch50',
-            'noplaylist': True,
-        }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(f"ytsearch50:{query}", download=False)
-        logger.warning(f"yt-dlp raw info for search: {info}")
+        info = await run_in_executor(search_youtube_entries, query)
+        if LOG_SEARCH_PAYLOADS:
+            logger.info(f"yt-dlp raw info for search: {info}")
         if not info or 'entries' not in info or not info['entries']:
-            await processing_msg.edit_text(
+            progress.set(
+                processing_msg,
                 f"❌ No results found for `{query}`.",
-                parse_mode='Markdown'
+                parse_mode='Markdown', final=True
             )
             return None
-        results = info['entries']
-        user_id = update.effective_user.id
-        user_search_state[user_id] = {
-            'results': results,
-            'page': 0
-        }
-        return await send_search_page(update, processing_msg, user_id)
+        # Only what paging and downloading need; the raw entries are dropped here
+        session = SearchSession(Result.from_entry(entry) for entry in info['entries'] if entry)
+        await sessions.put(update.effective_user.id, session)
+        return await send_search_page(update, processing_msg, update.effective_user.id, session)
 
     except Exception as e:
         logger.error(f"Error searching YouTube: {e}")
         
 
+SEARCH_PAGE_SIZE = 10
+
+def render_search_page(results, page):
+    """Message text and inline keyboard for one page of selectable results"""
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+    start = page * SEARCH_PAGE_SIZE
+    end = start + SEARCH_PAGE_SIZE
+    page_results = results[start:end]
+    def escape_md(text):
+        # Telegram Markdown V2 escaping
+        if not text:
+            return ''
+        return re.sub(r'([_\*\[\]()~`>#+\-=|{}.!])', r'\\\1', str(text))
+
+    msg_lines = [
+        f"*{start + i + 1}.*\n  🎵 *Title:* {escape_md(entry.get('title', 'Unknown'))}\n  👤 *Artist:* {escape_md(entry.get('uploader', 'Unknown Artist'))}\n  ⏱️ *Duration:* {int(entry.get('duration', 0))//60}:{int(entry.get('duration', 0))%60:02d} min\n" + ("────────────────────────────" if i < len(page_results)-1 else "")
+        for i, entry in enumerate(page_results)
+    ]
+    msg_lines.append("Send a number to download, 'all' to download all, or use the 'discard' button to cancel.")
+    keyboard = []
+    # Previous page button
+    if page > 0:
+        keyboard.append([InlineKeyboardButton("← Previous page", callback_data="prev_page")])
+    # Next page button (always show unless on last page)
+    if end < len(results) or page == 0:
+        keyboard.append([InlineKeyboardButton("Next page →", callback_data="next_page")])
+    # Discard button
+    keyboard.append([InlineKeyboardButton("Discard", callback_data="discard_search")])
+    return f"*Select a song by number:*\n\n" + "\n".join(msg_lines), InlineKeyboardMarkup(keyboard)
+
 # Helper to send a page of search results
-async def send_search_page(update, processing_msg, user_id):
+async def send_search_page(update, processing_msg, user_id, session=None):
     try:
-        state = user_search_state[user_id]
-        results = state['results']
-        page = state['page']
-        page_size = 10
-        start = page * page_size
-        end = start + page_size
-        page_results = results[start:end]
-        def escape_md(text):
-            # Telegram Markdown V2 escaping
-            if not text:
-                return ''
-            return re.sub(r'([_\*\[\]()~`>#+\-=|{}.!])', r'\\\1', str(text))
-
-        msg_lines = [
-            f"*{start + i + 1}.*\n  🎵 *Title:* {escape_md(entry.get('title', 'Unknown'))}\n  👤 *Artist:* {escape_md(entry.get('uploader', 'Unknown Artist'))}\n  ⏱️ *Duration:* {int(entry.get('duration', 0))//60}:{int(entry.get('duration', 0))%60:02d} min\n" + ("────────────────────────────" if i < len(page_results)-1 else "")
-            for i, entry in enumerate(page_results)
-        ]
-        msg_lines.append("Send a number to download, 'all' to download all, or use the 'discard' button to cancel.")
-        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-        keyboard = []
-        # Previous page button
-        if page > 0:
-            keyboard.append([InlineKeyboardButton("← Previous page", callback_data="prev_page")])
-        # Next page button (always show unless on last page)
-        if end < len(results) or page == 0:
-            keyboard.append([InlineKeyboardButton("Next page →", callback_data="next_page")])
-        # Discard button
-        keyboard.append([InlineKeyboardButton("Discard", callback_data="discard_search")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await processing_msg.edit_text(
-            f"*Select a song by number:*\n\n" + "\n".join(msg_lines),
-            parse_mode='Markdown',
+        session = session or await sessions.get(user_id)
+        if session is None:
+            progress.set(
+                processing_msg,
+                "⌛ This list has expired. Send the name or link again.",
+                final=True
+            )
+            return None
+        results = session.results
+        text, reply_markup = render_search_page(results, session.page)
+        progress.set(
+            processing_msg,
+            text,
+            parse_mode='Markdown', final=True,
             reply_markup=reply_markup
         )
         return results
     except Exception as e:
         logger.error(f"Error searching YouTube: {e}")
-        await processing_msg.edit_text(
+        progress.set(
+            processing_msg,
             f"❌ Error searching YouTube.",
-            parse_mode='Markdown'
+            parse_mode='Markdown', final=True
         )
         return None
 
+@traced('message')
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     message_text = ''
@@ -626,47 +1770,23 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Artist link support
     if 'open.spotify.com' in message_text and '/artist/' in message_text:
         # Send processing message first
-        processing_msg = await update.message.reply_text(
+        processing_msg = await reply_text(update,
             "⚡️ Processing...\nThis will be fast! 🚀",
             parse_mode='Markdown'
         )
         artist_id = message_text.split('/artist/')[-1].split('?')[0]
-        artist = sp.artist(artist_id)
-        artist_name = artist.get('name', 'Spotify Artist')
-        # Fetch all albums by artist
-        albums = sp.artist_albums(artist_id, album_type='album,single', limit=50)
-        album_ids = [album['id'] for album in albums['items']]
-        # Collect all tracks from all albums
-        tracks = []
-        for album_id in album_ids:
-            album = sp.album(album_id)
-            for track in album['tracks']['items']:
-                tracks.append({
-                    'url': f"https://open.spotify.com/track/{track['id']}",
-                    'title': track['name'],
-                    'uploader': artist_name,
-                    'duration': int(track['duration_ms']) // 1000
-                })
-        # Remove duplicates by track id
-        seen = set()
-        unique_tracks = []
-        for t in tracks:
-            tid = t['url']
-            if tid not in seen:
-                seen.add(tid)
-                unique_tracks.append(t)
-        user_search_state[user_id] = {
-            'results': unique_tracks,
-            'page': 0,
-            'artist_name': artist_name
-        }
+        # All albums (paginated) fetched 20 at a time, duplicates removed by track id
+        artist_name, tracks = await run_in_executor(with_spotify, spotify_meta.fetch_artist, artist_id)
+        unique_tracks = spotify_results(tracks, uploader=artist_name)
+        await sessions.put(user_id, SearchSession(unique_tracks, title=artist_name))
         # Send found artist message like playlist
-        await processing_msg.edit_text(
+        progress.set(
+            processing_msg,
             f"Found artist *{artist_name}* — preparing to send over to you...",
-            parse_mode='Markdown'
+            parse_mode='Markdown', final=True
         )
         # Send selection instructions and first page
-        processing_msg = await update.message.reply_text(
+        processing_msg = await reply_text(update,
             f"*{artist_name}*\n\nSelect tracks to download by replying with numbers (e.g. 1,2,3) or 'all' to download all.\n\nListing all {len(unique_tracks)} tracks...",
             parse_mode='Markdown'
         )
@@ -677,13 +1797,9 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         message_text = update.message.text.strip()
     user_id = update.effective_user.id
     # If user is in search state, handle reply
-    if user_id in user_search_state:
-        state = user_search_state[user_id]
-        results = state['results']
-        page = state['page']
-        page_size = 10
-        start = page * page_size
-        end = start + page_size
+    session = await sessions.get(user_id)
+    if session is not None:
+        results = session.results
         text = message_text.lower()
         # Handle multiple selection (e.g. "1,2,3")
         if ',' in text:
@@ -695,171 +1811,41 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             indices = []
             if text.isdigit() and 1 <= int(text) <= len(results):
                 indices = [int(text)]
+        if text == 'all':
+            indices = list(range(1, len(results) + 1))
         if indices:
-            total = len(indices)
-            file_queue = []
-            for idx, number in enumerate(indices, 1):
-                entry = results[number-1]
-                url = entry.get('url')
-                name = entry.get('title', 'Unknown')
-                artist = entry.get('uploader', 'Unknown Artist')
-                duration = int(entry.get('duration', 0) or 0)
-                msg = await update.message.reply_text(
-                    f"⬇️ Downloading `{name}` by {artist} ({idx}/{total})...",
-                    parse_mode='Markdown'
-                )
-                yt_query = f"{artist} - {name}"
-                youtube_url = await run_in_executor(search_youtube_fast, yt_query)
-                if not youtube_url or not (youtube_url.startswith('http') and ('youtube.com' in youtube_url or 'youtu.be' in youtube_url)):
-                    await msg.edit_text(
-                        f"❌ *Sorry, I couldn't find a YouTube version for* \n`{yt_query}`. Skipping.",
-                        parse_mode='Markdown'
-                    )
-                    continue
-                with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as tmp_file:
-                    output_path = tmp_file.name
-                download_success = False
-                for attempt in range(3):
-                    try:
-                        success = await run_in_executor(download_audio_fast, youtube_url, output_path)
-                        # Check if file exists and is nonzero size
-                        if success and os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-                            download_success = True
-                            break
-                    except Exception as ext_err:
-                        logger.error(f"External error during download: {ext_err}")
-                        # Do not notify user for external errors unless all attempts fail
-                        pass
-                if download_success:
-                    await msg.edit_text(
-                    f"✅ Done, sending to you...",
-                    parse_mode='Markdown'
-                    )                
-                    file_queue.append((output_path, name, artist))
-                else:
-                    await msg.edit_text(
-                        f"❌ *Download failed for* `{name}` by {artist} after several attempts. Skipping.",
-                        parse_mode='Markdown'
-                    )
-            # Send all files only after all downloads are complete
-            sent_count = 0
-            failed_files = []
-            total_files = len(file_queue)
-            for idx, (file_path, name, artist) in enumerate(file_queue, 1):
-                try:
-                    # Wait for file to finish downloading if needed
-                    for _ in range(10):
-                        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-                            break
-                        await asyncio.sleep(1)
-                    if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
-                        logger.error(f"File not ready for sending: {file_path}")
-                        failed_files.append(name)
-                        continue
-                    with open(file_path, 'rb') as audio_file:
-                        await update.message.reply_audio(
-                            audio=audio_file,
-                            title=name[:64],
-                            performer=artist[:64],
-                            caption=f"🎵 *{name}* by {artist} ({idx}/{total_files})",
-                            parse_mode='Markdown',
-                            filename=f"{sanitize_filename(artist)} - {sanitize_filename(name)}.mp3"
-                        )
-                    sent_count += 1
-                except Exception as send_err:
-                    logger.error(f"Error sending audio: {send_err}")
-                    failed_files.append(name)
-                    # Only notify user if file is confirmed ready but sending fails
-                    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-                        await update.message.reply_text(
-                            f"❌ *Failed to send* `{name}` by {artist}. Please try again.",
-                            parse_mode='Markdown'
-                        )
-                finally:
-                    try:
-                        os.unlink(file_path)
-                    except:
-                        pass
-            if sent_count == total_files:
-                await update.message.reply_text(
-                    f"✅ All {sent_count}/{total_files} files sent! You can send another name or link to start a new search.",
-                    parse_mode='Markdown'
-                )
-            elif sent_count > 0:
-                fail_list = ', '.join(failed_files)
-                await update.message.reply_text(
-                    f"✅ {sent_count}/{total_files} files sent. ❌ {total_files-sent_count}/{total_files} could not be sent ({fail_list}). Please try again.",
-                    parse_mode='Markdown'
-                )
-            else:
-                await update.message.reply_text(
-                    "❌ No files were sent. Please try the process again.",
-                    parse_mode='Markdown'
-                )
-            del user_search_state[user_id]
+            processing_msg = await reply_text(update,
+                f"⬇️ Downloading {len(indices)} track(s)...",
+                parse_mode='Markdown'
+            )
+            # A single pick is what the user is waiting on; several (or 'all') are bulk work
+            await download_batch(
+                update, [results[number-1] for number in indices], processing_msg,
+                priority=INTERACTIVE if len(indices) == 1 else BULK
+            )
+            await sessions.pop(user_id)
             return
         # Discard
         if text == 'discard':
-            del user_search_state[user_id]
-            await update.message.reply_text("Search discarded. Send a new song or artist name.")
+            await sessions.pop(user_id)
+            await reply_text(update, "Search discarded. Send a new song or artist name.")
             return
-        # Next page
+        # A number that is not on the list
         if text.isdigit():
-            number = int(text)
-            if number == end + 1 and end < len(results):
-                state['page'] += 1
-                processing_msg = await update.message.reply_text("Next page...", parse_mode='Markdown')
-                await send_search_page(update, processing_msg, user_id)
-                return
-            # Download single by absolute number
-            if 1 <= number <= len(results):
-                entry = results[number-1]
-                url = entry.get('url')
-                name = entry.get('title', 'Unknown')
-                artist = entry.get('uploader', 'Unknown Artist')
-                duration = int(entry.get('duration', 0) or 0)
-                msg = await update.message.reply_text(
-                    f"⬇️ Downloading `{name}` by {artist} ({duration//60}:{duration%60:02d} min)...",
-                    parse_mode='Markdown'
-                )
-                with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as tmp_file:
-                    output_path = tmp_file.name
-                success = await run_in_executor(download_audio_fast, url, output_path)
-                if success:
-                    with open(output_path, 'rb') as audio_file:
-                        await update.message.reply_audio(
-                            audio=audio_file,
-                            title=name[:64],
-                            performer=artist[:64],
-                            caption=f"🎵 *{name}* by {artist}",
-                            parse_mode='Markdown',
-                            filename=f"{sanitize_filename(artist)} - {sanitize_filename(name)}.mp3"
-                        )
-                    try:
-                        os.unlink(output_path)
-                    except:
-                        pass
-                await msg.edit_text(
-                    f"✅ *Done!* \n\nSend another name or link! 🎧",
-                    parse_mode='Markdown'
-                )
-                del user_search_state[user_id]
-                return
-            else:
-                await update.message.reply_text(
-                    "❌ Invalid number. Please reply with a valid song number.",
-                    parse_mode='Markdown'
-                )
-                return
+            await reply_text(update,
+                "❌ Invalid number. Please reply with a valid song number.",
+                parse_mode='Markdown'
+            )
+            return
         # Otherwise, treat as search query
-        processing_msg = await update.message.reply_text(
+        processing_msg = await reply_text(update,
             "🔍 Searching for your song or artist...",
             parse_mode='Markdown'
         )
         await search_and_select_youtube(update, processing_msg, message_text)
         return
     # Quick processing message
-    processing_msg = await update.message.reply_text(
+    processing_msg = await reply_text(update,
         "⚡ *Processing...* \n\nThis will be fast! 🚀",
         parse_mode='Markdown'
     )
@@ -867,31 +1853,14 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Fast processing based on link type
         if 'open.spotify.com' in message_text and '/album/' in message_text:
             album_id = message_text.split('/album/')[-1].split('?')[0]
-            album = sp.album(album_id)
-            album_name = album.get('name', 'Spotify Album')
-            tracks = album['tracks']['items']
-            next_url = album['tracks']['next']
-            while next_url:
-                next_tracks = sp._get(next_url)
-                tracks.extend(next_tracks['items'])
-                next_url = next_tracks['next']
-            user_search_state[user_id] = {
-                'results': [
-                    {
-                        'url': f"https://open.spotify.com/track/{track['id']}",
-                        'title': track['name'],
-                        'uploader': track['artists'][0]['name'],
-                        'duration': int(track['duration_ms']) // 1000
-                    } for track in tracks
-                ],
-                'page': 0,
-                'album_name': album_name
-            }
-            await processing_msg.edit_text(
+            album_name, tracks = await run_in_executor(with_spotify, spotify_meta.fetch_album, album_id)
+            await sessions.put(user_id, SearchSession(spotify_results(tracks), title=album_name))
+            progress.set(
+                processing_msg,
                 f"Found album *{album_name}* — preparing to send over to you...",
-                parse_mode='Markdown'
+                parse_mode='Markdown', final=True
             )
-            processing_msg = await update.message.reply_text(
+            processing_msg = await reply_text(update,
                 f"*{album_name}*\n\nSelect tracks to download by replying with numbers (e.g. 1,2,3) or 'all' to download all.\n\nListing all {len(tracks)} tracks...",
                 parse_mode='Markdown'
             )
@@ -899,235 +1868,201 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         if 'open.spotify.com' in message_text and '/playlist/' in message_text:
             playlist_id = message_text.split('/playlist/')[-1].split('?')[0]
-            playlist = sp.playlist(playlist_id)
-            playlist_name = playlist.get('name', 'Spotify Playlist')
-            tracks = playlist['tracks']['items']
             # Collect all tracks with pagination
-            next_url = playlist['tracks']['next']
-            while next_url:
-                next_tracks = sp._get(next_url)
-                tracks.extend(next_tracks['items'])
-                next_url = next_tracks['next']
-            # Prepare results for user selection
-            user_id = update.effective_user.id
-            user_search_state[user_id] = {
-                'results': [
-                    {
-                        'url': f"https://open.spotify.com/track/{track['track']['id']}",
-                        'title': track['track']['name'],
-                        'uploader': track['track']['artists'][0]['name'],
-                        'duration': int(track['track']['duration_ms']) // 1000
-                    } for track in tracks if track.get('track') and track['track'].get('id')
-                ],
-                'page': 0,
-                'playlist_name': playlist_name
-            }
-            await processing_msg.edit_text(
+            playlist_name, tracks = await run_in_executor(with_spotify, spotify_meta.fetch_playlist, playlist_id)
+            session = SearchSession(spotify_results(tracks), title=playlist_name)
+            await sessions.put(user_id, session)
+            progress.set(
+                processing_msg,
                 f"Found playlist *{playlist_name}* — preparing to send over to you...",
-                parse_mode='Markdown'
+                parse_mode='Markdown', final=True
             )
-            # Format message as requested
-            def escape_md(text):
-                if not text:
-                    return ''
-                return re.sub(r'([_\*\[\]()~`>#+\-=|{}.!])', r'\\\1', str(text))
-            msg_lines = [
-                f"*{i+1}.*\n  🎵 *Title:* {escape_md(entry['title'])}\n  👤 *Artist:* {escape_md(entry['uploader'])}\n  ⏱️ *Duration:* {entry['duration']//60}:{entry['duration']%60:02d} min" + ("\n────────────────────────────" if i < len(user_search_state[user_id]['results'])-1 else "")
-                for i, entry in enumerate(user_search_state[user_id]['results'][:10])
-            ]
-            msg_lines.append("Send a number to download, 'all' to download all, or use the 'discard' button to cancel.")
-            from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-            keyboard = []
-            if len(user_search_state[user_id]['results']) > 10:
-                keyboard.append([InlineKeyboardButton("Next page →", callback_data="next_page")])
-            keyboard.append([InlineKeyboardButton("Discard", callback_data="discard_search")])
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await update.message.reply_text(
-                f"*Select a song by number:*\n\n" + "\n".join(msg_lines),
-                parse_mode='Markdown',
-                reply_markup=reply_markup
+            processing_msg = await reply_text(update,
+                f"*{playlist_name}*\n\nSelect tracks to download by replying with numbers (e.g. 1,2,3) or 'all' to download all.\n\nListing all {len(tracks)} tracks...",
+                parse_mode='Markdown'
             )
+            await send_search_page(update, processing_msg, user_id, session)
             return
         elif 'open.spotify.com' in message_text and '/track/' in message_text:
             success = await download_spotify_track_fast(message_text, update, processing_msg)
+            if success is False:
+                count_delivery(message_text, 'failed')
             if success:
-                await processing_msg.edit_text(
+                progress.set(
+                    processing_msg,
                     "✅ *Done!* \n\nSend another link! 🎧",
-                    parse_mode='Markdown'
+                    parse_mode='Markdown', final=True
                 )
         elif 'youtube.com' in message_text or 'youtu.be' in message_text:
             success = await download_youtube_music_fast(message_text, update, processing_msg)
+            if success is False:
+                count_delivery(message_text, 'failed')
             if success:
-                await processing_msg.edit_text(
+                progress.set(
+                    processing_msg,
                     "✅ *Done!* \n\nSend another link! 🎧",
-                    parse_mode='Markdown'
+                    parse_mode='Markdown', final=True
                 )
         else:
             await search_and_select_youtube(update, processing_msg, message_text)
     except Exception as e:
         logger.error(f"Error processing request: {e}")
-        await processing_msg.edit_text(
+        progress.set(
+            processing_msg,
             "❌ *Error* \n\nPlease try a different link.",
-            parse_mode='Markdown'
+            parse_mode='Markdown', final=True
         )
 
-async def handle_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    # Handles user reply with song number
-    user_id = update.effective_user.id
-    if user_id in user_search_state:
-        state = user_search_state[user_id]
-        results = state['results']
-        page = state['page']
-        page_size = 10
-        start = page * page_size
-        end = start + page_size
-        page_results = results[start:end]
-        text = update.message.text.strip().lower()
-        try:
-            # Download all
-            if text == 'all':
-                for entry in results:
-                    url = entry.get('url')
-                    name = entry.get('title', 'Unknown')
-                    artist = entry.get('uploader', 'Unknown Artist')
-                    duration = int(entry.get('duration', 0) or 0)
-                    msg = await update.message.reply_text(
-                        f"⬇️ Downloading `{name}` by {artist} ({duration//60}:{duration%60:02d} min)...",
-                        parse_mode='Markdown'
-                    )
-                    with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as tmp_file:
-                        output_path = tmp_file.name
-                    success = await run_in_executor(download_audio_fast, url, output_path)
-                    if success:
-                        with open(output_path, 'rb') as audio_file:
-                            await update.message.reply_audio(
-                                audio=audio_file,
-                                title=name[:64],
-                                performer=artist[:64],
-                                caption=f"🎵 *{name}* by {artist}",
-                                parse_mode='Markdown',
-                                filename=f"{sanitize_filename(artist)} - {sanitize_filename(name)}.mp3"
-                            )
-                        try:
-                            os.unlink(output_path)
-                        except:
-                            pass
-                    await msg.edit_text(
-                        f"✅ *Done!* \n\nSend another name or link! 🎧",
-                        parse_mode='Markdown'
-                    )
-                del user_search_state[user_id]
-                return
-            # Discard
-            if text == 'discard':
-                del user_search_state[user_id]
-                await update.message.reply_text("Search discarded. Send a new song or artist name.")
-                return
-            # Next page
-            if text.isdigit():
-                number = int(text)
-                if number == len(page_results)+1 and end < len(results):
-                    state['page'] += 1
-                    processing_msg = await update.message.reply_text("Next page...", parse_mode='Markdown')
-                    await send_search_page(update, processing_msg, user_id)
-                    return
-                # Download single
-                if 1 <= number <= len(page_results):
-                    entry = page_results[number-1]
-                    url = entry.get('url')
-                    name = entry.get('title', 'Unknown')
-                    artist = entry.get('uploader', 'Unknown Artist')
-                    duration = int(entry.get('duration', 0) or 0)
-                    msg = await update.message.reply_text(
-                        f"⬇️ Downloading `{name}` by {artist} ({duration//60}:{duration%60:02d} min)...",
-                        parse_mode='Markdown'
-                    )
-                    with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as tmp_file:
-                        output_path = tmp_file.name
-                    success = await run_in_executor(download_audio_fast, url, output_path)
-                    if success:
-                        with open(output_path, 'rb') as audio_file:
-                            await update.message.reply_audio(
-                                audio=audio_file,
-                                title=name[:64],
-                                performer=artist[:64],
-                                caption=f"🎵 *{name}* by {artist}",
-                                parse_mode='Markdown',
-                                filename=f"{sanitize_filename(artist)} - {sanitize_filename(name)}.mp3"
-                            )
-                        try:
-                            os.unlink(output_path)
-                        except:
-                            pass
-                    await msg.edit_text(
-                        f"✅ *Done!* \n\nSend another name or link! 🎧",
-                        parse_mode='Markdown'
-                    )
-                    del user_search_state[user_id]
-                    return
-                else:
-                    await update.message.reply_text(
-                        "❌ Invalid number. Please reply with a valid song number.",
-                        parse_mode='Markdown'
-                    )
-                    return
-        except Exception as e:
-            logger.error(f"Error handling reply: {e}")
-            await update.message.reply_text(
-                "❌ Error processing your selection.",
-                parse_mode='Markdown'
-            )
-
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Fast error handling"""
     logger.error(f"Update {update} caused error {context.error}")
     
     if update and update.effective_message:
-        await update.effective_message.reply_text(
+        await reply_text(update,
             "❌ *Quick Error* \n\nSomething went wrong. Try again! ⚡",
             parse_mode='Markdown'
         )
 
-def main():
-    """Start the optimized bot"""
-    # Create the Application
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+def warm_up():
+    """Pay the deferred import/setup costs in the background once the bot is up"""
+    start = time.perf_counter()
+    get_spotify()
+    ytdl_pool.warm_up()
+    logger.info(f"Background warm-up finished in {time.perf_counter() - start:.2f}s")
+
+async def on_startup(application):
+    """Runs inside the bot's event loop before polling (or the webhook) starts"""
+    startup_timer.mark('application')
+    loop_monitor.start()
+    await http_server.start()
+    # Build the Spotify client and YoutubeDL instances now rather than on the first request,
+    # without holding up startup
+    asyncio.get_running_loop().run_in_executor(io_executor, warm_up)
+    # Finished jobs are only kept for a week; interrupted ones carry on
+    await run_in_executor(batch_store.purge_finished, 7 * 24 * 3600)
+    application.create_task(resume_batch_jobs(application.bot))
+    startup_timer.mark('startup hook')
+    if not WEBHOOK_URL:
+        # Polling begins right after post_init returns
+        mark_ready()
+
+def mark_ready():
+    http_server.ready = True
+    startup_timer.ready()
+    logger.info(f"Startup: {startup_timer.summary()}")
+
+async def on_stop(application):
+    # Last status edits still need the bot's connection, which is closed before post_shutdown
+    await progress.flush()
+
+async def on_shutdown(application):
+    await http_server.stop()
+
+async def run_webhook(application):
+    """Receive updates on http_server instead of long polling"""
+    secret = WEBHOOK_SECRET or hashlib.sha256(TELEGRAM_BOT_TOKEN.encode()).hexdigest()[:32]
+
+    async def accept(data):
+        # Refuse rather than buffer without bound; Telegram retries refused updates
+        if application.update_queue.qsize() >= MAX_PENDING_UPDATES or scheduler.waiting() >= MAX_QUEUED_WORK:
+            return False
+        await application.update_queue.put(Update.de_json(data, application.bot))
+        return True
+
+    http_server.add_webhook(WEBHOOK_PATH, secret, accept)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    async with application:
+        await on_startup(application)
+        await application.start()
+        await application.bot.set_webhook(
+            url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+            secret_token=secret,
+            allowed_updates=Update.ALL_TYPES,
+            max_connections=int(os.environ.get('WEBHOOK_MAX_CONNECTIONS', 40))
+        )
+        startup_timer.mark('webhook')
+        mark_ready()
+        logger.info(f"Receiving updates by webhook at {WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH}")
+        try:
+            await stop.wait()
+        finally:
+            # The hooks run_polling calls itself (post_stop, post_shutdown); the bot's connection is still open here
+            await on_stop(application)
+            await application.stop()
+            await on_shutdown(application)
+
+def build_application(builder=None):
+    """The Application with every handler registered.
+
+    builder: an ApplicationBuilder with the token (and e.g. a base_url) already set;
+    the load simulator uses it to talk to a local stand-in for the Bot API.
+    """
+    # Handle updates concurrently so one user's batch does not hold up everyone else's messages
+    builder = builder or Application.builder().token(TELEGRAM_BOT_TOKEN)
+    application = (
+        builder
+        .concurrent_updates(int(os.environ.get('CONCURRENT_UPDATES', 64)))
+        .post_init(on_startup)
+        .post_stop(on_stop)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
     
     # Add handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("format", format_command))
+    application.add_handler(CommandHandler("queue", queue_command))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-    application.add_handler(MessageHandler(filters.TEXT & filters.REPLY, handle_reply))
     from telegram.ext import CallbackQueryHandler
     async def discard_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        user_search_state.pop(user_id, None)
+        await sessions.pop(user_id)
         await update.callback_query.answer()
-        await update.callback_query.edit_message_text("Search discarded. Send a new song or artist name.")
+        progress.set(update.callback_query.message, "Search discarded. Send a new song or artist name.", final=True)
 
     async def next_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        if user_id in user_search_state:
-            user_search_state[user_id]['page'] += 1
+        session = await sessions.get(user_id)
+        if session is not None:
+            session.page += 1
+            await sessions.put(user_id, session)
             await update.callback_query.answer()
-            await send_search_page(update, update.callback_query.message, user_id)
+            await send_search_page(update, update.callback_query.message, user_id, session)
 
     async def prev_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        if user_id in user_search_state and user_search_state[user_id]['page'] > 0:
-            user_search_state[user_id]['page'] -= 1
+        session = await sessions.get(user_id)
+        if session is not None and session.page > 0:
+            session.page -= 1
+            await sessions.put(user_id, session)
             await update.callback_query.answer()
-            await send_search_page(update, update.callback_query.message, user_id)
+            await send_search_page(update, update.callback_query.message, user_id, session)
 
     application.add_handler(CallbackQueryHandler(discard_callback, pattern="^discard_search$"))
     application.add_handler(CallbackQueryHandler(next_page_callback, pattern="^next_page$"))
     application.add_handler(CallbackQueryHandler(prev_page_callback, pattern="^prev_page$"))
     application.add_error_handler(error_handler)
+    return application
+
+def main():
+    """Start the optimized bot"""
+    if BOT_MODE == 'worker':
+        print(f"⚙️ Download worker {WORKER_ID} is running...")
+        asyncio.run(run_worker())
+        return
+    application = build_application()
     print("🎵 FAST Music Downloader Bot is running...")
     print("⚡ Optimized for speed!")
     print("📍 Send /start to your bot on Telegram")
     print("⏹️ Press Ctrl+C to stop the bot")
-    application.run_polling()
+    if WEBHOOK_URL:
+        asyncio.run(run_webhook(application))
+    else:
+        application.run_polling()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
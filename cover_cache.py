@@ -0,0 +1,209 @@
+"""Album-art cache.
+
+Cover images are keyed by URL and kept in a small in-memory LRU in front of
+a size-bounded directory on disk, so an album or artist batch fetches each
+cover once. Fetches use strict timeouts and a size cap, and a 320px JPEG
+thumbnail (Telegram's limit for the ``thumbnail`` parameter) is made from
+the cached cover with ffmpeg on first use.
+"""
+import collections
+import hashlib
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = 320
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+READ_CHUNK = 64 * 1024
+
+
+class CoverCache:
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024, memory_entries=64,
+                 timeout=(3, 10), deadline=10, ffmpeg='ffmpeg'):
+        """timeout: requests' (connect, read) timeouts, which bound each socket read;
+        deadline: seconds a whole fetch may take, however slowly the bytes trickle in
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.timeout = timeout
+        self.deadline = deadline
+        self.ffmpeg = ffmpeg
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # requests is imported (and the session built) on the first fetch
+        self._session = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.fetches = 0
+        self.failures = 0
+        os.makedirs(directory, exist_ok=True)
+        # Disk index: file name -> size, least recently used first
+        self._files = collections.OrderedDict()
+        self._bytes = 0
+        entries = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.name.endswith('.tmp'):
+                # Left over from an interrupted write
+                os.unlink(entry.path)
+            elif entry.is_file() and entry.name.endswith('.jpg'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self._bytes += size
+
+    def _name(self, url, kind='cover'):
+        return f"{hashlib.sha256(url.encode()).hexdigest()}.{kind}.jpg"
+
+    def _touch(self, name):
+        with self._lock:
+            if name not in self._files:
+                return False
+            self._files.move_to_end(name)
+        try:
+            os.utime(os.path.join(self.directory, name))
+        except OSError:
+            pass
+        return True
+
+    def _store(self, name, data):
+        """Write atomically and evict least recently used files over the budget"""
+        path = os.path.join(self.directory, name)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        evicted = []
+        with self._lock:
+            self._bytes += len(data) - self._files.pop(name, 0)
+            self._files[name] = len(data)
+            while self._bytes > self.max_bytes and len(self._files) > 1:
+                old_name, old_size = self._files.popitem(last=False)
+                self._bytes -= old_size
+                evicted.append(old_name)
+        for old_name in evicted:
+            try:
+                os.unlink(os.path.join(self.directory, old_name))
+            except OSError:
+                pass
+        return path
+
+    def _remember(self, url, data):
+        with self._lock:
+            self._memory[url] = data
+            self._memory.move_to_end(url)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def cached(self, url):
+        """Cover bytes from memory only (cheap enough to call on the event loop)"""
+        with self._lock:
+            data = self._memory.get(url)
+            if data is not None:
+                self._memory.move_to_end(url)
+                self.hits += 1
+            return data
+
+    def get(self, url):
+        """Cover bytes from memory or disk, or None"""
+        if not url:
+            return None
+        data = self.cached(url)
+        if data is not None:
+            return data
+        name = self._name(url)
+        if not self._touch(name):
+            return None
+        try:
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        self.disk_hits += 1
+        self._remember(url, data)
+        return data
+
+    def path(self, url):
+        """Path of url's cover on disk if it is cached, else None"""
+        if not url:
+            return None
+        name = self._name(url)
+        return os.path.join(self.directory, name) if self._touch(name) else None
+
+    def fetch(self, url):
+        """Cover bytes for url, downloading them on a miss. Returns None on failure."""
+        if not url:
+            return None
+        data = self.get(url)
+        if data is not None:
+            return data
+        self.fetches += 1
+        try:
+            if self._session is None:
+                import requests
+                self._session = requests.Session()
+            deadline = time.monotonic() + self.deadline
+            chunks, size = [], 0
+            with self._session.get(url, timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                # read1 (urllib3 2) returns whatever has arrived instead of waiting for a full chunk
+                read = getattr(response.raw, 'read1', response.raw.read)
+                while size <= MAX_IMAGE_BYTES:
+                    chunk = read(READ_CHUNK, decode_content=True)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"not done after {self.deadline}s")
+            data = b''.join(chunks)
+            if not data or len(data) > MAX_IMAGE_BYTES:
+                raise ValueError(f"unexpected image size {len(data)}")
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"Cover fetch failed for {url}: {e}")
+            return None
+        self._store(self._name(url), data)
+        self._remember(url, data)
+        return data
+
+    def thumbnail(self, url):
+        """Path of a THUMBNAIL_SIZE JPEG made from url's cover, or None"""
+        if not url:
+            return None
+        name = self._name(url, 'thumb')
+        path = os.path.join(self.directory, name)
+        if self._touch(name):
+            return path
+        if self.fetch(url) is None or not self._touch(self._name(url)):
+            return None
+        scale = f"scale={THUMBNAIL_SIZE}:{THUMBNAIL_SIZE}:force_original_aspect_ratio=decrease"
+        try:
+            result = subprocess.run(
+                [self.ffmpeg, '-hide_banner', '-loglevel', 'error', '-y',
+                 '-i', os.path.join(self.directory, self._name(url)),
+                 '-vf', scale, '-q:v', '4', '-f', 'mjpeg', 'pipe:1'],
+                check=True, capture_output=True, timeout=30
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning(f"Thumbnail generation failed for {url}: {e}")
+            return None
+        return self._store(name, result.stdout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'memory_entries': len(self._memory),
+                'disk_files': len(self._files),
+                'disk_bytes': self._bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'fetches': self.fetches,
+                'failures': self.failures,
+            }
@@ -0,0 +1,61 @@
+"""Instrumented thread pools.
+
+The bot keeps network-bound work (Spotify, searches, downloads) and
+CPU-bound work (ffmpeg transcodes, tagging) in separate, independently
+sized pools so slow transcodes never queue quick lookups. Each pool
+reports its queue depth, active workers and queue wait time.
+"""
+import concurrent.futures
+import threading
+import time
+
+
+class InstrumentedExecutor(concurrent.futures.Executor):
+    def __init__(self, name, max_workers):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.started = 0
+        self.completed = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def submit(self, fn, *args, **kwargs):
+        enqueued = time.monotonic()
+        with self._lock:
+            self.queued += 1
+
+        def run():
+            waited = time.monotonic() - enqueued
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+                self.started += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+
+        return self._executor.submit(run)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'queued': self.queued,
+                'active': self.active,
+                'completed': self.completed,
+                'wait_seconds_total': round(self.wait_seconds_total, 3),
+                'wait_seconds_avg': round(self.wait_seconds_total / self.started, 4) if self.started else 0.0,
+                'wait_seconds_max': round(self.wait_seconds_max, 3),
+            }
@@ -0,0 +1,70 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class FileIdCache:
+    """Persistent map of source identity -> Telegram file_id.
+
+    Keys look like ``<bot id>:<source>:<source id>:<quality>`` so a file_id
+    uploaded by one bot token or in one quality profile is never reused for
+    another.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS file_ids ('
+            ' key TEXT PRIMARY KEY,'
+            ' file_id TEXT NOT NULL,'
+            ' file_unique_id TEXT,'
+            ' title TEXT,'
+            ' performer TEXT,'
+            ' created REAL NOT NULL,'
+            ' hits INTEGER NOT NULL DEFAULT 0)'
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return {'file_id', 'title', 'performer'} for key, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT file_id, title, performer FROM file_ids WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute('UPDATE file_ids SET hits = hits + 1 WHERE key = ?', (key,))
+            return {'file_id': row[0], 'title': row[1], 'performer': row[2]}
+
+    def set(self, key, file_id, file_unique_id=None, title=None, performer=None):
+        """Remember the file_id Telegram assigned to an upload"""
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO file_ids (key, file_id, file_unique_id, title, performer, created, hits)'
+                ' VALUES (?, ?, ?, ?, ?, ?, 0)',
+                (key, file_id, file_unique_id, title, performer, time.time())
+            )
+
+    def delete(self, key):
+        """Forget a file_id Telegram no longer accepts"""
+        with self._lock:
+            self._conn.execute('DELETE FROM file_ids WHERE key = ?', (key,))
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute('SELECT COUNT(*) FROM file_ids').fetchone()[0]
+        return {'entries': size, 'hits': self.hits, 'misses': self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
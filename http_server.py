@@ -0,0 +1,103 @@
+"""Async HTTP server sharing the bot's event loop.
+
+Serves liveness (/, /healthz), readiness (/readyz), /stats and Prometheus
+/metrics, and in
+webhook mode receives Telegram updates on the same port -- one server, no
+extra threads.
+"""
+import hmac
+import inspect
+import logging
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+
+class HttpServer:
+    def __init__(self, host='0.0.0.0', port=8080, stats=None, metrics=None):
+        """stats: optional callable returning a JSON-serialisable dict for /stats;
+        metrics: optional callable returning the Prometheus text served at /metrics.
+        Either may be a coroutine function (e.g. to read a database off the loop).
+        """
+        self.host = host
+        self.port = port
+        self.ready = False
+        self._stats = stats
+        self._metrics = metrics
+        self._runner = None
+        self.app = web.Application()
+        self.app.router.add_get('/', self._home)
+        self.app.router.add_get('/healthz', self._healthz)
+        self.app.router.add_get('/readyz', self._readyz)
+        self.app.router.add_get('/stats', self._stats_handler)
+        if metrics:
+            self.app.router.add_get('/metrics', self._metrics_handler)
+        self.updates_accepted = 0
+        self.updates_rejected = 0
+
+    async def _home(self, request):
+        return web.Response(text="✅ Bot is alive!")
+
+    async def _healthz(self, request):
+        # Answering at all means the event loop is running
+        return web.json_response({'status': 'ok'})
+
+    async def _readyz(self, request):
+        if not self.ready:
+            return web.json_response({'status': 'starting'}, status=503)
+        return web.json_response({'status': 'ready'})
+
+    async def _stats_handler(self, request):
+        stats = await _call(self._stats) if self._stats else {}
+        stats['http'] = {'updates_accepted': self.updates_accepted, 'updates_rejected': self.updates_rejected}
+        return web.json_response(stats)
+
+    async def _metrics_handler(self, request):
+        return web.Response(
+            text=await _call(self._metrics), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        )
+
+    def add_webhook(self, path, secret, accept):
+        """Receive Telegram updates on POST path.
+
+        accept: ``async accept(data) -> bool``; False means the bot is
+        overloaded, answered with 503 so Telegram re-delivers later.
+        """
+        async def webhook(request):
+            token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+            if secret and not hmac.compare_digest(token, secret):
+                return web.Response(status=403)
+            try:
+                data = await request.json()
+            except ValueError:
+                return web.Response(status=400)
+            if not await accept(data):
+                self.updates_rejected += 1
+                return web.Response(status=503, headers={'Retry-After': '5'})
+            self.updates_accepted += 1
+            return web.Response()
+
+        self.app.router.add_post(path, webhook)
+
+    def add_route(self, method, path, handler):
+        self.app.router.add_route(method, path, handler)
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"HTTP server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        self.ready = False
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def _call(func):
+    result = func()
+    if inspect.isawaitable(result):
+        result = await result
+    return result
@@ -0,0 +1,189 @@
+"""Work queue between the Telegram front-end and download workers.
+
+The front-end process only parses messages and puts delivery tasks (plain
+JSON-serialisable dicts) on a queue; worker processes take them off, do the
+resolve/download/transcode and upload the result to the chat themselves.
+Three interchangeable backends:
+
+- MemoryQueue: in-process only (tests, embedding); separate front-end and
+  worker processes need one of the others
+- SQLiteQueue: a file shared by processes on the same machine
+- RedisQueue: any Redis-protocol server, for workers on other nodes
+
+All methods are blocking; call them from an executor. A task taken with
+get() must be ack()ed once handled; unacknowledged tasks are handed out
+again after a crash (SQLite: after visibility_timeout; Redis: when the
+worker with the same id starts again).
+"""
+import itertools
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+
+class MemoryQueue:
+    def __init__(self):
+        self._queue = queue.PriorityQueue()
+        self._ids = itertools.count(1)
+        self.put_count = 0
+        self.acked = 0
+
+    def put(self, task):
+        self.put_count += 1
+        self._queue.put((task.get('priority', 0), next(self._ids), task))
+
+    def get(self, timeout=5):
+        """Return (receipt, task), or None if nothing arrived within timeout seconds"""
+        try:
+            _, receipt, task = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return receipt, task
+
+    def ack(self, receipt):
+        self.acked += 1
+
+    def stats(self):
+        return {'backend': 'memory', 'queued': self._queue.qsize(), 'put': self.put_count, 'acked': self.acked}
+
+
+class SQLiteQueue:
+    def __init__(self, path, visibility_timeout=15 * 60):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.visibility_timeout = visibility_timeout
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS tasks ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' payload TEXT NOT NULL,'
+            ' priority INTEGER NOT NULL DEFAULT 0,'
+            ' claimed_until REAL NOT NULL DEFAULT 0,'
+            ' attempts INTEGER NOT NULL DEFAULT 0)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS tasks_order ON tasks (priority, id)')
+
+    def put(self, task):
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO tasks (payload, priority) VALUES (?, ?)', (json.dumps(task), task.get('priority', 0))
+            )
+
+    def _claim(self):
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock, so two workers never claim the same row
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    'SELECT id, payload FROM tasks WHERE claimed_until < ? ORDER BY priority, id LIMIT 1', (now,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        'UPDATE tasks SET claimed_until = ?, attempts = attempts + 1 WHERE id = ?',
+                        (now + self.visibility_timeout, row[0])
+                    )
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return row
+
+    def get(self, timeout=5, poll_interval=0.25):
+        deadline = time.monotonic() + timeout
+        while True:
+            row = self._claim()
+            if row is not None:
+                return row[0], json.loads(row[1])
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_interval)
+
+    def ack(self, receipt):
+        with self._lock:
+            self._conn.execute('DELETE FROM tasks WHERE id = ?', (receipt,))
+
+    def stats(self):
+        with self._lock:
+            queued, claimed = self._conn.execute(
+                'SELECT COALESCE(SUM(claimed_until < ?), 0), COALESCE(SUM(claimed_until >= ?), 0) FROM tasks',
+                (time.time(), time.time())
+            ).fetchone()
+        return {'backend': 'sqlite', 'queued': queued, 'claimed': claimed}
+
+
+class RedisQueue:
+    """Reliable list queue: tasks move from the pending list to a per-worker processing list"""
+
+    def __init__(self, url, name='musicbot:tasks', worker_id=None, client=None):
+        """client: an already-built redis.Redis-compatible client (e.g. a local stand-in) instead of url"""
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("QUEUE_BACKEND=redis needs the 'redis' package (pip install -r requirements-redis.txt)")
+            client = redis.Redis.from_url(url)
+        self._redis = client
+        self.name = name
+        self.worker_id = worker_id
+        self._pending = {priority: f"{name}:pending:{priority}" for priority in (0, 1)}
+        self._processing = f"{name}:processing:{worker_id}" if worker_id else None
+
+    def requeue_unacked(self):
+        """Put back tasks this worker id took but never acknowledged (it crashed)"""
+        if not self._processing:
+            return 0
+        moved = 0
+        while True:
+            # Newest first, each pushed to the front (right) of its list, so the oldest ends up first
+            raw = self._redis.lpop(self._processing)
+            if raw is None:
+                return moved
+            self._redis.rpush(self._pending_for(json.loads(raw)), raw)
+            moved += 1
+
+    def _pending_for(self, task):
+        return self._pending[1 if task.get('priority') else 0]
+
+    def put(self, task):
+        self._redis.lpush(self._pending_for(task), json.dumps(task))
+
+    def get(self, timeout=5, poll_interval=0.25):
+        # Interactive tasks first, then bulk; LMOVE is atomic, so each task goes to one worker
+        deadline = time.monotonic() + timeout
+        while True:
+            for key in (self._pending[0], self._pending[1]):
+                raw = self._redis.lmove(key, self._processing, 'RIGHT', 'LEFT')
+                if raw is not None:
+                    return raw, json.loads(raw)
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_interval)
+
+    def ack(self, receipt):
+        self._redis.lrem(self._processing, 1, receipt)
+
+    def stats(self):
+        return {
+            'backend': 'redis',
+            'queued': sum(self._redis.llen(key) for key in self._pending.values()),
+            'processing': self._redis.llen(self._processing) if self._processing else 0,
+        }
+
+
+def open_queue(backend, url=None, worker_id=None):
+    """Build the queue named by QUEUE_BACKEND ('memory', 'sqlite' or 'redis')"""
+    if backend == 'memory':
+        return MemoryQueue()
+    if backend == 'sqlite':
+        return SQLiteQueue(url)
+    if backend == 'redis':
+        return RedisQueue(url or 'redis://localhost:6379/0', worker_id=worker_id)
+    raise ValueError(f"Unknown queue backend '{backend}'")
@@ -0,0 +1 @@
+"""Load simulator: synthetic users against local fake Telegram, Spotify and YouTube; run with python -m loadtest."""
@@ -0,0 +1,266 @@
+"""Drive the bot with simulated users against local fake services.
+
+    python -m loadtest --scenario mixed --users 50 --duration 60
+    python -m loadtest --scenario tracks,search,albums,playlists --users 20 --json report.json
+    python -m loadtest --scenario tracks --users 100 --youtube-latency 0.5 --telegram-failures 0.02
+
+Each scenario runs in a fresh process (empty caches, new data directory)
+and reports throughput, p50/p95/p99 step latency and resource usage.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.harness import percentile
+from loadtest import fakes, scenarios
+
+TOKEN = '123456:loadtest'
+
+
+def fake_ffmpeg_binary(workdir):
+    """An executable that runs fake_ffmpeg.py with this interpreter"""
+    path = os.path.join(workdir, 'ffmpeg')
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_ffmpeg.py')
+    with open(path, 'w') as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return path
+
+
+def latency_summary(latencies):
+    if not latencies:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'max_ms': None}
+    values = sorted(latencies)
+    return {
+        'p50_ms': round(percentile(values, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(values, 0.95) * 1000, 1),
+        'p99_ms': round(percentile(values, 0.99) * 1000, 1),
+        'max_ms': round(values[-1] * 1000, 1),
+    }
+
+
+class Sampler:
+    """Peaks of the bot's queues and threads, sampled while the scenario runs"""
+
+    def __init__(self, bot, interval=0.25):
+        self.bot = bot
+        self.interval = interval
+        self.peaks = {'threads': 0, 'io_queued': 0, 'cpu_queued': 0, 'scheduler_waiting': 0, 'update_queue': 0}
+
+    async def run(self, application):
+        while True:
+            current = {
+                'threads': threading.active_count(),
+                'io_queued': self.bot.io_executor.queued,
+                'cpu_queued': self.bot.cpu_executor.queued,
+                'scheduler_waiting': self.bot.scheduler.waiting(),
+                'update_queue': application.update_queue.qsize(),
+            }
+            for name, value in current.items():
+                self.peaks[name] = max(self.peaks[name], value)
+            await asyncio.sleep(self.interval)
+
+
+async def run_scenario(args, workdir):
+    telegram = fakes.FakeTelegram(fakes.ServiceProfile(args.telegram_latency, args.telegram_failures))
+    spotify = fakes.FakeSpotify(fakes.ServiceProfile(args.spotify_latency, args.spotify_failures))
+    youtube = fakes.FakeYouTube(
+        fakes.ServiceProfile(args.youtube_latency, args.youtube_failures), media_bytes=int(args.media_mb * 1024 * 1024)
+    )
+    services = fakes.FakeServices(telegram, spotify, youtube)
+    urls = services.start()
+
+    os.environ.update({
+        'DATA_DIR': os.path.join(workdir, 'data'),
+        'TELEGRAM_BOT_TOKEN': TOKEN,
+        'PORT': '0',
+        'BOT_MODE': 'standalone',
+        'TRACE_SAMPLE_RATE': os.environ.get('TRACE_SAMPLE_RATE', '0'),
+    })
+    if args.fake_ffmpeg or not shutil.which(os.environ.get('FFMPEG_BINARY', 'ffmpeg')):
+        os.environ['FFMPEG_BINARY'] = fake_ffmpeg_binary(workdir)
+    import bot
+    import spotipy
+    from telegram.ext import Application
+    logging.getLogger().setLevel(getattr(logging, args.log_level))
+    bot.ytdl_pool = fakes.HttpYoutubeDLPool(urls['youtube'])
+    bot.sp = spotipy.Spotify(auth='loadtest', requests_timeout=30)
+    bot.sp.prefix = f"{urls['spotify']}/v1/"
+
+    application = bot.build_application(
+        Application.builder().token(TOKEN).base_url(f"{urls['telegram']}/bot").connection_pool_size(256)
+    )
+    driver = scenarios.Driver(
+        application, step_timeout=args.step_timeout, reset_user=bot.sessions.pop
+    )
+    telegram.listener = driver.listener
+    catalog = scenarios.Catalog(spotify)
+    sampler = Sampler(bot)
+
+    async with application:
+        await application.start()
+        await bot.on_startup(application)
+        sampling = asyncio.create_task(sampler.run(application))
+        cpu_start = time.process_time()
+        started = time.perf_counter()
+        deadline = started + args.duration
+        users = []
+        for n in range(args.users):
+            users.append(asyncio.create_task(driver.user(
+                10_000 + n, scenarios.SCENARIOS[args.scenario], catalog, deadline,
+                max_runs=args.runs_per_user, think_time=args.think_time, seed=args.seed
+            )))
+            if args.ramp:
+                await asyncio.sleep(args.ramp / args.users)
+        await asyncio.gather(*users)
+        wall = time.perf_counter() - started
+        cpu_total = time.process_time() - cpu_start
+        sampling.cancel()
+        await application.stop()
+        await bot.on_stop(application)
+        await bot.on_shutdown(application)
+    fake_cpu = services.stop()
+
+    results = driver.results
+    steps = {}
+    for result in results:
+        steps.setdefault(result['step'], []).append(result)
+    ok = [r for r in results if r['result'] == 'ok']
+    loop = bot.loop_monitor.stats()
+    return {
+        'scenario': args.scenario,
+        'users': args.users,
+        'wall_seconds': round(wall, 2),
+        'steps_total': len(results),
+        'steps_ok': len(ok),
+        'steps_failed': sum(1 for r in results if r['result'] == 'failed'),
+        'steps_timed_out': sum(1 for r in results if r['result'] == 'timeout'),
+        'throughput_per_second': round(len(ok) / wall, 2) if wall else 0.0,
+        'latency': latency_summary([r['latency'] for r in ok]),
+        'per_step': {
+            name: dict(
+                count=len(items),
+                ok=sum(1 for r in items if r['result'] == 'ok'),
+                **latency_summary([r['latency'] for r in items if r['result'] == 'ok'])
+            )
+            for name, items in sorted(steps.items())
+        },
+        'resources': {
+            # Both include the fake services' thread; fake_services_cpu_seconds is its share
+            'cpu_seconds': round(cpu_total, 2),
+            'fake_services_cpu_seconds': round(fake_cpu, 2),
+            'peak_rss_mib': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            'peak_threads': sampler.peaks['threads'],
+            'peak_io_queued': sampler.peaks['io_queued'],
+            'peak_cpu_queued': sampler.peaks['cpu_queued'],
+            'peak_scheduler_waiting': sampler.peaks['scheduler_waiting'],
+            'peak_update_queue': sampler.peaks['update_queue'],
+            'loop_stalls': loop['stalls'],
+            'loop_max_lag_seconds': loop['max_lag_seconds'],
+        },
+        'services': services.stats(),
+    }
+
+
+def format_report(report):
+    lines = [
+        f"== {report['scenario']}: {report['users']} users, {report['wall_seconds']}s ==",
+        f"steps: {report['steps_ok']}/{report['steps_total']} ok, {report['steps_failed']} failed, "
+        f"{report['steps_timed_out']} timed out; {report['throughput_per_second']} ok steps/s",
+        f"latency: p50 {report['latency']['p50_ms']} ms, p95 {report['latency']['p95_ms']} ms, "
+        f"p99 {report['latency']['p99_ms']} ms",
+        f"{'step':<18} {'count':>6} {'ok':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}",
+    ]
+    for name, step in report['per_step'].items():
+        lines.append(
+            f"{name:<18} {step['count']:>6} {step['ok']:>6} {step['p50_ms'] or '-':>9} {step['p95_ms'] or '-':>9} "
+            f"{step['p99_ms'] or '-':>9}"
+        )
+    lines.append('resources: ' + ', '.join(f"{name} {value}" for name, value in report['resources'].items()))
+    lines.append('services: ' + ', '.join(
+        f"{name} {stats['requests']} req/{stats['failures']} failed" for name, stats in report['services'].items()
+    ))
+    return '\n'.join(lines)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m loadtest', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', default='mixed',
+                        help=f"comma-separated, from: {', '.join(scenarios.SCENARIOS)} (default mixed)")
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=60, help='seconds users keep starting new scripts')
+    parser.add_argument('--runs-per-user', type=int, help='stop each user after this many scripts')
+    parser.add_argument('--ramp', type=float, default=5, help='seconds over which users join')
+    parser.add_argument('--think-time', type=float, default=1.0, help='mean pause between a user\'s scripts')
+    parser.add_argument('--step-timeout', type=float, default=180)
+    for service, latency in (('telegram', 0.05), ('spotify', 0.1), ('youtube', 0.3)):
+        parser.add_argument(f'--{service}-latency', type=float, default=latency, help='mean seconds per request')
+        parser.add_argument(f'--{service}-failures', type=float, default=0.0, help='failure rate 0..1')
+    parser.add_argument('--media-mb', type=float, default=3, help='size of the canned audio')
+    parser.add_argument('--fake-ffmpeg', action='store_true', help='skip real transcodes even if ffmpeg exists')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--json', metavar='PATH', help='write the report(s) here')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+    names = [name.strip() for name in args.scenario.split(',') if name.strip()]
+    unknown = [name for name in names if name not in scenarios.SCENARIOS]
+    if unknown:
+        print(f"Unknown scenario(s): {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    if len(names) == 1:
+        with tempfile.TemporaryDirectory(prefix='musicbot-load-') as workdir:
+            reports = [asyncio.run(run_scenario(args, workdir))]
+    else:
+        # One process per scenario, so none starts with another's warm caches
+        reports = []
+        for name in names:
+            with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as tmp:
+                out = tmp.name
+            child = _without_values(argv, ('--scenario', '--json')) + ['--scenario', name, '--json', out]
+            subprocess.run([sys.executable, '-m', 'loadtest'] + child, check=True, stdout=subprocess.DEVNULL)
+            with open(out) as f:
+                reports.extend(json.load(f))
+            os.unlink(out)
+    for report in reports:
+        print(format_report(report))
+        print()
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+    return 0
+
+
+def _without_values(argv, options):
+    """argv minus the given options and their values (as '--opt value' or '--opt=value')"""
+    result, skip = [], False
+    for arg in argv:
+        if skip:
+            skip = False
+            continue
+        if arg in options:
+            skip = True
+            continue
+        if any(arg.startswith(option + '=') for option in options):
+            continue
+        result.append(arg)
+    return result
+
+
+if __name__ == '__main__':
+    sys.exit(main())
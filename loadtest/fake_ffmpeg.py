@@ -0,0 +1,25 @@
+"""Stand-in for the ffmpeg binary when the load simulator runs without one.
+
+Copies the first input to the output (or to stdout for 'pipe:1'), after
+sleeping FAKE_FFMPEG_SECONDS to stand for the transcode.
+"""
+import os
+import shutil
+import sys
+import time
+
+
+def main(args):
+    time.sleep(float(os.environ.get('FAKE_FFMPEG_SECONDS', 0)))
+    source = args[args.index('-i') + 1]
+    output = args[-1]
+    if output == 'pipe:1':
+        with open(source, 'rb') as f:
+            shutil.copyfileobj(f, sys.stdout.buffer)
+    else:
+        shutil.copyfile(source, output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
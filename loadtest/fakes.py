@@ -0,0 +1,448 @@
+"""Local stand-ins for the Telegram Bot API, the Spotify Web API and YouTube.
+
+All three are aiohttp apps served from one background thread with its own
+event loop, so their work does not show up as stalls of the bot's loop.
+Each has a ServiceProfile giving its latency and failure rate.
+
+- FakeTelegram answers the Bot API methods the bot calls and reports every
+  message, edit and upload to a listener (the load driver).
+- FakeSpotify serves a generated catalogue (tracks, albums, playlists,
+  artists, cover images) with Spotify's paging.
+- FakeYouTube serves search results, video info and canned audio;
+  HttpYoutubeDLPool is the client the bot uses in place of yt-dlp.
+"""
+import asyncio
+import itertools
+import json
+import random
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+from aiohttp import web
+
+from benchmarks import fixtures
+
+
+class ServiceProfile:
+    def __init__(self, latency=0.05, failure_rate=0.0, jitter=0.5):
+        """latency: mean seconds per request; jitter: +/- fraction of it; failure_rate: 0..1"""
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.jitter = jitter
+        self.requests = 0
+        self.failures = 0
+
+    async def delay(self):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def fails(self):
+        if self.failure_rate and random.random() < self.failure_rate:
+            self.failures += 1
+            return True
+        return False
+
+    def stats(self):
+        return {'requests': self.requests, 'failures': self.failures}
+
+
+class FakeTelegram:
+    """The Bot API methods the bot uses, at /bot<token>/<method>"""
+
+    BOT_USER = {
+        'id': 1, 'is_bot': True, 'first_name': 'LoadTest', 'username': 'loadtest_bot',
+        'can_join_groups': True, 'can_read_all_group_messages': False, 'supports_inline_queries': False,
+    }
+
+    def __init__(self, profile, listener=None):
+        """listener(chat_id, method, params): called for every message-producing call"""
+        self.profile = profile
+        self.listener = listener
+        self._message_ids = itertools.count(1000)
+        self._file_ids = itertools.count(1)
+        self.uploads = 0
+        self.uploaded_bytes = 0
+        self.file_id_sends = 0
+        self.media_groups = 0
+        self.app = web.Application(client_max_size=64 * 1024 * 1024)
+        self.app.router.add_route('*', '/bot{token}/{method}', self._handle)
+
+    async def _handle(self, request):
+        method = request.match_info['method']
+        form = await request.post()
+        params = {}
+        for name, value in form.items():
+            if isinstance(value, web.FileField):
+                data = value.file.read()
+                params[name] = {'filename': value.filename, 'size': len(data)}
+                if name in ('audio', 'document'):
+                    self.uploads += 1
+                    self.uploaded_bytes += len(data)
+            else:
+                params[name] = value
+        await self.profile.delay()
+        if method not in ('getMe', 'deleteWebhook') and self.profile.fails():
+            return web.json_response({
+                'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 1',
+                'parameters': {'retry_after': 1},
+            }, status=429)
+        result = self._result(method, params)
+        chat_id = params.get('chat_id')
+        if self.listener and chat_id is not None:
+            self.listener(int(chat_id), method, params)
+        return web.json_response({'ok': True, 'result': result})
+
+    def _message(self, params, **fields):
+        message = {
+            'message_id': int(params.get('message_id') or next(self._message_ids)),
+            'date': int(time.time()),
+            'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+            'from': self.BOT_USER,
+        }
+        message.update(fields)
+        return message
+
+    def _result(self, method, params):
+        if method == 'getMe':
+            return self.BOT_USER
+        if method in ('sendMessage', 'editMessageText'):
+            return self._message(params, text=params.get('text', ''))
+        if method in ('sendAudio', 'sendDocument'):
+            kind = 'audio' if method == 'sendAudio' else 'document'
+            media = params.get(kind)
+            if isinstance(media, dict):
+                number = next(self._file_ids)
+                file_id, unique_id = f"{kind}-{number}", f"u{number}"
+            else:
+                # Re-sent by file_id
+                self.file_id_sends += 1
+                file_id, unique_id = media, f"u-{media}"
+            attachment = {'file_id': file_id, 'file_unique_id': unique_id}
+            if kind == 'audio':
+                attachment.update(duration=180, title=params.get('title'), performer=params.get('performer'))
+            return self._message(params, caption=params.get('caption'), **{kind: attachment})
+        if method == 'sendMediaGroup':
+            messages = []
+            for item in json.loads(params['media']):
+                kind, media = item['type'], item['media']
+                if media.startswith('attach://'):
+                    number = next(self._file_ids)
+                    file_id, unique_id = f"{kind}-{number}", f"u{number}"
+                    self.uploads += 1
+                    self.uploaded_bytes += params[media[len('attach://'):]]['size']
+                else:
+                    self.file_id_sends += 1
+                    file_id, unique_id = media, f"u-{media}"
+                attachment = {'file_id': file_id, 'file_unique_id': unique_id}
+                if kind == 'audio':
+                    attachment.update(duration=180, title=item.get('title'), performer=item.get('performer'))
+                messages.append(self._message(params, caption=item.get('caption'), **{kind: attachment}))
+            self.media_groups += 1
+            return messages
+        return True
+
+    def stats(self):
+        return dict(self.profile.stats(), uploads=self.uploads, uploaded_bytes=self.uploaded_bytes,
+                    file_id_sends=self.file_id_sends, media_groups=self.media_groups)
+
+
+class FakeSpotify:
+    """A generated catalogue behind the Spotify Web API endpoints spotipy calls"""
+
+    def __init__(self, profile, albums=40, tracks_per_album=12, playlist_sizes=(30, 100, 250), seed=0):
+        self.profile = profile
+        self.base_url = None  # set once the server is bound; used for paging and image links
+        rng = random.Random(f"spotify:{seed}")
+        self.albums, self.tracks, self.album_tracks = {}, {}, {}
+        self.artists = {}
+        for _ in range(albums):
+            album = fixtures.spotify_album_object(rng)
+            artist = album['artists'][0]
+            self.albums[album['id']] = album
+            self.artists.setdefault(artist['id'], {'id': artist['id'], 'name': artist['name'], 'albums': []})
+            self.artists[artist['id']]['albums'].append(album['id'])
+            self.album_tracks[album['id']] = []
+            for index in range(tracks_per_album):
+                track = fixtures.spotify_track(rng, index, album)
+                track['artists'] = [dict(artist)]
+                self.tracks[track['id']] = track
+                self.album_tracks[album['id']].append(track['id'])
+        track_ids = list(self.tracks)
+        self.playlists = {
+            f"playlist{size}": {'name': f"Load test {size}", 'tracks': [rng.choice(track_ids) for _ in range(size)]}
+            for size in playlist_sizes
+        }
+        self.cover = fixtures.synthetic_cover(60 * 1024, seed)
+        self.app = web.Application()
+        routes = (
+            ('/v1/tracks/{id}', self._track),
+            ('/v1/tracks', self._tracks),
+            ('/v1/albums/{id}/tracks', self._album_tracks_page),
+            ('/v1/albums/{id}', self._album),
+            ('/v1/albums', self._albums),
+            ('/v1/playlists/{id}/tracks', self._playlist_page),
+            ('/v1/playlists/{id}', self._playlist),
+            ('/v1/artists/{id}/albums', self._artist_albums),
+            ('/v1/artists/{id}', self._artist),
+            ('/images/{name}', self._image),
+        )
+        for path, handler in routes:
+            self.app.router.add_get(path, self._wrap(handler))
+
+    def _wrap(self, handler):
+        async def wrapped(request):
+            await self.profile.delay()
+            if self.profile.fails():
+                return web.json_response({'error': {'status': 503, 'message': 'Service unavailable'}}, status=503)
+            try:
+                return await handler(request)
+            except KeyError:
+                return web.json_response({'error': {'status': 404, 'message': 'Not found'}}, status=404)
+        return wrapped
+
+    def _with_images(self, album):
+        album = {key: value for key, value in album.items() if key != 'tracks'}
+        album['images'] = [
+            dict(image, url=f"{self.base_url}/images/{album['id']}-{image['height']}.jpg")
+            for image in album['images']
+        ]
+        return album
+
+    def _full_track(self, track_id):
+        track = dict(self.tracks[track_id])
+        track['album'] = self._with_images(track['album'])
+        return track
+
+    def _page(self, items, request, href, default_limit):
+        offset = int(request.query.get('offset', 0))
+        limit = int(request.query.get('limit', default_limit))
+        following = offset + limit
+        return {
+            'href': f"{href}?offset={offset}&limit={limit}",
+            'items': items[offset:following],
+            'limit': limit,
+            'offset': offset,
+            'total': len(items),
+            'next': f"{href}?offset={following}&limit={limit}" if following < len(items) else None,
+        }
+
+    async def _track(self, request):
+        return web.json_response(self._full_track(request.match_info['id']))
+
+    async def _tracks(self, request):
+        ids = request.query.get('ids', '').split(',')
+        return web.json_response({'tracks': [self._full_track(i) if i in self.tracks else None for i in ids]})
+
+    def _album_object(self, album_id, request):
+        album = self._with_images(self.albums[album_id])
+        tracks = []
+        for track_id in self.album_tracks[album_id]:
+            track = dict(self.tracks[track_id])
+            del track['album']
+            tracks.append(track)
+        album['tracks'] = self._page(tracks, request, f"{self.base_url}/v1/albums/{album_id}/tracks", 50)
+        return album
+
+    async def _album(self, request):
+        return web.json_response(self._album_object(request.match_info['id'], request))
+
+    async def _albums(self, request):
+        ids = request.query.get('ids', '').split(',')
+        return web.json_response({'albums': [self._album_object(i, request) for i in ids if i in self.albums]})
+
+    async def _album_tracks_page(self, request):
+        return web.json_response(self._album_object(request.match_info['id'], request)['tracks'])
+
+    def _playlist_items(self, playlist_id):
+        return [
+            {'added_at': '2024-01-01T00:00:00Z', 'track': self._full_track(track_id)}
+            for track_id in self.playlists[playlist_id]['tracks']
+        ]
+
+    async def _playlist(self, request):
+        playlist_id = request.match_info['id']
+        return web.json_response({
+            'id': playlist_id,
+            'name': self.playlists[playlist_id]['name'],
+            'tracks': self._page(
+                self._playlist_items(playlist_id), request, f"{self.base_url}/v1/playlists/{playlist_id}/tracks", 100
+            ),
+        })
+
+    async def _playlist_page(self, request):
+        playlist_id = request.match_info['id']
+        return web.json_response(self._page(
+            self._playlist_items(playlist_id), request, f"{self.base_url}/v1/playlists/{playlist_id}/tracks", 100
+        ))
+
+    async def _artist(self, request):
+        artist = self.artists[request.match_info['id']]
+        return web.json_response({'id': artist['id'], 'name': artist['name'], 'type': 'artist'})
+
+    async def _artist_albums(self, request):
+        artist_id = request.match_info['id']
+        albums = [self._with_images(self.albums[i]) for i in self.artists[artist_id]['albums']]
+        return web.json_response(self._page(albums, request, f"{self.base_url}/v1/artists/{artist_id}/albums", 50))
+
+    async def _image(self, request):
+        return web.Response(body=self.cover, content_type='image/jpeg')
+
+    def stats(self):
+        return self.profile.stats()
+
+
+class FakeYouTube:
+    """Search results, video info and canned audio for HttpYoutubeDLPool"""
+
+    def __init__(self, profile, media_bytes=3 * 1024 * 1024, seed=0):
+        self.profile = profile
+        self.seed = seed
+        self.downloads = 0
+        self.media = fixtures.mp3_bytes(media_bytes)
+        self.app = web.Application()
+        self.app.router.add_get('/search', self._wrap(self._search))
+        self.app.router.add_get('/info/{id}', self._wrap(self._info))
+        self.app.router.add_get('/media/{id}', self._wrap(self._media))
+
+    def _wrap(self, handler):
+        async def wrapped(request):
+            await self.profile.delay()
+            if self.profile.fails():
+                return web.Response(status=503, text='Service unavailable')
+            return await handler(request)
+        return wrapped
+
+    async def _search(self, request):
+        query = request.query['q']
+        artist, _, title = query.partition(' - ')
+        payload = fixtures.youtube_search(artist, title or query, int(request.query.get('n', 8)), seed=self.seed)
+        return web.json_response(payload)
+
+    async def _info(self, request):
+        video_id = request.match_info['id']
+        rng = random.Random(video_id)
+        return web.json_response({
+            'id': video_id,
+            'title': f"{rng.choice(fixtures.WORDS).title()} {rng.choice(fixtures.WORDS).title()} (Official Audio)",
+            'uploader': f"{rng.choice(fixtures.WORDS).title()} - Topic",
+            'duration': rng.randint(120, 360),
+            'acodec': 'mp3',
+            'ext': 'mp3',
+        })
+
+    async def _media(self, request):
+        self.downloads += 1
+        return web.Response(body=self.media, content_type='audio/mpeg')
+
+    def stats(self):
+        return dict(self.profile.stats(), downloads=self.downloads)
+
+
+class HttpYoutubeDLPool:
+    """Takes the place of bot.ytdl_pool: the same calls, answered by FakeYouTube over HTTP"""
+
+    def __init__(self, base_url, timeout=60):
+        import requests
+        self.base_url = base_url
+        self.timeout = timeout
+        self._local = threading.local()
+        self._requests = requests
+
+    def _session(self):
+        # One session per pool thread, like the real pool's per-thread YoutubeDL instances
+        if not hasattr(self._local, 'session'):
+            self._local.session = self._requests.Session()
+        return self._local.session
+
+    def _get(self, path, **params):
+        response = self._session().get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response
+
+    def extract_info(self, purpose, url, download=False):
+        if url.startswith('ytsearch'):
+            prefix, query = url.split(':', 1)
+            return self._get('/search', q=query, n=int(prefix[len('ytsearch'):] or 1)).json()
+        return self._get(f"/info/{_video_id(url)}").json()
+
+    def download(self, purpose, url, outtmpl):
+        video_id = _video_id(url)
+        info = self._get(f"/info/{video_id}").json()
+        path = outtmpl.replace('%(ext)s', info['ext'])
+        with self._get(f"/media/{video_id}") as response, open(path, 'wb') as f:
+            f.write(response.content)
+        return dict(info, requested_downloads=[{'filepath': path}])
+
+    def warm_up(self, purposes=None):
+        pass
+
+    def stats(self):
+        return {'backend': 'loadtest', 'base_url': self.base_url}
+
+
+def _video_id(url):
+    parsed = urlparse(url)
+    return parse_qs(parsed.query).get('v', [parsed.path.rsplit('/', 1)[-1]])[0]
+
+
+class FakeServices:
+    """Runs FakeTelegram, FakeSpotify and FakeYouTube on localhost in a background thread"""
+
+    def __init__(self, telegram, spotify, youtube, host='127.0.0.1'):
+        self.telegram = telegram
+        self.spotify = spotify
+        self.youtube = youtube
+        self.host = host
+        self.urls = {}
+        self.loop = None
+        self._thread = None
+        self._runners = []
+        self._ready = threading.Event()
+        self._cpu_seconds = 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='fake-services', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        self.spotify.base_url = self.urls['spotify']
+        return self.urls
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._serve())
+        self._ready.set()
+        self.loop.run_forever()
+        self._cpu_seconds = time.thread_time()
+        self.loop.run_until_complete(self._cleanup())
+        self.loop.close()
+
+    async def _serve(self):
+        for name, service in (('telegram', self.telegram), ('spotify', self.spotify), ('youtube', self.youtube)):
+            runner = web.AppRunner(service.app, access_log=None)
+            await runner.setup()
+            site = web.TCPSite(runner, self.host, 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            self.urls[name] = f"http://{self.host}:{port}"
+            self._runners.append(runner)
+
+    async def _cleanup(self):
+        for runner in self._runners:
+            await runner.cleanup()
+
+    def stop(self):
+        """Stop serving; returns the CPU seconds the fake services used"""
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+        return self._cpu_seconds
+
+    def stats(self):
+        return {
+            'telegram': self.telegram.stats(),
+            'spotify': self.spotify.stats(),
+            'youtube': self.youtube.stats(),
+        }
@@ -0,0 +1,177 @@
+"""Simulated users and the driver that feeds their messages to the bot.
+
+A user runs a script of steps: send a text, then wait until the bot's reply
+in that chat shows the step finished (an audio upload, a result listing, a
+batch summary) or failed. Replies are observed at FakeTelegram, so latency
+is measured the way a user sees it.
+"""
+import asyncio
+import random
+import time
+
+from telegram import Update
+
+# What ends a step
+AUDIO = 'audio'
+LISTING = 'listing'
+BATCH = 'batch'
+
+
+def outcome(expect, method, params):
+    """'ok', 'failed' or None (not the end of the step) for one Bot API call in the user's chat"""
+    if expect == AUDIO and method in ('sendAudio', 'sendDocument'):
+        return 'ok'
+    text = params.get('text') or ''
+    if expect == LISTING and 'Select a song by number' in text:
+        return 'ok'
+    if expect == BATCH:
+        if 'files sent' in text:
+            return 'ok'
+        if 'No files were sent' in text:
+            return 'failed'
+        return None
+    if '❌' in text:
+        return 'failed'
+    return None
+
+
+class Catalog:
+    """The links and queries users pick from, taken from FakeSpotify's catalogue"""
+
+    def __init__(self, spotify, youtube_videos=200, seed=0):
+        rng = random.Random(f"catalog:{seed}")
+        self.track_ids = list(spotify.tracks)
+        self.album_ids = list(spotify.albums)
+        self.playlist_ids = list(spotify.playlists)
+        self.queries = [
+            f"{track['artists'][0]['name']} {track['name']}" for track in spotify.tracks.values()
+        ]
+        alphabet = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+        self.video_ids = [''.join(rng.choice(alphabet) for _ in range(11)) for _ in range(youtube_videos)]
+
+
+def track_script(rng, catalog):
+    return [('spotify_track', f"https://open.spotify.com/track/{rng.choice(catalog.track_ids)}", AUDIO)]
+
+
+def youtube_script(rng, catalog):
+    return [('youtube_link', f"https://www.youtube.com/watch?v={rng.choice(catalog.video_ids)}", AUDIO)]
+
+
+def search_script(rng, catalog):
+    return [
+        ('search', rng.choice(catalog.queries), LISTING),
+        ('select_one', str(rng.randint(1, 10)), AUDIO),
+    ]
+
+
+def album_script(rng, catalog):
+    return [
+        ('album_listing', f"https://open.spotify.com/album/{rng.choice(catalog.album_ids)}", LISTING),
+        ('select_all', 'all', BATCH),
+    ]
+
+
+def playlist_script(rng, catalog):
+    playlist_id = rng.choice(catalog.playlist_ids)
+    selection = ('select_all', 'all') if rng.random() < 0.5 else ('select_some', '1,2,3,4,5')
+    return [
+        ('playlist_listing', f"https://open.spotify.com/playlist/{playlist_id}", LISTING),
+        (selection[0], selection[1], BATCH),
+    ]
+
+
+# Scenario name -> [(script, weight)]
+SCENARIOS = {
+    'tracks': [(track_script, 3), (youtube_script, 1)],
+    'search': [(search_script, 1)],
+    'albums': [(album_script, 1)],
+    'playlists': [(playlist_script, 1)],
+    'mixed': [
+        (track_script, 40), (youtube_script, 15), (search_script, 25), (album_script, 10), (playlist_script, 10),
+    ],
+}
+
+
+class Driver:
+    """Turns user texts into Updates and routes the bot's replies back to each user"""
+
+    def __init__(self, application, step_timeout=120.0, reset_user=None):
+        """reset_user(user_id): forget a user's pending selection after a failed step (may be async)"""
+        self.application = application
+        self.step_timeout = step_timeout
+        self.reset_user = reset_user
+        self.loop = asyncio.get_running_loop()
+        self.results = []
+        self._inboxes = {}
+        self._update_ids = iter(range(1, 10**9))
+        self._message_ids = iter(range(1, 10**9))
+
+    def listener(self, chat_id, method, params):
+        """FakeTelegram callback; runs on the fake services' thread"""
+        self.loop.call_soon_threadsafe(self._deliver, chat_id, method, params)
+
+    def _deliver(self, chat_id, method, params):
+        self._inbox(chat_id).put_nowait((method, params))
+
+    def _inbox(self, chat_id):
+        inbox = self._inboxes.get(chat_id)
+        if inbox is None:
+            inbox = self._inboxes[chat_id] = asyncio.Queue()
+        return inbox
+
+    def _update(self, user_id, text):
+        user = {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}"}
+        return Update.de_json({
+            'update_id': next(self._update_ids),
+            'message': {
+                'message_id': next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private', 'first_name': user['first_name']},
+                'from': user,
+                'text': text,
+            },
+        }, self.application.bot)
+
+    async def step(self, user_id, name, text, expect):
+        """Send text as user_id and wait for the step's outcome; returns True when it succeeded"""
+        inbox = self._inbox(user_id)
+        while not inbox.empty():
+            inbox.get_nowait()
+        started = time.perf_counter()
+        await self.application.update_queue.put(self._update(user_id, text))
+        deadline = started + self.step_timeout
+        result = 'timeout'
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                method, params = await asyncio.wait_for(inbox.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            verdict = outcome(expect, method, params)
+            if verdict:
+                result = verdict
+                break
+        self.results.append({'step': name, 'result': result, 'latency': time.perf_counter() - started})
+        return result == 'ok'
+
+    async def user(self, user_id, scripts, catalog, deadline, max_runs=None, think_time=1.0, seed=0):
+        """One simulated user running weighted scripts until deadline (or max_runs scripts)"""
+        rng = random.Random(f"user:{seed}:{user_id}")
+        funcs, weights = zip(*scripts)
+        runs = 0
+        while time.perf_counter() < deadline and (max_runs is None or runs < max_runs):
+            script = rng.choices(funcs, weights)[0]
+            for name, text, expect in script(rng, catalog):
+                if not await self.step(user_id, name, text, expect):
+                    # A late listing would turn the next script's link into a selection
+                    if self.reset_user:
+                        result = self.reset_user(user_id)
+                        if asyncio.iscoroutine(result):
+                            await result
+                    break
+            runs += 1
+            if think_time:
+                await asyncio.sleep(think_time * rng.uniform(0.5, 1.5))
@@ -0,0 +1,107 @@
+"""Event-loop lag monitor.
+
+A heartbeat coroutine measures how late the loop wakes it up; a watchdog
+thread notices when the heartbeat stops and captures the loop thread's
+stack, so a blocking call shows up in the logs together with the handler
+that made it.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class LoopMonitor:
+    def __init__(self, interval=0.1, threshold=0.5, min_lag=0.05):
+        """
+        interval: heartbeat period in seconds.
+        threshold: a stall longer than this is logged with the loop's stack.
+        min_lag: lags below this are scheduling noise and not counted as blocked time.
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.min_lag = min_lag
+        self.stalls = 0
+        self.blocked_seconds = 0.0
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+        self.last_offender = None
+        self._beat = time.monotonic()
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._running = False
+        self._reported_beat = None
+
+    def start(self):
+        """Start monitoring the running loop; call from inside a coroutine"""
+        if self._running:
+            return
+        self._running = True
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._task:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while self._running:
+            self._beat = time.monotonic()
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - expected
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.min_lag:
+                self.blocked_seconds += lag
+            if lag >= self.threshold:
+                self.stalls += 1
+                logger.warning(f"Event loop blocked for {lag:.3f}s (offender: {self.last_offender or 'unknown'})")
+
+    def _watch(self):
+        while self._running:
+            time.sleep(self.interval)
+            beat = self._beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.threshold or self._reported_beat == beat:
+                continue
+            # Report each stall once, while it is still happening
+            self._reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self.last_offender = self.describe_stack(frame)
+            logger.warning(f"Event loop stalled for {stalled:.3f}s so far in {self.last_offender}")
+
+    @staticmethod
+    def describe_stack(frame):
+        """Summarise a stack as our own frames (handler first) plus the innermost call"""
+        stack = traceback.extract_stack(frame)
+        ours = [f"{os.path.basename(f.filename)}:{f.name}:{f.lineno}" for f in stack if f.filename.startswith(PROJECT_DIR) and 'site-packages' not in f.filename]
+        innermost = stack[-1]
+        blocker = f"{os.path.basename(innermost.filename)}:{innermost.name}:{innermost.lineno}"
+        if ours and ours[-1] != blocker:
+            ours.append(blocker)
+        return ' -> '.join(ours or [blocker])
+
+    def stats(self):
+        return {
+            'stalls': self.stalls,
+            'blocked_seconds_total': round(self.blocked_seconds, 3),
+            'max_lag_seconds': round(self.max_lag, 3),
+            'last_lag_seconds': round(self.last_lag, 3),
+            'last_offender': self.last_offender,
+        }
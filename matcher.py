@@ -0,0 +1,99 @@
+"""Scoring of YouTube search results against a Spotify track.
+
+A candidate's score (0..1) combines duration distance, artist/title token
+overlap and channel signals, minus penalties for alternate versions (live,
+cover, remix, ...) that the requested title does not ask for.
+"""
+import re
+import unicodedata
+
+# Versions we do not want unless the Spotify title itself mentions them
+PENALTY_TERMS = (
+    'live', 'cover', 'remix', 'karaoke', 'instrumental', 'acoustic', 'sped up', 'slowed',
+    'reverb', 'nightcore', '8d', 'extended', 'loop', '1 hour', '10 hours', 'hour version',
+    'reaction', 'tutorial', 'lesson', 'mashup', 'bass boosted',
+)
+
+# Words that carry no identity when comparing titles
+STOPWORDS = {
+    'the', 'a', 'an', 'and', 'of', 'feat', 'ft', 'featuring', 'official', 'video', 'audio',
+    'music', 'lyrics', 'lyric', 'hd', 'hq', 'mv', 'visualizer', 'version', 'remastered', 'remaster',
+}
+
+WEIGHTS = {'title': 0.35, 'artist': 0.25, 'duration': 0.3, 'channel': 0.1}
+PENALTY = 0.3
+
+
+def normalize(text):
+    """Lowercase, strip accents and punctuation"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    return re.sub(r'[^\w\s]', ' ', text)
+
+
+def tokens(text):
+    return {t for t in normalize(text).split() if t not in STOPWORDS}
+
+
+def overlap(wanted, found):
+    """Fraction of wanted tokens present in found"""
+    if not wanted:
+        return 0.0
+    return len(wanted & found) / len(wanted)
+
+
+def duration_score(candidate_s, target_s):
+    """1.0 within 3s, falling linearly to 0 at 30s away; 0.5 when unknown"""
+    if not candidate_s or not target_s:
+        return 0.5
+    diff = abs(candidate_s - target_s)
+    if diff <= 3:
+        return 1.0
+    return max(0.0, 1.0 - (diff - 3) / 27)
+
+
+def channel_score(entry, artist_tokens):
+    channel = entry.get('channel') or entry.get('uploader') or ''
+    if channel.endswith(' - Topic'):
+        return 1.0
+    channel_tokens = tokens(channel.replace('VEVO', ''))
+    if artist_tokens and artist_tokens <= channel_tokens:
+        return 1.0 if entry.get('channel_is_verified') or 'VEVO' in channel else 0.8
+    return 0.0
+
+
+def score(entry, artist, title, duration_s=None):
+    """Score one flat ytsearch entry; higher is better"""
+    candidate_title = entry.get('title') or ''
+    channel = entry.get('channel') or entry.get('uploader') or ''
+    found = tokens(candidate_title) | tokens(channel)
+    artist_tokens = tokens(artist)
+    total = (
+        WEIGHTS['title'] * overlap(tokens(title), tokens(candidate_title))
+        + WEIGHTS['artist'] * overlap(artist_tokens, found)
+        + WEIGHTS['duration'] * duration_score(entry.get('duration'), duration_s)
+        + WEIGHTS['channel'] * channel_score(entry, artist_tokens)
+    )
+    candidate_norm = f" {normalize(candidate_title)} "
+    wanted_norm = f" {normalize(title)} "
+    for term in PENALTY_TERMS:
+        if f" {term} " in candidate_norm and f" {term} " not in wanted_norm:
+            total -= PENALTY
+    # Hour-long loops and compilations are never the track
+    if duration_s and entry.get('duration') and entry['duration'] > 2 * duration_s + 60:
+        total -= PENALTY
+    return total
+
+
+def best_match(entries, artist, title, duration_s=None):
+    """Return (entry, score) of the best candidate, or (None, 0.0)"""
+    best, best_score = None, float('-inf')
+    for entry in entries:
+        if not entry or not entry.get('url') or not entry.get('title'):
+            continue
+        entry_score = score(entry, artist, title, duration_s)
+        if entry_score > best_score:
+            best, best_score = entry, entry_score
+    if best is None:
+        return None, 0.0
+    return best, best_score
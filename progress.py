@@ -0,0 +1,154 @@
+"""Coalesced status-message updates.
+
+Handlers and batch loops report progress by editing a status message.
+Doing that once per step or per track makes Telegram answer with RetryAfter
+on large jobs. ProgressReporter keeps only the newest text for each message
+and edits it in the background, at most once per interval. Callers never
+wait on an edit: a flood wait delays the status message, not the downloads.
+With a send queue, edits also take their turn in the chat's send budget.
+"""
+import asyncio
+import logging
+import time
+
+from telegram.error import BadRequest, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+def progress_bar(done, total, width=12):
+    """'▰▰▰▱▱▱ 12/40' style bar for batch progress"""
+    filled = round(width * done / total) if total else width
+    return f"{'▰' * filled}{'▱' * (width - filled)} {done}/{total}"
+
+
+class _Status:
+    """Wanted and last sent state of one status message"""
+    __slots__ = ('chat_id', 'edit', 'text', 'kwargs', 'final', 'sent_text', 'sent_at', 'task', 'wake')
+
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+        self.edit = None
+        self.text = None
+        self.kwargs = {}
+        self.final = False
+        self.sent_text = None
+        self.sent_at = 0.0
+        self.task = None
+        self.wake = asyncio.Event()
+
+
+class ProgressReporter:
+    def __init__(self, interval=2.0, send_queue=None):
+        """interval: minimum seconds between two edits of the same message;
+        send_queue: a send_queue.SendQueue to pace edits with the chat's other sends
+        """
+        self.interval = interval
+        self.send_queue = send_queue
+        self._statuses = {}
+        # chat_id -> monotonic time until which Telegram asked us to back off
+        self._blocked_until = {}
+        self.requested = 0
+        self.edits = 0
+        self.flood_waits = 0
+        self.errors = 0
+
+    def set(self, message, text, final=False, **kwargs):
+        """Show text on message (a telegram Message) soon; returns immediately.
+
+        Interim texts replace each other until the next edit is due. A final
+        text (the outcome of the request) is sent without waiting out the
+        interval, and later interim texts for the message are ignored until
+        another final text replaces it.
+        """
+        self._update((message.chat_id, message.message_id), message.edit_text, text, final, kwargs)
+
+    def set_by_id(self, bot, chat_id, message_id, text, final=False, **kwargs):
+        """set() for a message known only by its chat and id"""
+        def edit(text, **kwargs):
+            return bot.edit_message_text(text, chat_id, message_id, **kwargs)
+        self._update((chat_id, message_id), edit, text, final, kwargs)
+
+    async def flush(self):
+        """Wait until every pending edit has been sent (or given up)"""
+        tasks = [status.task for status in self._statuses.values() if status.task]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self):
+        return {
+            'requested': self.requested,
+            'edits': self.edits,
+            'coalesced': self.requested - self.edits - self.errors,
+            'flood_waits': self.flood_waits,
+            'errors': self.errors,
+            'pending': sum(1 for status in self._statuses.values() if status.task),
+        }
+
+    def _update(self, key, edit, text, final, kwargs):
+        status = self._statuses.get(key)
+        if status is None:
+            status = self._statuses[key] = _Status(key[0])
+        elif status.final and not final:
+            # The outcome is already shown (or on its way); a late interim text must not replace it
+            return
+        self.requested += 1
+        status.edit, status.text, status.kwargs, status.final = edit, text, kwargs, final
+        if status.task is None and text != status.sent_text:
+            status.task = asyncio.create_task(self._run(key, status))
+        elif final:
+            status.wake.set()
+
+    async def _run(self, key, status):
+        try:
+            while status.text != status.sent_text:
+                due = max(
+                    status.sent_at + (0 if status.final else self.interval),
+                    self._blocked_until.get(status.chat_id, 0.0)
+                )
+                delay = due - time.monotonic()
+                if delay > 0:
+                    # A final text cuts the interval short (but not a flood wait)
+                    status.wake.clear()
+                    try:
+                        await asyncio.wait_for(status.wake.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                text, kwargs = status.text, status.kwargs
+                try:
+                    if self.send_queue is not None:
+                        await self.send_queue.send(status.chat_id, status.edit, text, **kwargs)
+                    else:
+                        await status.edit(text, **kwargs)
+                    self.edits += 1
+                except RetryAfter as e:
+                    self.flood_waits += 1
+                    logger.warning(f"Status edits in chat {status.chat_id} throttled for {e.retry_after}s")
+                    self._blocked_until[status.chat_id] = time.monotonic() + e.retry_after
+                    continue
+                except BadRequest as e:
+                    if 'not modified' not in str(e).lower():
+                        self.errors += 1
+                        logger.warning(f"Could not update status message: {e}")
+                except Exception as e:
+                    self.errors += 1
+                    logger.warning(f"Could not update status message: {e}")
+                status.sent_text = text
+                status.sent_at = time.monotonic()
+        finally:
+            status.task = None
+            # Past the interval the entry no longer throttles anything
+            asyncio.get_running_loop().call_later(self.interval, self._forget, key, status)
+
+    def _forget(self, key, status):
+        if status.task is not None or self._statuses.get(key) is not status:
+            return
+        idle = time.monotonic() - status.sent_at
+        if idle < self.interval:
+            asyncio.get_running_loop().call_later(self.interval - idle, self._forget, key, status)
+            return
+        del self._statuses[key]
+        blocked = self._blocked_until.get(status.chat_id)
+        if blocked is not None and blocked < time.monotonic():
+            del self._blocked_until[status.chat_id]
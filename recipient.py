@@ -0,0 +1,51 @@
+"""Delivery target for finished tracks.
+
+A Recipient is a chat (plus the user who asked) rather than an incoming
+Update, so work that outlives the original message -- batch jobs resumed
+after a restart, or work done by another process -- can still send its
+results.
+"""
+from telegram.constants import ChatType
+
+
+class Recipient:
+    # A send_queue.SendQueue shared by every Recipient (set by bot.py); None sends directly
+    send_queue = None
+
+    def __init__(self, bot, chat_id, user_id=None, reply_to_message_id=None):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.reply_to_message_id = reply_to_message_id
+
+    @classmethod
+    def from_update(cls, update):
+        """Reply to update's chat the way Message.reply_* does (quoting only outside private chats)"""
+        message = update.effective_message
+        chat = update.effective_chat
+        user = update.effective_user
+        reply_to = message.message_id if message and chat.type != ChatType.PRIVATE else None
+        return cls(update.get_bot(), chat.id, user.id if user else None, reply_to)
+
+    def _defaults(self, kwargs):
+        kwargs.setdefault('reply_to_message_id', self.reply_to_message_id)
+        kwargs.setdefault('allow_sending_without_reply', True)
+        return kwargs
+
+    async def _send(self, method, *args, cost=1, **kwargs):
+        if self.send_queue is None:
+            return await method(self.chat_id, *args, **kwargs)
+        return await self.send_queue.send(self.chat_id, method, self.chat_id, *args, cost=cost, **kwargs)
+
+    async def send_audio(self, audio, **kwargs):
+        return await self._send(self.bot.send_audio, audio, **self._defaults(kwargs))
+
+    async def send_document(self, document, **kwargs):
+        return await self._send(self.bot.send_document, document, **self._defaults(kwargs))
+
+    async def send_text(self, text, **kwargs):
+        return await self._send(self.bot.send_message, text, **self._defaults(kwargs))
+
+    async def send_media_group(self, media, **kwargs):
+        """Send up to 10 InputMedia items as one album; returns their Messages"""
+        return await self._send(self.bot.send_media_group, media, cost=len(media), **self._defaults(kwargs))
@@ -0,0 +1,82 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class ResolutionCache:
+    """Persistent Spotify track id -> YouTube video URL map with TTLs.
+
+    Misses ("no YouTube match") are cached too, with a shorter TTL, so a
+    track that cannot be found does not trigger a full search every time.
+    """
+
+    def __init__(self, path, ttl=30 * 24 * 3600, negative_ttl=24 * 3600):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS resolutions ('
+            ' spotify_id TEXT PRIMARY KEY,'
+            ' youtube_url TEXT,'
+            ' expires REAL NOT NULL)'
+        )
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def get(self, spotify_id):
+        """Return (found, youtube_url). youtube_url is None for a cached "no match"."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT youtube_url, expires FROM resolutions WHERE spotify_id = ?', (spotify_id,)
+            ).fetchone()
+            if row is None or row[1] < now:
+                self.misses += 1
+                return False, None
+            if row[0] is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return True, row[0]
+
+    def set(self, spotify_id, youtube_url):
+        """Remember a resolution; pass None to remember that nothing matched"""
+        ttl = self.ttl if youtube_url else self.negative_ttl
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO resolutions (spotify_id, youtube_url, expires) VALUES (?, ?, ?)',
+                (spotify_id, youtube_url, time.time() + ttl)
+            )
+
+    def delete(self, spotify_id):
+        with self._lock:
+            self._conn.execute('DELETE FROM resolutions WHERE spotify_id = ?', (spotify_id,))
+
+    def purge_expired(self):
+        """Drop expired rows; returns how many were removed"""
+        with self._lock:
+            return self._conn.execute('DELETE FROM resolutions WHERE expires < ?', (time.time(),)).rowcount
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute('SELECT COUNT(*) FROM resolutions').fetchone()[0]
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            'entries': size,
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'hit_ratio': (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,151 @@
+"""Fair sharing of download/transcode capacity between users.
+
+Every download path takes a slot from the FairScheduler before using a
+scarce resource ('search', 'download', 'transcode'). Each resource has a
+global cap; waiters are queued per user and served round-robin, with
+interactive (single-track) requests always dispatched ahead of bulk batch
+items, so a 500-track batch cannot delay someone asking for one song.
+"""
+import asyncio
+import collections
+import contextlib
+import time
+
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = ('interactive', 'bulk')
+
+
+class FairScheduler:
+    def __init__(self, limits):
+        """limits: {resource: maximum concurrent holders}"""
+        self._limits = dict(limits)
+        self._active = {resource: 0 for resource in limits}
+        # Per resource and priority: user_id -> deque of waiting futures.
+        # Dict order is the round-robin order; a served user moves to the back.
+        self._queues = {resource: ({}, {}) for resource in limits}
+        self._stats = {
+            (resource, priority): {'dispatched': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+            for resource in limits for priority in (INTERACTIVE, BULK)
+        }
+
+    @contextlib.asynccontextmanager
+    async def slot(self, resource, user_id=None, priority=INTERACTIVE):
+        """Hold one of resource's slots for the duration of the block"""
+        await self._acquire(resource, user_id, priority)
+        try:
+            yield
+        finally:
+            self._release(resource)
+
+    async def run(self, resource, user_id, priority, func, *args):
+        """``await func(*args)`` while holding a slot"""
+        async with self.slot(resource, user_id, priority):
+            return await func(*args)
+
+    async def _acquire(self, resource, user_id, priority):
+        start = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        waiters = self._queues[resource][priority].setdefault(user_id, collections.deque())
+        waiters.append(future)
+        self._dispatch(resource)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as we were cancelled; hand the slot on
+                self._release(resource)
+            else:
+                self._forget(resource, priority, user_id, future)
+            raise
+        waited = time.monotonic() - start
+        stats = self._stats[(resource, priority)]
+        stats['dispatched'] += 1
+        stats['wait_total'] += waited
+        stats['wait_max'] = max(stats['wait_max'], waited)
+
+    def _forget(self, resource, priority, user_id, future):
+        users = self._queues[resource][priority]
+        waiters = users.get(user_id)
+        if waiters and future in waiters:
+            waiters.remove(future)
+            if not waiters:
+                del users[user_id]
+
+    def _release(self, resource):
+        self._active[resource] -= 1
+        self._dispatch(resource)
+
+    def _dispatch(self, resource):
+        while self._active[resource] < self._limits[resource]:
+            future = self._next(resource)
+            if future is None:
+                return
+            self._active[resource] += 1
+            future.set_result(None)
+
+    def _next(self, resource):
+        for users in self._queues[resource]:
+            while users:
+                user_id = next(iter(users))
+                waiters = users.pop(user_id)
+                future = waiters.popleft()
+                if waiters:
+                    users[user_id] = waiters
+                if not future.done():
+                    return future
+        return None
+
+    def _order(self, resource):
+        """Waiting (user_id, priority) pairs in the order they would be served"""
+        order = []
+        for priority, users in enumerate(self._queues[resource]):
+            # stats() is called on the event loop (the HTTP server shares it), so the queues hold still here
+            rounds = list(users.items())
+            depth = max((len(waiters) for _, waiters in rounds), default=0)
+            for i in range(depth):
+                for user_id, waiters in rounds:
+                    if i < len(waiters) and not waiters[i].done():
+                        order.append((user_id, priority))
+        return order
+
+    def position(self, user_id, resource='download'):
+        """1-based position of user_id's next waiting request for resource, or None"""
+        for index, (waiting_user, _) in enumerate(self._order(resource), 1):
+            if waiting_user == user_id:
+                return index
+        return None
+
+    def waiting(self):
+        """Total waiting requests across all resources and users"""
+        return sum(
+            len(waiters) for queues in self._queues.values() for users in queues for waiters in list(users.values())
+        )
+
+    def queued(self, user_id=None):
+        """Waiting requests per resource, for one user or everyone"""
+        return {
+            resource: sum(
+                1 for waiting_user, _ in self._order(resource) if user_id is None or waiting_user == user_id
+            )
+            for resource in self._limits
+        }
+
+    def stats(self):
+        resources = {}
+        for resource, limit in self._limits.items():
+            order = self._order(resource)
+            resources[resource] = {
+                'limit': limit,
+                'active': self._active[resource],
+                'users_waiting': len({user_id for user_id, _ in order}),
+            }
+            for priority, name in enumerate(PRIORITY_NAMES):
+                stats = self._stats[(resource, priority)]
+                resources[resource][name] = {
+                    'waiting': sum(1 for _, p in order if p == priority),
+                    'dispatched': stats['dispatched'],
+                    'wait_seconds_avg': round(stats['wait_total'] / stats['dispatched'], 4) if stats['dispatched'] else 0.0,
+                    'wait_seconds_max': round(stats['wait_max'], 3),
+                }
+        return resources
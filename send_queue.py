@@ -0,0 +1,206 @@
+"""Outbound message queue that stays inside Telegram's flood limits.
+
+Telegram allows roughly one message per second in a private chat, twenty
+per minute in a group and thirty per second across all chats, and answers
+anything faster with RetryAfter. SendQueue spaces sends out to fit those
+budgets, keeps each chat's sends in order while different chats send
+concurrently, and retries a send after the wait Telegram asks for instead
+of dropping it.
+
+MediaGroupBatcher gathers the tracks of a batch job that are ready at the
+same time so they go out as one sendMediaGroup call (up to 10 at once).
+"""
+import asyncio
+import logging
+import time
+
+from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+MEDIA_GROUP_MAX = 10
+
+
+class Budget:
+    """Rate limit with bursts (generic cell rate algorithm)"""
+
+    def __init__(self, rate, burst=1):
+        self.interval = 1.0 / rate
+        self.tolerance = (burst - 1) * self.interval
+        self._next = 0.0
+
+    def reserve(self, cost=1, now=None):
+        """Take cost sends from the budget; returns the seconds to wait before sending"""
+        now = time.monotonic() if now is None else now
+        due = max(self._next, now)
+        start = max(now, due - self.tolerance)
+        self._next = due + cost * self.interval
+        return start - now
+
+    def block(self, seconds, now=None):
+        """Nothing goes out for seconds (Telegram said RetryAfter)"""
+        now = time.monotonic() if now is None else now
+        self._next = max(self._next, now + seconds + self.tolerance)
+
+    def idle(self, now=None):
+        return self._next <= (time.monotonic() if now is None else now)
+
+
+class SendQueue:
+    def __init__(self, global_rate=30, private_rate=1.0, group_rate=20 / 60, burst=3, concurrency=8,
+                 max_retries=5):
+        """
+        global_rate: sends per second across all chats.
+        private_rate / group_rate: sends per second within one private / group chat
+            (group chats have negative ids).
+        burst: sends a chat may make back to back before the rate applies.
+        concurrency: sends (mostly uploads) in flight at once across chats.
+        max_retries: RetryAfter answers tolerated for one send before giving up.
+        """
+        self.global_budget = Budget(global_rate, burst=global_rate)
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self._slots = asyncio.Semaphore(concurrency)
+        self._chats = {}
+        self._prune_at = 1000
+        self.sent = 0
+        self.retries = 0
+        self.failed = 0
+        self.waited_seconds = 0.0
+
+    def _chat(self, chat_id):
+        """(lock, budget) of chat_id; the lock keeps the chat's sends in order"""
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            if len(self._chats) >= self._prune_at:
+                self._prune()
+            rate = self.group_rate if chat_id < 0 else self.private_rate
+            chat = self._chats[chat_id] = (asyncio.Lock(), Budget(rate, burst=self.burst))
+        return chat
+
+    async def send(self, chat_id, method, *args, cost=1, **kwargs):
+        """``await method(*args, **kwargs)`` once chat_id's and the global budget allow it.
+
+        cost is the number of messages the call produces. A media group takes
+        one send from its chat's budget (Telegram paces it as one request
+        there) and one per item from the global budget. On RetryAfter the chat waits as told and the call is made
+        again; file objects among the arguments are rewound first, since
+        python-telegram-bot reads them at call time.
+        """
+        lock, budget = self._chat(chat_id)
+        async with lock:
+            retries = 0
+            while True:
+                # The chat's turn first, then a slot in the global budget at that moment
+                for limit, units in ((budget, 1), (self.global_budget, cost)):
+                    wait = limit.reserve(units)
+                    if wait > 0:
+                        self.waited_seconds += wait
+                        await asyncio.sleep(wait)
+                try:
+                    async with self._slots:
+                        result = await method(*args, **kwargs)
+                except RetryAfter as e:
+                    if retries >= self.max_retries:
+                        self.failed += 1
+                        raise
+                    retries += 1
+                    self.retries += 1
+                    logger.warning(f"Flood control in chat {chat_id}: retrying in {e.retry_after}s")
+                    budget.block(e.retry_after)
+                    _rewind(args, kwargs)
+                    continue
+                except Exception:
+                    self.failed += 1
+                    raise
+                self.sent += cost
+                return result
+
+    def _prune(self):
+        """Forget chats with nothing queued whose budget has fully recovered"""
+        now = time.monotonic()
+        for chat_id, (lock, budget) in list(self._chats.items()):
+            if not lock.locked() and budget.idle(now):
+                del self._chats[chat_id]
+        self._prune_at = max(1000, 2 * len(self._chats))
+
+    def stats(self):
+        return {
+            'sent': self.sent,
+            'retries': self.retries,
+            'failed': self.failed,
+            'waited_seconds': round(self.waited_seconds, 3),
+            'chats': len(self._chats),
+            'busy_chats': sum(1 for lock, _ in self._chats.values() if lock.locked()),
+        }
+
+
+def _rewind(args, kwargs):
+    for value in list(args) + list(kwargs.values()):
+        if hasattr(value, 'seek'):
+            try:
+                value.seek(0)
+            except (OSError, ValueError):
+                pass
+
+
+class MediaGroupBatcher:
+    """Collects items that are ready to send into groups for one sendMediaGroup call.
+
+    send_group(items) sends a list of items and returns one result per item.
+    A group goes out when it is full, when every item still expected is in
+    it, or linger seconds after its first item arrived.
+    """
+
+    def __init__(self, send_group, expected, size=MEDIA_GROUP_MAX, linger=5.0):
+        self.send_group = send_group
+        self.expected = expected
+        self.size = min(size, MEDIA_GROUP_MAX)
+        self.linger = linger
+        self._items = []
+        self._futures = []
+        self._timer = None
+        self.groups = 0
+
+    async def add(self, item):
+        """Queue item for the next group; returns its result once the group is sent"""
+        future = asyncio.get_running_loop().create_future()
+        self._items.append(item)
+        self._futures.append(future)
+        if len(self._items) >= min(self.size, self.expected):
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.linger, self._flush)
+        return await future
+
+    def skip(self):
+        """One expected item will not be added (it failed or was sent another way)"""
+        self.expected -= 1
+        if self._items and len(self._items) >= self.expected:
+            self._flush()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._items:
+            return
+        items, futures = self._items, self._futures
+        self._items, self._futures = [], []
+        self.expected -= len(items)
+        self.groups += 1
+        asyncio.create_task(self._send(items, futures))
+
+    async def _send(self, items, futures):
+        try:
+            results = await self.send_group(items)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result in zip(futures, results):
+            if not future.done():
+                future.set_result(result)
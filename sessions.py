@@ -0,0 +1,201 @@
+"""Search sessions: the result listing a user is paging through and picking from.
+
+A session keeps only what pagination and downloading need from each result
+(id, title, uploader, duration, url) in a tuple-backed record, not the raw
+yt-dlp entry or Spotify track object it came from. Two interchangeable
+stores, both with a sliding TTL:
+
+- MemorySessionStore: in-process, with a global byte cap and LRU eviction
+- RedisSessionStore: shared by every front-end process; the byte cap is the
+  server's maxmemory with an LRU policy (e.g. volatile-lru)
+
+Store methods are coroutines, so a remote store never blocks the event loop.
+"""
+import collections
+import json
+import sys
+import time
+
+
+YOUTUBE_WATCH_URL = 'https://www.youtube.com/watch?v='
+
+
+class Result(collections.namedtuple('Result', 'id title uploader duration url')):
+    """One selectable search result.
+
+    A YouTube result whose url is just the watch URL of its id stores None
+    there and builds the URL when asked.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_entry(cls, entry):
+        """From a yt-dlp flat search entry or a spotify_results-style dict"""
+        video_id = entry.get('id')
+        url = entry.get('url')
+        if video_id and url in (None, YOUTUBE_WATCH_URL + video_id):
+            url = None
+        return cls(
+            video_id,
+            entry.get('title') or 'Unknown',
+            entry.get('uploader') or entry.get('channel') or 'Unknown Artist',
+            int(entry.get('duration') or 0),
+            url,
+        )
+
+    @property
+    def url(self):
+        stored = tuple.__getitem__(self, 4)
+        if stored is None and self.id:
+            return YOUTUBE_WATCH_URL + self.id
+        return stored
+
+    def get(self, field, default=None):
+        """dict-style access, so code written for raw entries keeps working"""
+        value = getattr(self, field, None)
+        return default if value is None else value
+
+    def as_dict(self):
+        return dict(self._asdict(), url=self.url)
+
+
+class SearchSession:
+    __slots__ = ('results', 'page', 'title')
+
+    def __init__(self, results, page=0, title=None):
+        """results: a sequence of Result (stored as a tuple)"""
+        self.results = tuple(results)
+        self.page = page
+        self.title = title
+
+    def size(self):
+        """Approximate bytes held by this session"""
+        total = sys.getsizeof(self) + sys.getsizeof(self.results)
+        for result in self.results:
+            total += sys.getsizeof(result) + sum(sys.getsizeof(value) for value in result)
+        return total
+
+    def dumps(self):
+        return json.dumps({'results': self.results, 'page': self.page, 'title': self.title})
+
+    @classmethod
+    def loads(cls, raw):
+        data = json.loads(raw)
+        return cls([Result(*result) for result in data['results']], data['page'], data['title'])
+
+
+class MemorySessionStore:
+    def __init__(self, ttl=3600, max_bytes=64 * 1024 * 1024):
+        """ttl: seconds a session lives after it was last used; max_bytes: cap on all sessions together"""
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # user_id -> (session, expires, size), least recently used first
+        self._sessions = collections.OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    async def get(self, user_id):
+        """The user's session (refreshing its TTL), or None"""
+        entry = self._sessions.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        session, expires, size = entry
+        if expires < time.monotonic():
+            self._remove(user_id)
+            self.expired += 1
+            self.misses += 1
+            return None
+        self._sessions[user_id] = (session, time.monotonic() + self.ttl, size)
+        self._sessions.move_to_end(user_id)
+        self.hits += 1
+        return session
+
+    async def put(self, user_id, session):
+        """Store (or re-store, after changing its page) the user's session"""
+        self._remove(user_id)
+        size = session.size()
+        self._sessions[user_id] = (session, time.monotonic() + self.ttl, size)
+        self._bytes += size
+        self._purge()
+
+    async def pop(self, user_id):
+        entry = self._remove(user_id)
+        return entry[0] if entry else None
+
+    def _remove(self, user_id):
+        entry = self._sessions.pop(user_id, None)
+        if entry:
+            self._bytes -= entry[2]
+        return entry
+
+    def _purge(self):
+        # Least recently used first, which with one TTL for all is also soonest to expire
+        now = time.monotonic()
+        while self._sessions:
+            user_id, (_, expires, _) = next(iter(self._sessions.items()))
+            if expires < now:
+                self.expired += 1
+            elif self._bytes > self.max_bytes and len(self._sessions) > 1:
+                self.evicted += 1
+            else:
+                break
+            self._remove(user_id)
+
+    def stats(self):
+        return {
+            'backend': 'memory',
+            'sessions': len(self._sessions),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'evicted': self.evicted,
+        }
+
+
+class RedisSessionStore:
+    def __init__(self, url, ttl=3600, prefix='musicbot:session:', client=None):
+        """client: an already-built redis.asyncio-compatible client instead of url"""
+        if client is None:
+            try:
+                import redis.asyncio
+            except ImportError:
+                raise RuntimeError("SESSION_BACKEND=redis needs the 'redis' package (pip install -r requirements-redis.txt)")
+            client = redis.asyncio.Redis.from_url(url)
+        self._redis = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, user_id):
+        raw = await self._redis.getex(f"{self.prefix}{user_id}", ex=self.ttl)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return SearchSession.loads(raw)
+
+    async def put(self, user_id, session):
+        await self._redis.set(f"{self.prefix}{user_id}", session.dumps(), ex=self.ttl)
+
+    async def pop(self, user_id):
+        raw = await self._redis.getdel(f"{self.prefix}{user_id}")
+        return SearchSession.loads(raw) if raw is not None else None
+
+    def stats(self):
+        return {'backend': 'redis', 'hits': self.hits, 'misses': self.misses}
+
+
+def open_session_store(backend, url=None, ttl=3600, max_bytes=64 * 1024 * 1024):
+    """Build the store named by SESSION_BACKEND ('memory' or 'redis')"""
+    if backend == 'memory':
+        return MemorySessionStore(ttl=ttl, max_bytes=max_bytes)
+    if backend == 'redis':
+        return RedisSessionStore(url or 'redis://localhost:6379/0', ttl=ttl)
+    raise ValueError(f"Unknown session backend '{backend}'")
@@ -0,0 +1,150 @@
+"""Coalescing of identical in-flight work.
+
+When many users ask for the same track at once, only the first request
+resolves/downloads it; the rest wait on the same future and share the
+result.
+"""
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Lease:
+    """A shared, reference-counted result from SingleFlight.acquire()"""
+
+    def __init__(self, flight, key, value):
+        self._flight = flight
+        self._key = key
+        self.value = value
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._flight._release(self._key)
+
+
+class SharedError(Exception):
+    """Raised to a waiter of SingleFlight.do(..., wrap_errors=True) when the shared call failed"""
+
+    def __init__(self, error):
+        super().__init__(str(error))
+        self.error = error
+
+
+class SingleFlight:
+    def __init__(self, name='singleflight'):
+        self.name = name
+        self._calls = {}
+        self._shared = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key, func, *args, wrap_errors=False):
+        """Run ``await func(*args)`` once per key at a time.
+
+        Returns (result, shared): shared is True when the result came from
+        another caller's execution. Exceptions propagate to every waiter;
+        with wrap_errors a waiter gets them as SharedError instead, so it can
+        tell another caller's failure from its own. A waiter whose leader was
+        cancelled runs the call itself (or, with wrap_errors, gets SharedError).
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError as e:
+                if not _leader_cancelled(future):
+                    raise
+                if wrap_errors:
+                    raise SharedError(e) from e
+                return await self.do(key, func, *args)
+            except Exception as e:
+                if wrap_errors:
+                    raise SharedError(e) from e
+                raise
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.executed += 1
+        try:
+            result = await func(*args)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Waiters re-raise it; do not warn about an unretrieved exception
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._calls[key]
+
+    async def acquire(self, key, func, *args, release=None):
+        """Like do(), but the result stays shared until every holder releases it.
+
+        Callers arriving while an earlier result is still held reuse it
+        without running func again. When the last Lease is released,
+        ``release(value)`` is called (e.g. to delete a shared temp file).
+        """
+        entry = self._shared.get(key)
+        if entry is not None:
+            entry['refs'] += 1
+            self.coalesced += 1
+            try:
+                value = await asyncio.shield(entry['future'])
+            except BaseException as e:
+                self._release(key)
+                if isinstance(e, asyncio.CancelledError) and _leader_cancelled(entry['future']):
+                    # Whoever started it went away; that does not cancel this caller
+                    return await self.acquire(key, func, *args, release=release)
+                raise
+            return Lease(self, key, value)
+        future = asyncio.get_running_loop().create_future()
+        entry = {'future': future, 'refs': 1, 'release': release}
+        self._shared[key] = entry
+        self.executed += 1
+        try:
+            value = await func(*args)
+        except asyncio.CancelledError:
+            future.cancel()
+            self._release(key)
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            self._release(key)
+            raise
+        future.set_result(value)
+        return Lease(self, key, value)
+
+    def _release(self, key):
+        entry = self._shared.get(key)
+        if entry is None:
+            return
+        entry['refs'] -= 1
+        if entry['refs'] > 0:
+            return
+        del self._shared[key]
+        future = entry['future']
+        if entry['release'] and future.done() and not future.cancelled() and future.exception() is None:
+            try:
+                entry['release'](future.result())
+            except Exception as e:
+                logger.warning(f"{self.name}: release failed for {key}: {e}")
+
+    def stats(self):
+        return {
+            'in_flight': len(self._calls) + len(self._shared),
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+        }
+
+
+def _leader_cancelled(future):
+    """True when a waiter's CancelledError came from the shared call, not from the waiter being cancelled"""
+    return future.cancelled() and not asyncio.current_task().cancelling()
@@ -0,0 +1,144 @@
+"""Batched Spotify metadata fetching.
+
+Spotify's multi-get endpoints take up to 50 tracks or 20 albums per call,
+and playlist/album pages already carry full track objects. These helpers
+use both so a large playlist or discography costs a handful of requests
+instead of one per track.
+"""
+import threading
+from collections import OrderedDict
+
+TRACKS_BATCH_SIZE = 50
+ALBUMS_BATCH_SIZE = 20
+TRACK_INFO_CACHE_SIZE = 5000
+
+_track_info_cache = OrderedDict()
+_track_info_lock = threading.Lock()
+
+
+def chunked(items, size):
+    """Yield successive lists of at most size items"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def track_info_from_track(track, album=None):
+    """Build the bot's track_info dict from a Spotify track object.
+
+    Album listings return simplified tracks without an 'album' key; pass the
+    album object they came from so album name and art are still filled in.
+    """
+    album = track.get('album') or album or {}
+    images = album.get('images') or []
+    return {
+        'id': track['id'],
+        'name': track['name'],
+        'artist': track['artists'][0]['name'] if track.get('artists') else 'Unknown Artist',
+        'album': album.get('name'),
+        'album_art': images[0]['url'] if images else None,
+        'release_date': album.get('release_date'),
+        'track_number': track.get('track_number'),
+        'duration_ms': track.get('duration_ms'),
+        'url': f"https://open.spotify.com/track/{track['id']}"
+    }
+
+
+def remember_track(track, album=None):
+    """Cache track_info for a track object seen in a page payload; returns it"""
+    info = track_info_from_track(track, album)
+    with _track_info_lock:
+        _track_info_cache[info['id']] = info
+        _track_info_cache.move_to_end(info['id'])
+        while len(_track_info_cache) > TRACK_INFO_CACHE_SIZE:
+            _track_info_cache.popitem(last=False)
+    return info
+
+
+def cached_track_info(track_id):
+    with _track_info_lock:
+        info = _track_info_cache.get(track_id)
+        if info is not None:
+            _track_info_cache.move_to_end(track_id)
+        return info
+
+
+def _is_playable(track):
+    return bool(track and track.get('id'))
+
+
+def fetch_tracks(sp, track_ids):
+    """Return {track_id: track_info} using sp.tracks in groups of 50"""
+    infos = {}
+    missing = []
+    for track_id in track_ids:
+        info = cached_track_info(track_id)
+        if info is not None:
+            infos[track_id] = info
+        else:
+            missing.append(track_id)
+    for chunk in chunked(missing, TRACKS_BATCH_SIZE):
+        for track in sp.tracks(chunk).get('tracks') or []:
+            if _is_playable(track):
+                infos[track['id']] = remember_track(track)
+    return infos
+
+
+def _page_items(sp, page):
+    """Collect items from a Spotify paging object, following 'next' links"""
+    items = list(page.get('items') or [])
+    while page.get('next'):
+        page = sp.next(page)
+        if not page:
+            break
+        items.extend(page.get('items') or [])
+    return items
+
+
+def fetch_album_tracks(sp, album):
+    """Return every track_info of an album object, paginating past the first 50 tracks"""
+    return [
+        remember_track(track, album)
+        for track in _page_items(sp, album['tracks'])
+        if _is_playable(track)
+    ]
+
+
+def fetch_albums(sp, album_ids):
+    """Return full album objects using sp.albums in groups of 20, in input order"""
+    albums = []
+    for chunk in chunked(list(album_ids), ALBUMS_BATCH_SIZE):
+        albums.extend(album for album in sp.albums(chunk).get('albums') or [] if album)
+    return albums
+
+
+def fetch_album(sp, album_id):
+    """Return (album name, [track_info]) for an album id"""
+    album = sp.album(album_id)
+    return album.get('name', 'Spotify Album'), fetch_album_tracks(sp, album)
+
+
+def fetch_playlist(sp, playlist_id):
+    """Return (playlist name, [track_info]) reusing the track objects in the playlist pages"""
+    playlist = sp.playlist(playlist_id)
+    items = _page_items(sp, playlist['tracks'])
+    tracks = [remember_track(item['track']) for item in items if _is_playable(item.get('track'))]
+    return playlist.get('name', 'Spotify Playlist'), tracks
+
+
+def fetch_artist_album_ids(sp, artist_id, album_type='album,single'):
+    """Return every album id of an artist, following pagination"""
+    page = sp.artist_albums(artist_id, album_type=album_type, limit=50)
+    return [album['id'] for album in _page_items(sp, page)]
+
+
+def fetch_artist(sp, artist_id):
+    """Return (artist name, [track_info]) for an artist's whole discography, without duplicates"""
+    artist = sp.artist(artist_id)
+    tracks = []
+    seen = set()
+    for album in fetch_albums(sp, fetch_artist_album_ids(sp, artist_id)):
+        for info in fetch_album_tracks(sp, album):
+            if info['id'] not in seen:
+                seen.add(info['id'])
+                tracks.append(info)
+    return artist.get('name', 'Spotify Artist'), tracks
@@ -0,0 +1,35 @@
+"""Startup phase timings.
+
+bot.py marks the end of each startup phase (imports, state, application
+build, startup hook, ...); the breakdown is logged once the bot is ready and
+reported under /stats so slow restarts can be traced to a phase.
+"""
+import time
+
+
+class StartupTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases = {}
+        self.ready_after = None
+
+    def mark(self, phase):
+        """End phase now; its duration is the time since the previous mark"""
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def ready(self):
+        self.ready_after = time.perf_counter() - self.started
+
+    def summary(self):
+        parts = ', '.join(f"{phase} {seconds:.3f}s" for phase, seconds in self.phases.items())
+        total = self.ready_after if self.ready_after is not None else time.perf_counter() - self.started
+        return f"{parts}; ready after {total:.3f}s"
+
+    def stats(self):
+        return {
+            'phases': {phase: round(seconds, 4) for phase, seconds in self.phases.items()},
+            'ready_after_seconds': round(self.ready_after, 4) if self.ready_after is not None else None,
+        }
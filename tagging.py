@@ -0,0 +1,129 @@
+"""Container-aware metadata tagging.
+
+MP3 files get ID3 frames, M4A files MP4 atoms and Opus files Vorbis
+comments, so passthrough (non-MP3) deliveries are tagged natively.
+
+ffmpeg_tag_args() gives the same tags as ffmpeg options, so the transcode
+pass can write them and the file is written once; the mutagen taggers
+remain for files ffmpeg did not produce and for Opus cover art.
+"""
+import base64
+import os
+
+# mutagen is imported inside the taggers so importing this module stays cheap
+
+
+def _track_number(track_info):
+    number = track_info.get('track_number')
+    return int(number) if number else None
+
+
+def tag_mp3(file_path, track_info, cover=None):
+    from mutagen.id3 import ID3, APIC, TIT2, TPE1, TALB, TRCK
+    from mutagen.mp3 import MP3
+    audio = MP3(file_path, ID3=ID3)
+    try:
+        audio.add_tags()
+    except Exception:
+        pass
+    audio['TIT2'] = TIT2(encoding=3, text=track_info.get('name', 'Unknown Title'))
+    audio['TPE1'] = TPE1(encoding=3, text=track_info.get('artist', 'Unknown Artist'))
+    if track_info.get('album'):
+        audio['TALB'] = TALB(encoding=3, text=track_info['album'])
+    if _track_number(track_info):
+        audio['TRCK'] = TRCK(encoding=3, text=str(_track_number(track_info)))
+    if cover:
+        audio.tags.add(APIC(encoding=3, mime='image/jpeg', type=3, desc='Cover', data=cover))
+    audio.save()
+
+
+def tag_mp4(file_path, track_info, cover=None):
+    from mutagen.mp4 import MP4, MP4Cover
+    audio = MP4(file_path)
+    if audio.tags is None:
+        audio.add_tags()
+    audio['\xa9nam'] = [track_info.get('name', 'Unknown Title')]
+    audio['\xa9ART'] = [track_info.get('artist', 'Unknown Artist')]
+    if track_info.get('album'):
+        audio['\xa9alb'] = [track_info['album']]
+    if track_info.get('release_date'):
+        audio['\xa9day'] = [track_info['release_date']]
+    if _track_number(track_info):
+        audio['trkn'] = [(_track_number(track_info), 0)]
+    if cover:
+        audio['covr'] = [MP4Cover(cover, imageformat=MP4Cover.FORMAT_JPEG)]
+    audio.save()
+
+
+def tag_opus(file_path, track_info, cover=None):
+    from mutagen.oggopus import OggOpus
+    from mutagen.flac import Picture
+    audio = OggOpus(file_path)
+    audio['title'] = [track_info.get('name', 'Unknown Title')]
+    audio['artist'] = [track_info.get('artist', 'Unknown Artist')]
+    if track_info.get('album'):
+        audio['album'] = [track_info['album']]
+    if track_info.get('release_date'):
+        audio['date'] = [track_info['release_date']]
+    if _track_number(track_info):
+        audio['tracknumber'] = [str(_track_number(track_info))]
+    if cover:
+        picture = Picture()
+        picture.type = 3
+        picture.mime = 'image/jpeg'
+        picture.desc = 'Cover'
+        picture.data = cover
+        audio['metadata_block_picture'] = [base64.b64encode(picture.write()).decode('ascii')]
+    audio.save()
+
+
+TAGGERS = {
+    '.mp3': tag_mp3,
+    '.m4a': tag_mp4,
+    '.mp4': tag_mp4,
+    '.opus': tag_opus,
+    '.ogg': tag_opus,
+}
+
+
+def tag_audio(file_path, track_info, cover=None):
+    """Tag file_path in its container's native format. Returns False for unknown containers."""
+    tagger = TAGGERS.get(os.path.splitext(file_path)[1].lower())
+    if tagger is None:
+        return False
+    tagger(file_path, track_info, cover)
+    return True
+
+
+# Containers whose ffmpeg muxer can store the cover as an attached picture
+# (ffmpeg's Ogg muxer cannot, so Opus covers still go through tag_opus)
+FFMPEG_COVER_EXTS = {'.mp3', '.m4a', '.mp4'}
+
+
+def ffmpeg_tag_args(output_path, track_info, cover_path=None):
+    """ffmpeg output options writing track_info (and cover_path) into output_path.
+
+    Input 0 must be the audio; the cover, when the container supports one,
+    is expected as input 1.
+    """
+    ext = os.path.splitext(output_path)[1].lower()
+    fields = {
+        'title': track_info.get('name', 'Unknown Title'),
+        'artist': track_info.get('artist', 'Unknown Artist'),
+        'album': track_info.get('album'),
+        'date': track_info.get('release_date'),
+        'track': _track_number(track_info),
+    }
+    args = ['-map', '0:a']
+    if cover_path and ext in FFMPEG_COVER_EXTS:
+        args += [
+            '-map', '1:v', '-c:v', 'copy', '-disposition:v', 'attached_pic',
+            '-metadata:s:v', 'title=Cover', '-metadata:s:v', 'comment=Cover (front)',
+        ]
+    args += ['-map_metadata', '-1']
+    for key, value in fields.items():
+        if value:
+            args += ['-metadata', f"{key}={value}"]
+    if ext == '.mp3':
+        args += ['-id3v2_version', '3']
+    return args
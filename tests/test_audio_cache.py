@@ -0,0 +1,67 @@
+import os
+
+from audio_cache import AudioCache
+
+
+def write(path, size):
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    return str(path)
+
+
+def test_put_moves_into_the_cache_and_get_finds_it(tmp_path):
+    cache = AudioCache(str(tmp_path / 'cache'), max_bytes=1000)
+    source = write(tmp_path / 'a.mp3', 100)
+    path = cache.put('vid', 'mp3', 'mp3', source)
+    assert path and cache.owns(path)
+    assert not os.path.exists(source)
+    assert cache.get('vid', 'mp3', 'mp3') == path
+    assert cache.get('vid', 'opus', 'ogg') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used_over_budget(tmp_path):
+    cache = AudioCache(str(tmp_path / 'cache'), max_bytes=250)
+    for name in ('a', 'b'):
+        cache.put(name, 'mp3', 'mp3', write(tmp_path / f"{name}.mp3", 100))
+    cache.get('a', 'mp3', 'mp3')
+    cache.put('c', 'mp3', 'mp3', write(tmp_path / 'c.mp3', 100))
+    assert cache.get('b', 'mp3', 'mp3') is None
+    assert cache.get('a', 'mp3', 'mp3') and cache.get('c', 'mp3', 'mp3')
+    assert cache.stats()['bytes'] == 200
+    assert cache.evictions == 1
+
+
+def test_copy_leaves_source_and_oversized_files_are_refused(tmp_path):
+    cache = AudioCache(str(tmp_path / 'cache'), max_bytes=150)
+    source = write(tmp_path / 'a.mp3', 100)
+    assert cache.put('a', 'mp3', 'mp3', source, move=False)
+    assert os.path.exists(source)
+    big = write(tmp_path / 'big.mp3', 200)
+    assert cache.put('big', 'mp3', 'mp3', big) is None
+    assert os.path.exists(big)
+
+
+def test_index_rebuilt_from_directory(tmp_path):
+    directory = str(tmp_path / 'cache')
+    AudioCache(directory, max_bytes=1000).put('a', 'mp3', 'mp3', write(tmp_path / 'a.mp3', 100))
+    write(os.path.join(directory, 'partial.tmp'), 10)
+    reopened = AudioCache(directory, max_bytes=1000)
+    assert reopened.get('a', 'mp3', 'mp3')
+    assert not os.path.exists(os.path.join(directory, 'partial.tmp'))
+
+
+def test_disabled_cache(tmp_path):
+    cache = AudioCache(str(tmp_path / 'cache'), max_bytes=0)
+    assert cache.put('a', 'mp3', 'mp3', write(tmp_path / 'a.mp3', 10)) is None
+    assert cache.get('a', 'mp3', 'mp3') is None
+
+
+def test_tags_are_part_of_the_key(tmp_path):
+    cache = AudioCache(str(tmp_path / 'cache'), max_bytes=1000)
+    untagged = cache.put('vid', 'mp3', 'mp3', write(tmp_path / 'a.mp3', 10))
+    tagged = cache.put('vid', 'mp3', 'mp3', write(tmp_path / 'b.mp3', 10), tags='track-1')
+    assert untagged != tagged
+    assert cache.get('vid', 'mp3', 'mp3') == untagged
+    assert cache.get('vid', 'mp3', 'mp3', tags='track-1') == tagged
+    assert cache.get('vid', 'mp3', 'mp3', tags='track-2') is None
@@ -0,0 +1,32 @@
+import pytest
+
+from send_queue import Budget
+
+
+def test_burst_then_steady_rate():
+    budget = Budget(rate=1.0, burst=3)
+    waits = [budget.reserve(now=100.0) for _ in range(5)]
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert waits[3] == pytest.approx(1.0)
+    assert waits[4] == pytest.approx(2.0)
+
+
+def test_recovers_after_idle():
+    budget = Budget(rate=2.0, burst=1)
+    assert budget.reserve(now=0.0) == 0.0
+    assert budget.reserve(now=0.0) == pytest.approx(0.5)
+    assert budget.idle(now=0.5) is False
+    assert budget.idle(now=1.0) is True
+    assert budget.reserve(now=10.0) == 0.0
+
+
+def test_cost_takes_several_units():
+    budget = Budget(rate=10.0, burst=1)
+    assert budget.reserve(cost=5, now=0.0) == 0.0
+    assert budget.reserve(now=0.0) == pytest.approx(0.5)
+
+
+def test_block_delays_the_next_send():
+    budget = Budget(rate=1.0, burst=3)
+    budget.block(7, now=0.0)
+    assert budget.reserve(now=0.0) == pytest.approx(7.0)
@@ -0,0 +1,95 @@
+from job_queue import MemoryQueue, RedisQueue, SQLiteQueue
+
+
+class FakeRedis:
+    """The list commands RedisQueue uses, on plain Python lists (index 0 is LEFT)"""
+
+    def __init__(self):
+        self.lists = {}
+
+    def _list(self, key):
+        return self.lists.setdefault(key, [])
+
+    def lpush(self, key, value):
+        self._list(key).insert(0, value)
+
+    def rpush(self, key, value):
+        self._list(key).append(value)
+
+    def lpop(self, key):
+        values = self._list(key)
+        return values.pop(0) if values else None
+
+    def rpop(self, key):
+        values = self._list(key)
+        return values.pop() if values else None
+
+    def lmove(self, source, destination, where_from, where_to):
+        value = self.rpop(source) if where_from == 'RIGHT' else self.lpop(source)
+        if value is not None:
+            (self.rpush if where_to == 'RIGHT' else self.lpush)(destination, value)
+        return value
+
+    def lrem(self, key, count, value):
+        self._list(key).remove(value)
+
+    def llen(self, key):
+        return len(self._list(key))
+
+
+def tasks(queue, count):
+    for n in range(count):
+        queue.put({'n': n, 'priority': 1})
+
+
+def taken(queue):
+    result = []
+    while True:
+        item = queue.get(timeout=0)
+        if item is None:
+            return result
+        result.append(item)
+
+
+def test_redis_queue_is_fifo_per_priority_and_interactive_first():
+    queue = RedisQueue(None, worker_id='w1', client=FakeRedis())
+    tasks(queue, 3)
+    queue.put({'n': 'urgent', 'priority': 0})
+    assert [task['n'] for _, task in taken(queue)] == ['urgent', 0, 1, 2]
+
+
+def test_redis_requeue_keeps_the_original_order():
+    client = FakeRedis()
+    crashed = RedisQueue(None, worker_id='w1', client=client)
+    tasks(crashed, 4)
+    crashed.get(timeout=0)
+    crashed.get(timeout=0)
+    restarted = RedisQueue(None, worker_id='w1', client=client)
+    assert restarted.requeue_unacked() == 2
+    assert [task['n'] for _, task in taken(restarted)] == [0, 1, 2, 3]
+
+
+def test_redis_ack_removes_from_processing():
+    queue = RedisQueue(None, worker_id='w1', client=FakeRedis())
+    tasks(queue, 1)
+    receipt, _ = queue.get(timeout=0)
+    queue.ack(receipt)
+    assert queue.stats() == {'backend': 'redis', 'queued': 0, 'processing': 0}
+    assert queue.requeue_unacked() == 0
+
+
+def test_sqlite_queue_hands_out_unacked_tasks_again(tmp_path):
+    queue = SQLiteQueue(str(tmp_path / 'q.sqlite3'), visibility_timeout=0)
+    tasks(queue, 1)
+    first = queue.get(timeout=0)
+    again = queue.get(timeout=0)
+    assert first and again and first[1] == again[1]
+    queue.ack(again[0])
+    assert queue.get(timeout=0) is None
+
+
+def test_memory_queue_orders_by_priority():
+    queue = MemoryQueue()
+    tasks(queue, 2)
+    queue.put({'n': 'urgent', 'priority': 0})
+    assert [task['n'] for _, task in taken(queue)] == ['urgent', 0, 1]
@@ -0,0 +1,52 @@
+import matcher
+
+
+def entry(title, channel='Someone', duration=210, verified=False):
+    return {
+        'url': f"https://www.youtube.com/watch?v={abs(hash(title)) % 10**11:011d}",
+        'title': title,
+        'channel': channel,
+        'duration': duration,
+        'channel_is_verified': verified,
+    }
+
+
+def test_topic_upload_beats_alternate_versions():
+    official = entry('Something About Us', 'Daft Punk - Topic', 232)
+    candidates = [
+        entry('Daft Punk - Something About Us (Live at Wembley)', 'Fan Uploads', 240),
+        entry('Daft Punk - Something About Us (Karaoke Version)', 'Karaoke Hits', 232),
+        official,
+        entry('Daft Punk - Something About Us - 1 Hour Loop', 'Loops', 3600),
+    ]
+    best, best_score = matcher.best_match(candidates, 'Daft Punk', 'Something About Us', 232)
+    assert best is official
+    assert best_score > 0.9
+
+
+def test_penalty_skipped_when_the_title_asks_for_that_version():
+    live = entry('Daft Punk - Something About Us (Live)', 'Daft Punk', 232)
+    assert matcher.score(live, 'Daft Punk', 'Something About Us (Live)', 232) > \
+        matcher.score(live, 'Daft Punk', 'Something About Us', 232)
+
+
+def test_hour_long_loop_is_penalised():
+    short = entry('Daft Punk - Something About Us', duration=232)
+    loop = entry('Daft Punk - Something About Us', duration=3600)
+    assert matcher.score(loop, 'Daft Punk', 'Something About Us', 232) < \
+        matcher.score(short, 'Daft Punk', 'Something About Us', 232) - matcher.PENALTY
+
+
+def test_duration_score():
+    assert matcher.duration_score(200, 202) == 1.0
+    assert matcher.duration_score(200, 230) == 0.0
+    assert matcher.duration_score(None, 200) == 0.5
+    assert 0.0 < matcher.duration_score(200, 215) < 1.0
+
+
+def test_normalize_strips_accents_and_punctuation():
+    assert matcher.tokens('Beyoncé - Halo (Official Video)') == {'beyonce', 'halo'}
+
+
+def test_best_match_without_usable_entries():
+    assert matcher.best_match([None, {'title': 'no url'}], 'A', 'B') == (None, 0.0)
@@ -0,0 +1,44 @@
+import resolution_cache
+from resolution_cache import ResolutionCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+def test_positive_and_negative_ttls(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resolution_cache, 'time', clock)
+    cache = ResolutionCache(str(tmp_path / 'r.sqlite3'), ttl=1000, negative_ttl=100)
+    cache.set('found', 'https://www.youtube.com/watch?v=abc')
+    cache.set('missing', None)
+    assert cache.get('found') == (True, 'https://www.youtube.com/watch?v=abc')
+    assert cache.get('missing') == (True, None)
+    clock.now += 101
+    assert cache.get('missing') == (False, None)
+    assert cache.get('found')[0] is True
+    clock.now += 1000
+    assert cache.get('found') == (False, None)
+    stats = cache.stats()
+    assert (stats['hits'], stats['negative_hits'], stats['misses']) == (2, 1, 2)
+
+
+def test_unknown_id_is_a_miss(tmp_path):
+    cache = ResolutionCache(str(tmp_path / 'r.sqlite3'))
+    assert cache.get('nope') == (False, None)
+    assert cache.stats()['misses'] == 1
+
+
+def test_purge_expired(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resolution_cache, 'time', clock)
+    cache = ResolutionCache(str(tmp_path / 'r.sqlite3'), ttl=1000, negative_ttl=100)
+    cache.set('a', None)
+    cache.set('b', 'https://www.youtube.com/watch?v=b')
+    clock.now += 500
+    assert cache.purge_expired() == 1
+    assert cache.stats()['entries'] == 1
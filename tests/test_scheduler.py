@@ -0,0 +1,76 @@
+import asyncio
+
+from scheduler import BULK, INTERACTIVE, FairScheduler
+
+
+def test_interactive_first_then_users_round_robin():
+    async def main():
+        scheduler = FairScheduler({'download': 1})
+        served = []
+        gate = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot('download', 'holder', BULK):
+                await gate.wait()
+
+        async def job(user_id, priority, label):
+            async with scheduler.slot('download', user_id, priority):
+                served.append(label)
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiters = [
+            asyncio.create_task(job('a', BULK, 'a1')),
+            asyncio.create_task(job('a', BULK, 'a2')),
+            asyncio.create_task(job('a', BULK, 'a3')),
+            asyncio.create_task(job('b', BULK, 'b1')),
+            asyncio.create_task(job('c', INTERACTIVE, 'c1')),
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.waiting() == 5
+        gate.set()
+        await asyncio.gather(holder, *waiters)
+        return served
+
+    assert asyncio.run(main()) == ['c1', 'a1', 'b1', 'a2', 'a3']
+
+
+def test_limit_is_respected():
+    async def main():
+        scheduler = FairScheduler({'transcode': 2})
+        running = peak = 0
+
+        async def job():
+            nonlocal running, peak
+            async with scheduler.slot('transcode', 'u'):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*(job() for _ in range(6)))
+        return peak
+
+    assert asyncio.run(main()) == 2
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        scheduler = FairScheduler({'search': 1})
+        gate = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot('search', 'holder'):
+                await gate.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(scheduler.run('search', 'u', BULK, asyncio.sleep, 0))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        gate.set()
+        await holder
+        return scheduler.waiting(), await scheduler.run('search', 'u', BULK, asyncio.sleep, 0, 'ok')
+
+    assert asyncio.run(main()) == (0, 'ok')
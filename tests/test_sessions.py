@@ -0,0 +1,87 @@
+import asyncio
+
+import sessions
+from sessions import MemorySessionStore, Result, SearchSession
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def session(count=3, title='listing'):
+    return SearchSession(
+        [Result(f"id{n:08d}xx", f"Title {n}", 'Artist', 200 + n, None) for n in range(count)], title=title
+    )
+
+
+def test_result_rebuilds_canonical_youtube_url():
+    entry = {'id': 'abcdefghijk', 'url': 'https://www.youtube.com/watch?v=abcdefghijk', 'title': 'T', 'duration': 61.0}
+    result = Result.from_entry(entry)
+    assert tuple.__getitem__(result, 4) is None
+    assert result.url == entry['url']
+    assert result.get('uploader') == 'Unknown Artist'
+    assert result.as_dict()['url'] == entry['url']
+    spotify = Result.from_entry({'id': 'x' * 22, 'url': 'https://open.spotify.com/track/' + 'x' * 22})
+    assert spotify.url == 'https://open.spotify.com/track/' + 'x' * 22
+
+
+def test_dumps_round_trip():
+    original = session()
+    original.page = 2
+    restored = SearchSession.loads(original.dumps())
+    assert restored.results == original.results
+    assert (restored.page, restored.title) == (2, 'listing')
+
+
+def test_ttl_slides_on_use_and_expires(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sessions, 'time', clock)
+
+    async def main():
+        store = MemorySessionStore(ttl=60)
+        await store.put(1, session())
+        clock.now += 50
+        assert await store.get(1) is not None
+        clock.now += 50
+        assert await store.get(1) is not None
+        clock.now += 61
+        assert await store.get(1) is None
+        return store.stats()
+
+    stats = asyncio.run(main())
+    assert (stats['sessions'], stats['bytes'], stats['expired'], stats['hits'], stats['misses']) == (0, 0, 1, 2, 1)
+
+
+def test_byte_cap_evicts_least_recently_used():
+    async def main():
+        size = session().size()
+        store = MemorySessionStore(ttl=60, max_bytes=int(size * 2.5))
+        await store.put(1, session())
+        await store.put(2, session())
+        await store.get(1)
+        await store.put(3, session())
+        return store, [await store.get(user) is not None for user in (1, 2, 3)]
+
+    store, present = asyncio.run(main())
+    assert present == [True, False, True]
+    assert store.stats()['evicted'] == 1
+    assert store.stats()['bytes'] <= store.max_bytes
+
+
+def test_put_replaces_and_pop_removes():
+    async def main():
+        store = MemorySessionStore()
+        await store.put(1, session(2))
+        await store.put(1, session(4))
+        assert store.stats()['sessions'] == 1
+        assert store.stats()['bytes'] == session(4).size()
+        popped = await store.pop(1)
+        return popped, store.stats()['bytes'], await store.pop(1)
+
+    popped, remaining, again = asyncio.run(main())
+    assert len(popped.results) == 4
+    assert (remaining, again) == (0, None)
@@ -0,0 +1,166 @@
+import asyncio
+
+import pytest
+
+from singleflight import SharedError, SingleFlight
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_callers_share_one_execution():
+    async def main():
+        flight = SingleFlight()
+        calls = []
+
+        async def work(value):
+            calls.append(value)
+            await asyncio.sleep(0.01)
+            return value * 2
+
+        results = await asyncio.gather(*(flight.do('k', work, 21) for _ in range(5)))
+        return flight, calls, results
+
+    flight, calls, results = run(main())
+    assert calls == [21]
+    assert [result for result, _ in results] == [42] * 5
+    assert [shared for _, shared in results] == [False, True, True, True, True]
+    assert flight.stats() == {'in_flight': 0, 'executed': 1, 'coalesced': 4}
+
+
+def test_errors_reach_waiters_wrapped_on_request():
+    async def main():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise PermissionError('blocked')
+
+        return await asyncio.gather(
+            flight.do('k', fail, wrap_errors=True), flight.do('k', fail, wrap_errors=True), flight.do('k', fail),
+            return_exceptions=True
+        )
+
+    leader, wrapped, plain = run(main())
+    assert isinstance(leader, PermissionError)
+    assert isinstance(wrapped, SharedError) and isinstance(wrapped.error, PermissionError)
+    assert isinstance(plain, PermissionError)
+
+
+def test_acquire_releases_once_every_holder_is_done():
+    async def main():
+        flight = SingleFlight()
+        released = []
+
+        async def make():
+            await asyncio.sleep(0.01)
+            return 'file'
+
+        leases = await asyncio.gather(*(flight.acquire('k', make, release=released.append) for _ in range(3)))
+        assert [lease.value for lease in leases] == ['file'] * 3
+        leases[0].release()
+        leases[0].release()
+        leases[1].release()
+        assert released == []
+        leases[2].release()
+        return flight, released
+
+    flight, released = run(main())
+    assert released == ['file']
+    assert flight.executed == 1
+
+
+def test_new_call_after_completion_runs_again():
+    async def main():
+        flight = SingleFlight()
+        count = 0
+
+        async def work():
+            nonlocal count
+            count += 1
+            return count
+
+        first, _ = await flight.do('k', work)
+        second, _ = await flight.do('k', work)
+        return first, second
+
+    assert run(main()) == (1, 2)
+
+
+def test_leader_exception_propagates_to_leader():
+    async def main():
+        async def fail():
+            raise ValueError('x')
+        await SingleFlight().do('k', fail)
+
+    with pytest.raises(ValueError):
+        run(main())
+
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    async def main():
+        flight = SingleFlight()
+        started = []
+
+        async def work():
+            started.append(1)
+            await asyncio.sleep(0.05)
+            return 'done'
+
+        leader = asyncio.create_task(flight.do('k', work))
+        await asyncio.sleep(0)
+        rerun = asyncio.create_task(flight.do('k', work))
+        wrapped = asyncio.create_task(flight.do('k', work, wrap_errors=True))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await asyncio.gather(leader, rerun, wrapped, return_exceptions=True), len(started)
+
+    (leader, rerun, wrapped), started = run(main())
+    assert isinstance(leader, asyncio.CancelledError)
+    assert rerun == ('done', False)
+    assert isinstance(wrapped, SharedError)
+    assert started == 2
+
+
+def test_cancelled_waiter_is_cancelled():
+    async def main():
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return 'done'
+
+        leader = asyncio.create_task(flight.do('k', work))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do('k', work))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        return await asyncio.gather(leader, waiter, return_exceptions=True)
+
+    leader, waiter = run(main())
+    assert leader == ('done', False)
+    assert isinstance(waiter, asyncio.CancelledError)
+
+
+def test_acquire_waiter_survives_cancelled_leader():
+    async def main():
+        flight = SingleFlight()
+
+        async def make():
+            await asyncio.sleep(0.05)
+            return 'file'
+
+        leader = asyncio.create_task(flight.acquire('k', make))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.acquire('k', make))
+        await asyncio.sleep(0)
+        leader.cancel()
+        results = await asyncio.gather(leader, waiter, return_exceptions=True)
+        results[1].release()
+        return results, flight.stats()['in_flight']
+
+    (leader, lease), in_flight = run(main())
+    assert isinstance(leader, asyncio.CancelledError)
+    assert lease.value == 'file'
+    assert in_flight == 0
@@ -0,0 +1,143 @@
+"""Per-request tracing.
+
+Each user request (message, button, queued task, batch job) runs inside a
+trace with a short random id. Pipeline stages record timed spans into the
+current trace, and log lines emitted while it is active carry its id
+(see TraceIdFilter). When the trace ends it is written as one JSON line --
+always for slow or failed requests, otherwise for a sampled fraction -- so
+a slow request can be reconstructed without logging every request in full.
+
+The current trace lives in a context variable: asyncio tasks inherit it,
+and run_in_executor callers copy it into the pool thread.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+
+_current = contextvars.ContextVar('trace', default=None)
+
+
+class Trace:
+    def __init__(self, name, attrs, max_spans):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = dict(attrs)
+        self.started = time.perf_counter()
+        self.spans = []
+        self.dropped_spans = 0
+        self.error = None
+        self._max_spans = max_spans
+        self._lock = threading.Lock()
+
+    def add_span(self, name, start, duration, attrs):
+        with self._lock:
+            if len(self.spans) >= self._max_spans:
+                self.dropped_spans += 1
+                return
+            self.spans.append({
+                'name': name,
+                'start_ms': round((start - self.started) * 1000, 1),
+                'duration_ms': round(duration * 1000, 1),
+                **attrs,
+            })
+
+    def record(self, duration):
+        with self._lock:
+            record = {
+                'trace_id': self.id,
+                'name': self.name,
+                'duration_ms': round(duration * 1000, 1),
+                **self.attrs,
+                'spans': list(self.spans),
+            }
+        if self.dropped_spans:
+            record['dropped_spans'] = self.dropped_spans
+        if self.error:
+            record['error'] = self.error
+        return record
+
+
+class Tracer:
+    def __init__(self, sample_rate=0.01, slow_seconds=20.0, max_spans=200, logger_name='trace'):
+        """
+        sample_rate: fraction of ordinary traces written out.
+        slow_seconds: traces at least this long are always written, as are failed ones.
+        max_spans: spans kept per trace; a large batch records the first ones only.
+        """
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.max_spans = max_spans
+        self.started = 0
+        self.emitted = 0
+        self._logger = logging.getLogger(logger_name)
+
+    @contextlib.contextmanager
+    def trace(self, name, **attrs):
+        """Run the with-block as a new trace (nested calls join the outer one)"""
+        if _current.get() is not None:
+            yield _current.get()
+            return
+        trace = Trace(name, attrs, self.max_spans)
+        self.started += 1
+        token = _current.set(trace)
+        try:
+            yield trace
+        except BaseException as e:
+            trace.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            duration = time.perf_counter() - trace.started
+            if trace.error or duration >= self.slow_seconds or random.random() < self.sample_rate:
+                self.emitted += 1
+                self._logger.info(json.dumps(trace.record(duration), default=str))
+
+    def stats(self):
+        return {'traces': self.started, 'emitted': self.emitted, 'sample_rate': self.sample_rate}
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """Time the with-block as a span of the current trace; a no-op outside a trace"""
+    trace = _current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        attrs['error'] = type(e).__name__
+        raise
+    finally:
+        if trace is not None:
+            trace.add_span(name, start, time.perf_counter() - start, attrs)
+
+
+def current_trace_id():
+    trace = _current.get()
+    return trace.id if trace else None
+
+
+def annotate(**attrs):
+    """Add attributes to the current trace (no-op outside a trace)"""
+    trace = _current.get()
+    if trace is not None:
+        trace.attrs.update(attrs)
+
+
+def fail(reason):
+    """Mark the current trace failed so it is written out regardless of sampling"""
+    trace = _current.get()
+    if trace is not None and trace.error is None:
+        trace.error = reason
+
+
+class TraceIdFilter(logging.Filter):
+    """Give every log record a trace_id attribute ('-' outside a trace) for the log format"""
+
+    def filter(self, record):
+        record.trace_id = current_trace_id() or '-'
+        return True
@@ -0,0 +1,134 @@
+"""Pool of long-lived yt_dlp.YoutubeDL instances.
+
+Building a YoutubeDL loads extractors, cookie jars and an HTTP opener;
+reusing instances keeps that setup and the connections warm. Instances are
+grouped by purpose (each purpose has fixed options) and a thread checks
+one out exclusively, so the pool is safe to use from an executor.
+"""
+import contextlib
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class YoutubeDLPool:
+    def __init__(self, size=4):
+        """size: maximum number of instances per purpose"""
+        self.size = size
+        self._profiles = {}
+        self._idle = {}
+        self._created = {}
+        self._lock = threading.Lock()
+        self._timings = {}
+
+    def register(self, purpose, opts):
+        """Declare the options used for one purpose (e.g. 'search', 'info', 'download')"""
+        with self._lock:
+            self._profiles[purpose] = dict(opts)
+            self._idle[purpose] = queue.LifoQueue()
+            self._created[purpose] = 0
+
+    def _record(self, purpose, kind, seconds):
+        with self._lock:
+            timing = self._timings.setdefault((purpose, kind), {'count': 0, 'total': 0.0, 'max': 0.0})
+            timing['count'] += 1
+            timing['total'] += seconds
+            timing['max'] = max(timing['max'], seconds)
+
+    def _construct(self, purpose):
+        # Imported here: yt_dlp is slow to import and only needed once work arrives
+        import yt_dlp
+        start = time.perf_counter()
+        ydl = yt_dlp.YoutubeDL(dict(self._profiles[purpose]))
+        self._record(purpose, 'construct', time.perf_counter() - start)
+        return ydl
+
+    def _discard(self, purpose, ydl):
+        with self._lock:
+            self._created[purpose] -= 1
+        try:
+            ydl.close()
+        except Exception:
+            pass
+
+    @contextlib.contextmanager
+    def get(self, purpose):
+        """Check out a YoutubeDL for purpose; it is returned to the pool afterwards.
+
+        An instance that raised is closed and replaced rather than reused.
+        """
+        idle = self._idle[purpose]
+        try:
+            ydl = idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created[purpose] < self.size
+                if can_create:
+                    self._created[purpose] += 1
+            if can_create:
+                try:
+                    ydl = self._construct(purpose)
+                except Exception:
+                    with self._lock:
+                        self._created[purpose] -= 1
+                    raise
+            else:
+                ydl = idle.get()
+        try:
+            yield ydl
+        except BaseException:
+            self._discard(purpose, ydl)
+            raise
+        else:
+            idle.put(ydl)
+
+    def extract_info(self, purpose, url, download=False):
+        with self.get(purpose) as ydl:
+            start = time.perf_counter()
+            try:
+                return ydl.extract_info(url, download=download)
+            finally:
+                self._record(purpose, 'extract', time.perf_counter() - start)
+
+    def download(self, purpose, url, outtmpl):
+        """Download url to outtmpl with the purpose's options.
+
+        Returns the info dict (its 'requested_downloads' hold the file paths),
+        or None when yt-dlp could not download it.
+        """
+        with self.get(purpose) as ydl:
+            ydl.params['outtmpl']['default'] = outtmpl
+            # The retcode is sticky across downloads on a reused instance
+            ydl._download_retcode = 0
+            start = time.perf_counter()
+            try:
+                return ydl.extract_info(url, download=True)
+            finally:
+                self._record(purpose, 'download', time.perf_counter() - start)
+
+    def warm_up(self, purposes=None):
+        """Construct one instance per purpose ahead of the first request"""
+        for purpose in purposes or list(self._profiles):
+            with self.get(purpose):
+                pass
+        logger.info(f"yt-dlp pool warmed up: {', '.join(purposes or self._profiles)}")
+
+    def stats(self):
+        with self._lock:
+            timings = {
+                f"{purpose}.{kind}": {
+                    'count': t['count'],
+                    'total_seconds': round(t['total'], 3),
+                    'avg_seconds': round(t['total'] / t['count'], 4) if t['count'] else 0.0,
+                    'max_seconds': round(t['max'], 3),
+                }
+                for (purpose, kind), t in self._timings.items()
+            }
+            instances = {
+                purpose: {'created': self._created[purpose], 'idle': self._idle[purpose].qsize()}
+                for purpose in self._profiles
+            }
+        return {'instances': instances, 'timings': timings}